@@ -1,8 +1,9 @@
 import json
-from web3 import Web3
 from dotenv import load_dotenv
 import os
 import logging
+from app.core.rpc import rpc_registry
+from app.core.rpc_cache import RpcResponseCache
 
 load_dotenv()
 
@@ -14,33 +15,93 @@ MAINNET_BLOCK_1ST_JAN_2024 = 18913400  # 1st January 2024
 AVERAGE_BLOCK_TIME = 15
 TOTAL_SUPPLY_HISTORICAL_DAYS = 30
 TOTAL_SUPPLY_HISTORICAL_START_BLOCK = 20432592  # 1st August 2024
+CIRC_SUPPLY_FRESHNESS_SECONDS = 2 * 60 * 60  # Ledger updates run hourly, allow one missed run
+MARKET_CAP_INPUT_TIMEOUT = 20  # Seconds allowed for each market cap input (price, circulating and total supply)
+REWARD_SNAPSHOT_TTL_SECONDS = 10 * 60  # How long the reward simulator reuses its pool state and price snapshot
+MAX_REWARD_GRID_SIZE = 10_000  # Largest lock periods x deposits x emissions grid /simulate_rewards computes
+MULTICALL_BATCH_SIZE = 500  # Calls per Multicall3 aggregate3 request
+LIQUIDITY_HISTORY_START_DATE = "2024-02-08"  # First day of the protocol owned liquidity history (MOR launch)
+HOLDER_LEDGER_BATCH_BLOCKS = 500_000  # Arbitrum blocks per Transfer log query, halved when a query fails
+RPC_POOL_SIZE = 20  # Keep-alive connections per RPC URL, shared by every thread using the chain
+RPC_REQUEST_TIMEOUT = 30  # Seconds allowed for each RPC request
+RPC_MAX_ATTEMPTS = 5  # Attempts per RPC request across all of a chain's URLs
+RPC_BACKOFF_BASE = 0.5  # Seconds a failing RPC URL first cools down for, doubled on each consecutive failure
+RPC_BACKOFF_MAX = 60  # Longest cooldown of a failing RPC URL
+RPC_ASYNC_MAX_CONCURRENCY = 16  # Requests in flight at once per chain from the async (AsyncWeb3) code paths
+RPC_CACHE_FINALITY_TTL = 60  # Seconds the finalized block number is reused by the RPC response cache
 
-ETH_RPC_URL = os.getenv("RPC_URL")
-ARB_RPC_URL = os.getenv("ARB_RPC_URL")
+# Comma separated, in order of preference, e.g. RPC_URL=https://primary.example,https://backup.example
+ETH_RPC_URLS = [url.strip() for url in os.getenv("RPC_URL", "").split(",") if url.strip()]
+ARB_RPC_URLS = [url.strip() for url in os.getenv("ARB_RPC_URL", "").split(",") if url.strip()]
 ETHERSCAN_API_KEY = os.getenv("ETHERSCAN_API_KEY")
 DUNE_API_KEY = os.getenv("DUNE_API_KEY")
 DUNE_QUERY_ID = os.getenv("DUNE_QUERY_ID")
-
-web3 = Web3(Web3.HTTPProvider(ETH_RPC_URL))
-web3_arb = Web3(Web3.HTTPProvider(ARB_RPC_URL))
+DUNE_CHECK_TIMEOUT = 30  # Seconds allowed for the Dune request checking whether the holders query has a new execution
+MOR_HOLDERS_SOURCE = os.getenv("MOR_HOLDERS_SOURCE", "dune")  # "dune" or "ledger" (local Transfer log ledger)
+MOR_HOLDERS_DUNE_CROSS_CHECK = os.getenv("MOR_HOLDERS_DUNE_CROSS_CHECK", "").lower() in ("1", "true", "yes")
+# First block the holder ledger scans: late December 2023, shortly before the MOR token was deployed on Arbitrum
+MOR_ARBITRUM_START_BLOCK = int(os.getenv("MOR_ARBITRUM_START_BLOCK", 165_000_000))
+# API hosts, overridable so a local stand-in (tests/replay_harness.py) can serve them
+COINGECKO_API_URL = os.getenv("COINGECKO_API_URL", "https://api.coingecko.com")
+DEXSCREENER_API_URL = os.getenv("DEXSCREENER_API_URL", "https://api.dexscreener.com")
+DUNE_API_URL = os.getenv("DUNE_API_URL", "https://api.dune.com")
+# On-disk cache of RPC results pinned to finalized blocks, on unless RPC_CACHE_ENABLED is false
+RPC_CACHE_ENABLED = os.getenv("RPC_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
 
 current_dir = os.path.dirname(os.path.abspath(__file__))
 project_root = os.path.abspath(os.path.join(current_dir, '..', '..'))
 
+RPC_CACHE_DIR = os.getenv("RPC_CACHE_DIR", os.path.join(project_root, 'rpc_cache'))
+rpc_response_cache = RpcResponseCache(RPC_CACHE_DIR, RPC_CACHE_FINALITY_TTL) if RPC_CACHE_ENABLED else None
+
+# Every module gets its chain connection from the registry, so a chain shares one connection pool and one
+# health state across its URLs
+for chain, urls in (("ethereum", ETH_RPC_URLS), ("arbitrum", ARB_RPC_URLS)):
+    rpc_registry.register(chain, urls, pool_size=RPC_POOL_SIZE, timeout=RPC_REQUEST_TIMEOUT,
+                          max_attempts=RPC_MAX_ATTEMPTS, backoff_base=RPC_BACKOFF_BASE, backoff_max=RPC_BACKOFF_MAX,
+                          max_concurrency=RPC_ASYNC_MAX_CONCURRENCY, response_cache=rpc_response_cache)
+
+web3 = rpc_registry.get_web3("ethereum")
+web3_arb = rpc_registry.get_web3("arbitrum")
+# Used from async code so chain reads don't block the event loop
+async_web3 = rpc_registry.get_async_web3("ethereum")
+async_web3_arb = rpc_registry.get_async_web3("arbitrum")
+
 CIRC_SUPPLY_CSV_PATH = os.path.join(project_root,
                                     'helpers/supply_helpers/circulating_supply_helpers/csv_files',
                                     'consolidated_circ_supply.csv')
 
+CIRC_SUPPLY_LEDGER_PATH = os.path.join(project_root,
+                                       'helpers/supply_helpers/circulating_supply_helpers/csv_files',
+                                       'circ_supply_ledger.csv')
+
+CIRC_SUPPLY_LEDGER_TAIL_PATH = os.path.join(project_root,
+                                            'helpers/supply_helpers/circulating_supply_helpers/csv_files',
+                                            'circ_supply_ledger_tail.json')
+
 TOTAL_SUPPLY_CSV_PATH = os.path.join(project_root,
                                      'helpers/supply_helpers/total_supply_csv/',
                                      'total_supply_schedule.csv')
 
+EMISSION_SCHEDULE_CSV_PATH = os.path.join(project_root,
+                                          'helpers/staking_general_helpers/general_csv_files',
+                                          'emissions.csv')
+
+BURN_AND_LOCKED_STATE_PATH = os.path.join(project_root, 'helpers/supply_helpers', 'burn_and_locked_state.json')
+
+HOLDER_LEDGER_PATH = os.path.join(project_root, 'helpers/supply_helpers', 'mor_holder_ledger.npz')
+DUNE_HOLDER_SNAPSHOT_PATH = os.path.join(project_root, 'helpers/supply_helpers', 'dune_holder_snapshot.npz')
+
+LIQUIDITY_HISTORY_PATH = os.path.join(project_root, 'helpers/staking_general_helpers/general_csv_files',
+                                      'protocol_liquidity_history.npz')
+
 supply_abi_path = os.path.join(project_root, 'abi', 'supply_abi.json')
 distribution_abi_path = os.path.join(project_root, 'abi', 'distribution_abi.json')
 erc20_abi_path = os.path.join(project_root, 'abi', 'erc_20_abi.json')
 json_path_position = os.path.join(project_root, 'abi', 'position_nft_abi.json')
 json_path_factory = os.path.join(project_root, 'abi', 'uniswap_factory_abi.json')
 json_path_pool = os.path.join(project_root, 'abi', 'pool_uniswap_abi.json')
+json_path_multicall3 = os.path.join(project_root, 'abi', 'multicall3_abi.json')
 
 with open(supply_abi_path, 'r') as file:
     supply_abi = json.load(file)
@@ -54,6 +115,8 @@ with open(json_path_factory, 'r') as file:
     FACTORY_NFT_ABI = json.load(file)
 with open(json_path_pool, 'r') as file:
     POOL_ABI = json.load(file)
+with open(json_path_multicall3, 'r') as file:
+    MULTICALL3_ABI = json.load(file)
 
 BURN_FROM_ADDRESS = "0x151c2b49CdEC10B150B2763dF3d1C00D70C90956"
 BURN_TO_ADDRESS = "0x000000000000000000000000000000000000dead"
@@ -63,15 +126,23 @@ DISTRIBUTION_PROXY_ADDRESS = "0x47176B2Af9885dC6C4575d4eFd63895f7Aaa4790"
 MOR_MAINNET_ADDRESS = "0xcbb8f1bda10b9696c57e13bc128fe674769dcec0"
 MOR_ARBITRUM_ADDRESS = "0x092bAaDB7DEf4C3981454dD9c0A0D7FF07bCFc86"
 STETH_TOKEN_ADDRESS = '0x5300000000000000000000000000000000000004'
+STETH_MAINNET_ADDRESS = '0xae7ab96520DE3A18E5e111B5EaAb095312D7fE84'  # Lido stETH on Ethereum
 UNISWAP_V3_POSITIONS_NFT_ADDRESS = '0xC36442b4a4522E871399CD717aBDD847Ab11FE88'
 UNISWAP_V3_FACTORY_ADDRESS = '0x1F98431c8aD98523631AE4a59f267346ea31F984'
+MULTICALL3_ADDRESS = '0xcA11bde05977b3631167028862bE2a173976CA11'  # Same address on Ethereum and Arbitrum
 
 PRICES_AND_VOLUME_DATA_DAYS = 300
-COINGECKO_HISTORICAL_PRICES = (f"https://api.coingecko.com/api/v3/coins/morpheusai/contract/"
-                               f"{MOR_ARBITRUM_ADDRESS}/market_chart?"
-                               f"vs_currency=usd&days={PRICES_AND_VOLUME_DATA_DAYS}")
+COINGECKO_MARKET_CHART_URL = (f"{COINGECKO_API_URL}/api/v3/coins/morpheusai/contract/"
+                              f"{MOR_ARBITRUM_ADDRESS}/market_chart?"
+                              "vs_currency=usd&days={days}")
+COINGECKO_HISTORICAL_PRICES = COINGECKO_MARKET_CHART_URL.format(days=PRICES_AND_VOLUME_DATA_DAYS)
+PRICES_AND_VOLUME_STORE_PATH = os.path.join(project_root, 'helpers/supply_helpers', 'daily_prices_and_volumes.csv')
+
+DEXSCREENER_TOKENS_URL = DEXSCREENER_API_URL + "/latest/dex/tokens/{}"
+COINGECKO_SIMPLE_PRICE_URL = f"{COINGECKO_API_URL}/api/v3/simple/price"
 
-DEXSCREENER_URL = f"https://api.dexscreener.com/latest/dex/tokens/{MOR_ARBITRUM_ADDRESS}"
+PRICE_CACHE_TTL_SECONDS = 60  # How long a fetched token price is served before it is refetched
+PRICE_REQUEST_TIMEOUT = 10  # Seconds allowed for each price source request
 
 SUPPLY_ABI = supply_abi
 DISTRIBUTION_ABI = distribution_abi
@@ -81,3 +152,7 @@ supply_contract = web3.eth.contract(address=web3.to_checksum_address(SUPPLY_PROX
                                     abi=SUPPLY_ABI)
 distribution_contract = web3.eth.contract(address=web3.to_checksum_address(DISTRIBUTION_PROXY_ADDRESS),
                                           abi=DISTRIBUTION_ABI)
+async_supply_contract = async_web3.eth.contract(address=web3.to_checksum_address(SUPPLY_PROXY_ADDRESS),
+                                                abi=SUPPLY_ABI)
+async_distribution_contract = async_web3.eth.contract(address=web3.to_checksum_address(DISTRIBUTION_PROXY_ADDRESS),
+                                                      abi=DISTRIBUTION_ABI)
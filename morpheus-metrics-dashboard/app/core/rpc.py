@@ -0,0 +1,292 @@
+"""
+Shared JSON-RPC providers, one per chain.
+
+Every chain gets a single `Web3` backed by a `FailoverHTTPProvider`: one pooled keep-alive `requests.Session` for
+all of its RPC URLs, with each URL health scored. Requests go to the healthiest URL that isn't cooling down; a
+connection error, timeout, 429 or 5xx marks the URL down for an exponentially growing cooldown (or the server's
+Retry-After) and the request moves to the next URL. A URL's score recovers with time once it stops failing, so the
+primary URL takes the traffic back after an outage.
+
+The chain's `AsyncWeb3` (`AsyncFailoverHTTPProvider`, on aiohttp) shares the same URL health, and bounds how many
+of its requests are in flight at once so async refreshes running side by side can't flood the provider.
+"""
+import asyncio
+import logging
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+import aiohttp
+import requests
+from requests.adapters import HTTPAdapter
+from web3 import AsyncWeb3, Web3
+from web3.providers.async_base import AsyncJSONBaseProvider
+from web3.providers.base import JSONBaseProvider
+from web3.types import RPCEndpoint, RPCResponse
+from app.core.rpc_cache import RpcResponseCache, RpcCacheMiddleware
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RPC_URL = "http://localhost:8545"
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+HEALTH_RECOVERY_HALF_LIFE = 5 * 60  # Seconds for half of a URL's lost health score to come back
+FAILURE_PENALTY = 0.5  # Fraction of the health score a failed request takes away
+
+
+class RpcEndpoint:
+    """Health state of one RPC URL."""
+
+    def __init__(self, url: str):
+        self.url = url
+        self.score = 1.0
+        self.last_failure = 0.0
+        self.consecutive_failures = 0
+        self.cooldown_until = 0.0
+        self.requests = 0
+        self.failures = 0
+
+    def health(self, now: float) -> float:
+        """Returns the score (0 to 1) with the time since the last failure recovered."""
+        lost = (1.0 - self.score) * 0.5 ** ((now - self.last_failure) / HEALTH_RECOVERY_HALF_LIFE)
+        return 1.0 - lost
+
+    def status(self, now: float) -> Dict:
+        return {
+            "health": round(self.health(now), 4),
+            "cooling_down_for": max(0.0, round(self.cooldown_until - now, 2)),
+            "requests": self.requests,
+            "failures": self.failures
+        }
+
+
+class RpcEndpointPool:
+    """A chain's RPC URLs and their health, shared by its sync and async providers."""
+
+    def __init__(self, urls: List[str], max_attempts: int = 5, backoff_base: float = 0.5, backoff_max: float = 60):
+        # Same default as web3's HTTPProvider when no URL is configured
+        self.endpoints = [RpcEndpoint(url) for url in urls or [DEFAULT_RPC_URL]]
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._lock = threading.Lock()
+
+    def choose(self) -> Tuple[Optional[RpcEndpoint], float]:
+        """Returns the healthiest URL out of cooldown (earlier URLs win ties), or None and the seconds to wait."""
+        with self._lock:
+            now = time.monotonic()
+            available = [endpoint for endpoint in self.endpoints if endpoint.cooldown_until <= now]
+            if not available:
+                return None, min(min(e.cooldown_until for e in self.endpoints) - now, self.backoff_max)
+            # Scores are compared to one decimal so a recovered URL gets its turn back before it is fully healed
+            endpoint = max(available, key=lambda e: round(e.health(now), 1))
+            endpoint.requests += 1
+            return endpoint, 0.0
+
+    def record_success(self, endpoint: RpcEndpoint) -> None:
+        with self._lock:
+            endpoint.consecutive_failures = 0
+
+    def record_failure(self, endpoint: RpcEndpoint, error: Exception, retry_after: Optional[float]) -> None:
+        with self._lock:
+            now = time.monotonic()
+            endpoint.score = endpoint.health(now) * (1 - FAILURE_PENALTY)
+            endpoint.last_failure = now
+            endpoint.failures += 1
+            endpoint.consecutive_failures += 1
+            cooldown = retry_after if retry_after is not None else \
+                self.backoff_base * 2 ** (endpoint.consecutive_failures - 1)
+            cooldown = min(cooldown, self.backoff_max)
+            endpoint.cooldown_until = now + cooldown
+        logger.warning(f"RPC request failed ({str(error) or type(error).__name__}), "
+                       f"URL {self.endpoints.index(endpoint)} cooling down for {cooldown:.1f}s")
+
+    def health_report(self) -> List[Dict]:
+        now = time.monotonic()
+        with self._lock:
+            return [endpoint.status(now) for endpoint in self.endpoints]
+
+
+def _retry_after(headers) -> Optional[float]:
+    try:
+        return float(headers["Retry-After"])
+    except (KeyError, ValueError):
+        return None
+
+
+class FailoverHTTPProvider(JSONBaseProvider):
+    """HTTP JSON-RPC provider that spreads a chain's requests over several URLs by health."""
+
+    def __init__(self, endpoint_pool: RpcEndpointPool, pool_size: int = 20, timeout: float = 30, **kwargs: Any):
+        self.endpoint_pool = endpoint_pool
+        self.timeout = timeout
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=len(endpoint_pool.endpoints), pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({"Content-Type": "application/json", "Connection": "keep-alive"})
+        super().__init__(**kwargs)
+
+    def __str__(self) -> str:
+        return f"RPC connection with failover over {len(self.endpoint_pool.endpoints)} URLs"
+
+    def _post(self, request_data: bytes) -> bytes:
+        last_error = None
+        for _ in range(self.endpoint_pool.max_attempts):
+            endpoint, wait = self.endpoint_pool.choose()
+            if endpoint is None:
+                time.sleep(wait)
+                continue
+
+            retry_after = None
+            try:
+                response = self.session.post(endpoint.url, data=request_data, timeout=self.timeout)
+                if response.status_code not in RETRYABLE_STATUS_CODES:
+                    response.raise_for_status()
+                    self.endpoint_pool.record_success(endpoint)
+                    return response.content
+                retry_after = _retry_after(response.headers)
+                last_error = requests.HTTPError(f"{response.status_code} from RPC", response=response)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                last_error = e
+            self.endpoint_pool.record_failure(endpoint, last_error, retry_after)
+
+        raise last_error or requests.ConnectionError("No RPC URL became available")
+
+    def make_request(self, method: RPCEndpoint, params: Any) -> RPCResponse:
+        return self.decode_rpc_response(self._post(self.encode_rpc_request(method, params)))
+
+    def make_batch_request(self, batch_requests: List[Tuple[RPCEndpoint, Any]]) -> List[RPCResponse]:
+        responses = self.decode_rpc_response(self._post(self.encode_batch_rpc_request(batch_requests)))
+        return sorted(responses, key=lambda response: response["id"])
+
+
+class AsyncFailoverHTTPProvider(AsyncJSONBaseProvider):
+    """
+    Async counterpart of `FailoverHTTPProvider`, with at most `max_concurrency` requests in flight. The aiohttp
+    session and the semaphore belong to the event loop that first uses them, and are rebuilt for a new loop.
+    """
+
+    def __init__(self, endpoint_pool: RpcEndpointPool, pool_size: int = 20, timeout: float = 30,
+                 max_concurrency: int = 16, **kwargs: Any):
+        self.endpoint_pool = endpoint_pool
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self._loop = None
+        self._session = None
+        self._semaphore = None
+        super().__init__(**kwargs)
+
+    def __str__(self) -> str:
+        return f"Async RPC connection with failover over {len(self.endpoint_pool.endpoints)} URLs"
+
+    def _get_session(self) -> Tuple[aiohttp.ClientSession, asyncio.Semaphore]:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._session is None or self._session.closed:
+            self._loop = loop
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=60),
+                headers={"Content-Type": "application/json"},
+                timeout=aiohttp.ClientTimeout(total=self.timeout))
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._session, self._semaphore
+
+    async def _post(self, request_data: bytes) -> bytes:
+        session, semaphore = self._get_session()
+        last_error = None
+        async with semaphore:
+            for _ in range(self.endpoint_pool.max_attempts):
+                endpoint, wait = self.endpoint_pool.choose()
+                if endpoint is None:
+                    await asyncio.sleep(wait)
+                    continue
+
+                retry_after = None
+                try:
+                    async with session.post(endpoint.url, data=request_data) as response:
+                        if response.status not in RETRYABLE_STATUS_CODES:
+                            response.raise_for_status()
+                            content = await response.read()
+                            self.endpoint_pool.record_success(endpoint)
+                            return content
+                        retry_after = _retry_after(response.headers)
+                        last_error = aiohttp.ClientResponseError(response.request_info, response.history,
+                                                                 status=response.status, message="from RPC")
+                except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                    last_error = e
+                self.endpoint_pool.record_failure(endpoint, last_error, retry_after)
+
+        raise last_error or aiohttp.ClientConnectionError("No RPC URL became available")
+
+    async def make_request(self, method: RPCEndpoint, params: Any) -> RPCResponse:
+        return self.decode_rpc_response(await self._post(self.encode_rpc_request(method, params)))
+
+    async def make_batch_request(self, batch_requests: List[Tuple[RPCEndpoint, Any]]) -> List[RPCResponse]:
+        responses = self.decode_rpc_response(await self._post(self.encode_batch_rpc_request(batch_requests)))
+        return sorted(responses, key=lambda response: response["id"])
+
+    async def disconnect(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+
+class ProviderRegistry:
+    """Builds each chain's providers and `Web3`s once and hands the same ones to every module."""
+
+    def __init__(self):
+        self._chains = {}
+        self._web3s = {}
+        self._async_web3s = {}
+        self._lock = threading.Lock()
+
+    def register(self, chain: str, urls: List[str], pool_size: int = 20, timeout: float = 30,
+                 max_attempts: int = 5, backoff_base: float = 0.5, backoff_max: float = 60,
+                 max_concurrency: int = 16, response_cache: Optional[RpcResponseCache] = None) -> None:
+        with self._lock:
+            self._chains[chain] = {
+                "endpoint_pool": RpcEndpointPool(urls, max_attempts, backoff_base, backoff_max),
+                "pool_size": pool_size,
+                "timeout": timeout,
+                "max_concurrency": max_concurrency,
+                "response_cache": response_cache
+            }
+            self._web3s.pop(chain, None)
+            self._async_web3s.pop(chain, None)
+
+    def _get_chain(self, chain: str) -> Dict:
+        if chain not in self._chains:
+            raise KeyError(f"No RPC URLs registered for chain '{chain}'")
+        return self._chains[chain]
+
+    @staticmethod
+    def _with_response_cache(w3, chain: str, options: Dict):
+        # Innermost layer, so it sees and stores the raw RPC results
+        if options["response_cache"] is not None:
+            w3.middleware_onion.inject(RpcCacheMiddleware.build(options["response_cache"], chain),
+                                       name="rpc_response_cache", layer=0)
+        return w3
+
+    def get_web3(self, chain: str) -> Web3:
+        with self._lock:
+            if chain not in self._web3s:
+                options = self._get_chain(chain)
+                w3 = Web3(FailoverHTTPProvider(options["endpoint_pool"], options["pool_size"], options["timeout"]))
+                self._web3s[chain] = self._with_response_cache(w3, chain, options)
+            return self._web3s[chain]
+
+    def get_async_web3(self, chain: str) -> AsyncWeb3:
+        with self._lock:
+            if chain not in self._async_web3s:
+                options = self._get_chain(chain)
+                async_w3 = AsyncWeb3(AsyncFailoverHTTPProvider(
+                    options["endpoint_pool"], options["pool_size"], options["timeout"], options["max_concurrency"]))
+                self._async_web3s[chain] = self._with_response_cache(async_w3, chain, options)
+            return self._async_web3s[chain]
+
+    def health_report(self) -> Dict[str, List[Dict]]:
+        with self._lock:
+            chains = dict(self._chains)
+        return {chain: options["endpoint_pool"].health_report() for chain, options in chains.items()}
+
+
+rpc_registry = ProviderRegistry()
@@ -0,0 +1,208 @@
+"""
+On-disk cache of JSON-RPC results that can never change.
+
+A call pinned to a finalized block (`eth_call` at block N, `eth_getBlockByNumber(N)`), a log query whose whole range
+is finalized and anything addressed by block hash returns the same result forever, so its result is stored under
+the SHA-256 of (chain, method, params) and replayed from disk afterwards. Calls on "latest" or on blocks that aren't
+finalized yet always go to the node.
+
+`eth_chainId`, which web3 asks for before every contract call, is kept in memory once known.
+
+The finalized block is only looked up (`eth_getBlockByNumber("finalized")`) when a request targets a block above the
+last known one, at most once per `finality_ttl` seconds.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+from web3.middleware.base import Web3Middleware
+from web3.types import RPCEndpoint, RPCResponse
+
+logger = logging.getLogger(__name__)
+
+BLOCK_TAGS = {"latest", "pending", "safe", "finalized", "earliest"}
+
+
+def _block_number(block_identifier) -> Optional[int]:
+    """Returns the block number of an explicit block identifier, None for tags and missing values."""
+    if isinstance(block_identifier, int) and not isinstance(block_identifier, bool):
+        return block_identifier
+    if isinstance(block_identifier, str) and block_identifier not in BLOCK_TAGS:
+        try:
+            return int(block_identifier, 16) if block_identifier.startswith("0x") else int(block_identifier)
+        except ValueError:
+            return None
+    return None
+
+
+def cacheable_block(method: str, params: Any) -> Tuple[bool, Optional[int]]:
+    """
+    Returns whether the request can be cached and the highest block its result depends on (None when it is
+    addressed by block hash and is immutable whatever the finalized block is).
+    """
+    params = params or []
+    if method == "eth_call" and len(params) >= 2:
+        block = _block_number(params[1])
+        return block is not None, block
+    if method == "eth_getBlockByNumber" and params:
+        block = _block_number(params[0])
+        return block is not None, block
+    if method == "eth_getBlockByHash":
+        return True, None
+    if method == "eth_getLogs" and params and isinstance(params[0], dict):
+        log_filter = params[0]
+        if log_filter.get("blockHash"):
+            return True, None
+        from_block, to_block = _block_number(log_filter.get("fromBlock")), _block_number(log_filter.get("toBlock"))
+        return from_block is not None and to_block is not None, to_block
+    return False, None
+
+
+class RpcResponseCache:
+    """Content addressed store of immutable RPC results, one JSON file per request."""
+
+    def __init__(self, cache_dir: str, finality_ttl: float = 60):
+        self.cache_dir = cache_dir
+        self.finality_ttl = finality_ttl
+        self._finalized = {}  # chain -> (finalized block, checked at)
+        self.chain_ids = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+
+    def _path(self, chain: str, method: str, params: Any) -> str:
+        key = json.dumps([chain, method, params], sort_keys=True, separators=(",", ":"), default=str)
+        digest = hashlib.sha256(key.encode()).hexdigest()
+        return os.path.join(self.cache_dir, chain, digest[:2], f"{digest}.json")
+
+    def get(self, chain: str, method: str, params: Any) -> Optional[Any]:
+        path = self._path(chain, method, params)
+        try:
+            with open(path, 'r') as f:
+                result = json.load(f)["result"]
+        except (FileNotFoundError, ValueError, KeyError):
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return result
+
+    def put(self, chain: str, method: str, params: Any, result: Any) -> None:
+        path = self._path(chain, method, params)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({"result": result}, f)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self.writes += 1
+
+    def known_finalized(self, chain: str, block: int) -> Tuple[bool, bool]:
+        """Returns whether `block` is known to be finalized, and whether the finalized block should be looked up."""
+        with self._lock:
+            finalized, checked_at = self._finalized.get(chain, (-1, 0.0))
+        if block <= finalized:
+            return True, False
+        return False, time.monotonic() - checked_at >= self.finality_ttl
+
+    def set_finalized(self, chain: str, response: RPCResponse) -> None:
+        result = response.get("result") if isinstance(response, dict) else None
+        finalized = _block_number(result.get("number")) if isinstance(result, dict) else None
+        with self._lock:
+            previous = self._finalized.get(chain, (-1, 0.0))[0]
+            self._finalized[chain] = (max(previous, finalized if finalized is not None else -1), time.monotonic())
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "writes": self.writes}
+
+
+class RpcCacheMiddleware(Web3Middleware):
+    """
+    Serves immutable requests from an `RpcResponseCache`, built per chain with
+    `RpcCacheMiddleware.build(cache, chain)` and injected as the innermost layer so it stores raw results.
+    """
+    cache = None
+    chain = None
+
+    @staticmethod
+    def build(cache: RpcResponseCache, chain: str):
+        def builder(w3):
+            middleware = RpcCacheMiddleware(w3)
+            middleware.cache = cache
+            middleware.chain = chain
+            return middleware
+        return builder
+
+    def _lookup(self, method: str, params: Any) -> Tuple[bool, Optional[int], Optional[RPCResponse]]:
+        if method == "eth_chainId":
+            chain_id = self.cache.chain_ids.get(self.chain)
+            return True, None, {"jsonrpc": "2.0", "id": 0, "result": chain_id} if chain_id is not None else None
+        cacheable, block = cacheable_block(method, params)
+        if not cacheable:
+            return False, None, None
+        result = self.cache.get(self.chain, method, params)
+        if result is not None:
+            return True, block, {"jsonrpc": "2.0", "id": 0, "result": result}
+        return True, block, None
+
+    def _store(self, method: str, params: Any, response: RPCResponse) -> None:
+        if "error" in response or response.get("result") is None:
+            return
+        if method == "eth_chainId":
+            self.cache.chain_ids[self.chain] = response["result"]
+        else:
+            self.cache.put(self.chain, method, params, response["result"])
+
+    def wrap_make_request(self, make_request):
+        def middleware(method: RPCEndpoint, params: Any) -> RPCResponse:
+            cacheable, block, cached = self._lookup(method, params)
+            if cached is not None or not cacheable:
+                return cached if cached is not None else make_request(method, params)
+
+            response = make_request(method, params)
+            if block is not None:
+                finalized, refresh = self.cache.known_finalized(self.chain, block)
+                if refresh:
+                    try:
+                        finality = make_request(RPCEndpoint("eth_getBlockByNumber"), ["finalized", False])
+                    except Exception as e:
+                        logger.warning(f"Finalized block lookup failed, not caching: {str(e)}")
+                        finality = {}
+                    self.cache.set_finalized(self.chain, finality)
+                    finalized, _ = self.cache.known_finalized(self.chain, block)
+                if not finalized:
+                    return response
+            self._store(method, params, response)
+            return response
+
+        return middleware
+
+    async def async_wrap_make_request(self, make_request):
+        async def middleware(method: RPCEndpoint, params: Any) -> RPCResponse:
+            cacheable, block, cached = self._lookup(method, params)
+            if cached is not None or not cacheable:
+                return cached if cached is not None else await make_request(method, params)
+
+            response = await make_request(method, params)
+            if block is not None:
+                finalized, refresh = self.cache.known_finalized(self.chain, block)
+                if refresh:
+                    try:
+                        finality = await make_request(RPCEndpoint("eth_getBlockByNumber"), ["finalized", False])
+                    except Exception as e:
+                        logger.warning(f"Finalized block lookup failed, not caching: {str(e)}")
+                        finality = {}
+                    self.cache.set_finalized(self.chain, finality)
+                    finalized, _ = self.cache.known_finalized(self.chain, block)
+                if not finalized:
+                    return response
+            self._store(method, params, response)
+            return response
+
+        return middleware
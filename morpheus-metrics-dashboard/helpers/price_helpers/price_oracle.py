@@ -0,0 +1,119 @@
+"""
+Token prices shared by every endpoint and background task.
+
+Prices are cached per symbol for PRICE_CACHE_TTL_SECONDS, concurrent requests for the same symbol wait on a single
+in-flight fetch, and sources are tried in order until one returns a price. All requests go through one pooled
+HTTP client.
+"""
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import Future
+from typing import Optional, Tuple
+import httpx
+from app.core.config import (MOR_ARBITRUM_ADDRESS, STETH_MAINNET_ADDRESS, DEXSCREENER_TOKENS_URL,
+                             COINGECKO_SIMPLE_PRICE_URL, PRICE_CACHE_TTL_SECONDS, PRICE_REQUEST_TIMEOUT)
+
+logger = logging.getLogger(__name__)
+
+# Ordered price sources per symbol: (source name, (DexScreener chain id, token address) or CoinGecko id)
+PRICE_SOURCES = {
+    "MOR": [("dexscreener", ("arbitrum", MOR_ARBITRUM_ADDRESS)), ("coingecko", "morpheusai")],
+    "STETH": [("coingecko", "staked-ether"), ("dexscreener", ("ethereum", STETH_MAINNET_ADDRESS))]
+}
+
+_client = httpx.Client(timeout=PRICE_REQUEST_TIMEOUT,
+                       limits=httpx.Limits(max_connections=10, max_keepalive_connections=5))
+_lock = threading.Lock()
+_prices = {}  # symbol -> (fetched at (monotonic), price)
+_in_flight = {}  # symbol -> Future of the running fetch
+
+
+def _fetch_dexscreener(token: Tuple[str, str]) -> Optional[float]:
+    """
+    Returns the price of the deepest pair on `chain_id` quoting the token as its base token. Pairs where it is the
+    quote token report the other token's price, so they are skipped.
+    """
+    chain_id, token_address = token
+    response = _client.get(DEXSCREENER_TOKENS_URL.format(token_address))
+    response.raise_for_status()
+    pairs = [pair for pair in response.json().get('pairs') or []
+             if pair.get('chainId') == chain_id and pair.get('priceUsd')
+             and (pair.get('baseToken') or {}).get('address', '').lower() == token_address.lower()]
+    if not pairs:
+        return None
+    deepest = max(pairs, key=lambda pair: float((pair.get('liquidity') or {}).get('usd') or 0))
+    return float(deepest['priceUsd'])
+
+
+def _fetch_coingecko(coin_id: str) -> Optional[float]:
+    response = _client.get(COINGECKO_SIMPLE_PRICE_URL, params={"ids": coin_id, "vs_currencies": "usd"})
+    response.raise_for_status()
+    data = response.json()
+    if coin_id in data and "usd" in data[coin_id]:
+        return float(data[coin_id]["usd"])
+    return None
+
+
+_FETCHERS = {"dexscreener": _fetch_dexscreener, "coingecko": _fetch_coingecko}
+
+
+def _fetch_price(symbol: str) -> Optional[float]:
+    """Tries each source of `symbol` in order, returning the first price found."""
+    for source, key in PRICE_SOURCES[symbol]:
+        try:
+            price = _FETCHERS[source](key)
+            if price:
+                return price
+            logger.warning(f"{source} returned no {symbol} price")
+        except Exception as e:
+            logger.warning(f"{source} {symbol} price request failed: {str(e) or type(e).__name__}")
+    return None
+
+
+def get_price(symbol: str) -> Optional[float]:
+    """
+    Returns the USD price of `symbol` ('MOR' or 'STETH'), or None when no source has one and it was never fetched.
+
+    When every source fails the last fetched price is returned, however old it is.
+    """
+    symbol = symbol.upper()
+    if symbol not in PRICE_SOURCES:
+        raise ValueError(f"Unknown price symbol: {symbol}")
+
+    with _lock:
+        cached = _prices.get(symbol)
+        if cached and time.monotonic() - cached[0] < PRICE_CACHE_TTL_SECONDS:
+            return cached[1]
+        future = _in_flight.get(symbol)
+        is_owner = future is None
+        if is_owner:
+            future = Future()
+            _in_flight[symbol] = future
+
+    # Another caller is already fetching this symbol, share its result
+    if not is_owner:
+        return future.result()
+
+    try:
+        price = _fetch_price(symbol)
+        with _lock:
+            if price is not None:
+                _prices[symbol] = (time.monotonic(), price)
+            elif cached:
+                logger.warning(f"Using the last fetched {symbol} price, all sources failed")
+                price = cached[1]
+        future.set_result(price)
+        return price
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with _lock:
+            _in_flight.pop(symbol, None)
+
+
+async def get_price_async(symbol: str) -> Optional[float]:
+    """Async version of `get_price`, the fetch runs in a worker thread so the event loop isn't blocked."""
+    return await asyncio.to_thread(get_price, symbol)
@@ -0,0 +1,73 @@
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from helpers.series_helpers.downsampling import day_ordinal
+
+# Sorted day ordinals per series name, with the source version they were built from
+_sorted_series = {}
+
+
+def parse_since(since: str) -> int:
+    """Accepts a cursor (a day ordinal, as returned by the endpoints) or a 'YYYY-MM-DD' / 'DD/MM/YYYY' date."""
+    since = since.strip()
+    if since.isdigit():
+        return int(since)
+    return day_ordinal(since)
+
+
+def sorted_day_ordinals(name: str, version, dates: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Returns the series' day ordinals sorted ascending and the positions they come from. Built once per source
+    `version`, a `version` of None is never cached.
+    """
+    cached = _sorted_series.get(name)
+    if cached and version is not None and cached[0] == version:
+        return cached[1], cached[2]
+
+    day_ordinals = np.array([day_ordinal(d) for d in dates], dtype=np.int64)
+    order = np.argsort(day_ordinals, kind='stable')
+    sorted_days = day_ordinals[order]
+    if version is not None:
+        _sorted_series[name] = (version, sorted_days, order)
+    return sorted_days, order
+
+
+def newer_positions(name: str, version, dates: List[str], since: int) -> Tuple[List[int], Optional[int]]:
+    """
+    Returns the positions (in the original order) of the points dated after `since`, found with a binary search,
+    and the series' newest day ordinal.
+    """
+    sorted_days, order = sorted_day_ordinals(name, version, dates)
+    if not len(sorted_days):
+        return [], None
+
+    start = int(np.searchsorted(sorted_days, since, side='right'))
+    return np.sort(order[start:]).tolist(), int(sorted_days[-1])
+
+
+def next_cursor(since: int, *newest_days: Optional[int]) -> int:
+    """
+    The cursor to poll with next. It points just before the newest day, which can still change until the day ends,
+    so passing it back re-sends that day along with anything newer.
+    """
+    newest = max((day for day in newest_days if day is not None), default=None)
+    return since if newest is None else max(since, newest - 1)
+
+
+def pairs_since(name: str, version, pairs: List[List], since: int) -> Tuple[List[List], Optional[int]]:
+    """Filters [[date, value], ...] lists to the points after `since`."""
+    positions, newest = newer_positions(name, version, [p[0] for p in pairs], since)
+    return [pairs[i] for i in positions], newest
+
+
+def records_since(name: str, version, records: List[Dict], since: int) -> Tuple[List[Dict], Optional[int]]:
+    """Filters [{"date": ...}, ...] lists to the points after `since`."""
+    positions, newest = newer_positions(name, version, [r['date'] for r in records], since)
+    return [records[i] for i in positions], newest
+
+
+def date_map_since(name: str, version, mapping: Dict[str, object], since: int) -> Tuple[Dict[str, object],
+                                                                                        Optional[int]]:
+    """Filters {date: value} mappings to the points after `since`."""
+    dates = list(mapping.keys())
+    positions, newest = newer_positions(name, version, dates, since)
+    return {dates[i]: mapping[dates[i]] for i in positions}, newest
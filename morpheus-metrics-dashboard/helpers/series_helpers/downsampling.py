@@ -0,0 +1,121 @@
+from collections import OrderedDict
+from datetime import datetime, date
+from typing import Callable, Dict, List
+import numpy as np
+
+DOWNSAMPLING_METHODS = ('lttb', 'minmax')
+MIN_POINTS = 3
+DOWNSAMPLED_CACHE_SIZE = 64  # Downsampled results kept in memory, least recently used evicted first
+
+# Downsampled series by (series name, max_points, method), with their source version
+_downsampled_series = OrderedDict()
+
+
+def day_ordinal(date_str: str) -> int:
+    """Converts a 'DD/MM/YYYY' or ISO ('YYYY-MM-DD') date string to a day ordinal."""
+    if '/' in date_str:
+        return datetime.strptime(date_str, '%d/%m/%Y').toordinal()
+    return date.fromisoformat(date_str[:10]).toordinal()
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, max_points: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets: keeps the first and last points and, for each bucket in between, the point
+    forming the largest triangle with the previously kept point and the average of the next bucket.
+    `x` must be ascending.
+    """
+    n = len(x)
+    if max_points >= n or max_points < MIN_POINTS:
+        return np.arange(n)
+
+    edges = np.floor(np.linspace(1, n - 1, max_points - 1)).astype(int)
+    selected = np.empty(max_points, dtype=int)
+    selected[0], selected[-1] = 0, n - 1
+    previous = 0
+
+    for i in range(max_points - 2):
+        start, end = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            next_x, next_y = x[end:edges[i + 2]].mean(), y[end:edges[i + 2]].mean()
+        else:
+            next_x, next_y = x[n - 1], y[n - 1]
+
+        areas = np.abs((x[previous] - next_x) * (y[start:end] - y[previous]) -
+                       (x[previous] - x[start:end]) * (next_y - y[previous]))
+        previous = start + int(np.argmax(areas))
+        selected[i + 1] = previous
+
+    return selected
+
+
+def minmax_indices(y: np.ndarray, max_points: int) -> np.ndarray:
+    """Keeps the first and last points plus the minimum and maximum of each of (max_points - 2) / 2 buckets."""
+    n = len(y)
+    if max_points >= n or max_points < MIN_POINTS:
+        return np.arange(n)
+
+    bucket_count = max(1, (max_points - 2) // 2)
+    edges = np.floor(np.linspace(1, n - 1, bucket_count + 1)).astype(int)
+    picks = [0, n - 1]
+    for start, end in zip(edges[:-1], edges[1:]):
+        if end > start:
+            picks.append(start + int(np.argmin(y[start:end])))
+            picks.append(start + int(np.argmax(y[start:end])))
+    return np.unique(picks)
+
+
+def downsample_positions(dates: List[str], values: List[float], max_points: int, method: str = 'lttb') -> List[int]:
+    """
+    Returns the positions (in the original order, which may be latest first) of the points to keep.
+    """
+    x = np.array([day_ordinal(d) for d in dates], dtype=np.float64)
+    y = np.asarray(values, dtype=np.float64)
+    order = np.argsort(x, kind='stable')
+
+    if method == 'minmax':
+        kept = minmax_indices(y[order], max_points)
+    else:
+        kept = lttb_indices(x[order], y[order], max_points)
+
+    positions = np.sort(order[kept])
+    return positions.tolist()
+
+
+def downsample_pairs(pairs: List[List], max_points: int, method: str = 'lttb') -> List[List]:
+    """Downsamples [[date, value], ...] lists such as the price and volume series."""
+    positions = downsample_positions([p[0] for p in pairs], [p[1] for p in pairs], max_points, method)
+    return [pairs[i] for i in positions]
+
+
+def downsample_records(records: List[Dict], value_key: str, max_points: int, method: str = 'lttb') -> List[Dict]:
+    """Downsamples [{"date": ..., value_key: ...}, ...] lists such as the combined supply data."""
+    positions = downsample_positions([r['date'] for r in records], [r[value_key] for r in records], max_points,
+                                     method)
+    return [records[i] for i in positions]
+
+
+def downsample_date_map(mapping: Dict[str, object], max_points: int, method: str = 'lttb',
+                        value: Callable = lambda v: v) -> Dict[str, object]:
+    """Downsamples {date: value} mappings, `value` extracts the number to shape the series by."""
+    dates = list(mapping.keys())
+    positions = downsample_positions(dates, [value(v) for v in mapping.values()], max_points, method)
+    return {dates[i]: mapping[dates[i]] for i in positions}
+
+
+def get_downsampled(name: str, max_points: int, method: str, version, compute: Callable):
+    """
+    Returns the downsampled series for (name, max_points, method), computing it only once per source `version`.
+    Callers return the series itself when `max_points` isn't below its length, so only real reductions are kept.
+    """
+    key = (name, max_points, method)
+    cached = _downsampled_series.get(key)
+    if cached and cached[0] == version:
+        _downsampled_series.move_to_end(key)
+        return cached[1]
+
+    result = compute()
+    _downsampled_series[key] = (version, result)
+    _downsampled_series.move_to_end(key)
+    while len(_downsampled_series) > DOWNSAMPLED_CACHE_SIZE:
+        _downsampled_series.popitem(last=False)
+    return result
@@ -2,20 +2,18 @@ import csv
 import logging
 import os
 from datetime import datetime
-from web3 import Web3
-from app.core.config import ETH_RPC_URL, distribution_contract
+from app.core.config import web3, distribution_contract
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-RPC_URL = ETH_RPC_URL
 START_BLOCK = 20180927
 BATCH_SIZE = 1000000
 
 
 class EventProcessor:
     def __init__(self, output_dir):
-        self.web3 = Web3(Web3.HTTPProvider(RPC_URL))
+        self.web3 = web3
         self.contract = distribution_contract
         self.distribution_abi = self.contract.abi
         self.output_dir = output_dir
@@ -104,7 +102,7 @@ class EventProcessor:
 
 class OptimizedMultiplierCalculator:
     def __init__(self):
-        self.web3 = Web3(Web3.HTTPProvider(RPC_URL))
+        self.web3 = web3
         self.contract = distribution_contract
 
     def get_user_multipliers(self, input_csv, output_csv):
@@ -146,7 +144,7 @@ class OptimizedMultiplierCalculator:
 
 class OptimizedRewardCalculator:
     def __init__(self):
-        self.web3 = Web3(Web3.HTTPProvider(RPC_URL))
+        self.web3 = web3
         self.contract = distribution_contract
 
     def calculate_rewards(self, input_csv, output_csv):
@@ -1,54 +1,169 @@
+import hashlib
+import os
+import numpy as np
 import pandas as pd
-from typing import List, Dict
-from datetime import datetime
+from typing import List, Dict, Union
+from datetime import datetime, date
 import logging
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+EMISSION_CATEGORIES = ['Capital Emission', 'Code Emission', 'Compute Emission', 'Community Emission',
+                       'Protection Emission']
+INDEX_COLUMNS = EMISSION_CATEGORIES + ['Total Emission', 'Total Supply']
+RESOLUTIONS = ('daily', 'weekly', 'monthly')
 
-def read_emission_schedule(today_date: datetime, file_path: str) -> Dict:
+# Compiled indexes by CSV path, together with the (mtime, size) they were validated against
+_emission_indexes = {}
+
+
+class EmissionScheduleIndex:
+    """
+    Emission schedule compiled into columnar arrays keyed by day ordinal (`date.toordinal()`).
+
+    `values` holds the CSV columns as they are (the category columns are already cumulative, `Total Emission` is
+    the amount emitted that day) and `prefix_sums` holds their running sums, so any date lookup is a binary search
+    on `day_ordinals` plus a couple of row reads.
+    """
+
+    def __init__(self, day_ordinals: np.ndarray, values: np.ndarray, prefix_sums: np.ndarray, columns: List[str]):
+        self.day_ordinals = day_ordinals
+        self.values = values
+        self.prefix_sums = prefix_sums
+        self.columns = list(columns)
+        self.column_index = {column: i for i, column in enumerate(self.columns)}
+
+        # Emitted-to-date per category plus the overall total, which is the 'Total Supply' column
+        cumulative_columns = [self.column_index[c] for c in EMISSION_CATEGORIES] + [self.column_index['Total Supply']]
+        self.cumulative = self.values[:, cumulative_columns]
+        self.cumulative_labels = EMISSION_CATEGORIES + ['Total Emission']
+        self._cumulative_padded = np.vstack([np.zeros((1, self.cumulative.shape[1])), self.cumulative])
+
+        epoch_ordinal = date(1970, 1, 1).toordinal()
+        self.month_keys = (self.day_ordinals - epoch_ordinal).astype('datetime64[D]').astype('datetime64[M]') \
+            .astype(np.int64)
+
+    def position(self, day_ordinal: int) -> int:
+        """Returns the row of the last scheduled day on or before `day_ordinal`, or -1 if there is none."""
+        return int(np.searchsorted(self.day_ordinals, day_ordinal, side='right')) - 1
+
+    def cumulative_before(self, positions: np.ndarray) -> np.ndarray:
+        """Returns the cumulative rows preceding `positions`, with zeros before the first scheduled day."""
+        return self._cumulative_padded[positions]
+
+
+def to_day_ordinal(value: Union[str, datetime, date]) -> int:
+    """Converts a `date`/`datetime` or a '%m/%d/%y' (or ISO) date string to a day ordinal."""
+    if isinstance(value, (datetime, date)):
+        return value.toordinal()
+    try:
+        return datetime.strptime(value, '%m/%d/%y').toordinal()
+    except ValueError:
+        return date.fromisoformat(value).toordinal()
+
+
+def _hash_file(file_path: str) -> str:
+    sha256 = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def _compile_emission_index(file_path: str) -> EmissionScheduleIndex:
+    df = pd.read_csv(file_path, sep='|', skipinitialspace=True)
+    df = df.dropna(axis=1, how='all')  # Remove empty columns
+    df.columns = df.columns.str.strip()
+
+    dates = pd.to_datetime(df['Date'].astype(str).str.strip(), format='%m/%d/%y', errors='coerce')
+    values = df[INDEX_COLUMNS].apply(pd.to_numeric, errors='coerce')
+
+    # Drops the markdown separator row and anything else without a usable date
+    valid = dates.notna().to_numpy()
+    epoch_ordinal = date(1970, 1, 1).toordinal()
+    day_ordinals = dates[valid].to_numpy().astype('datetime64[D]').astype(np.int64) + epoch_ordinal
+    values = values[valid].fillna(0).to_numpy(dtype=np.float64)
+
+    order = np.argsort(day_ordinals, kind='stable')
+    day_ordinals, values = day_ordinals[order], values[order]
+
+    return EmissionScheduleIndex(day_ordinals, values, np.cumsum(values, axis=0), INDEX_COLUMNS)
+
+
+def load_emission_index(file_path: str) -> EmissionScheduleIndex:
+    """
+    Returns the compiled index for an emission schedule CSV.
+
+    The index is kept in memory and in a `<name>_index.npz` artifact next to the CSV. The artifact is rebuilt when
+    the SHA-256 of the CSV no longer matches the one it was compiled from; the hash is only recomputed when the
+    file's mtime or size changes.
+    """
+    stat = os.stat(file_path)
+    signature = (stat.st_mtime_ns, stat.st_size)
+    cached = _emission_indexes.get(file_path)
+    if cached and cached[0] == signature:
+        return cached[1]
+
+    file_hash = _hash_file(file_path)
+    artifact_path = f"{os.path.splitext(file_path)[0]}_index.npz"
+    index = None
+
+    if os.path.exists(artifact_path):
+        try:
+            with np.load(artifact_path) as artifact:
+                if str(artifact['source_hash']) == file_hash:
+                    index = EmissionScheduleIndex(artifact['day_ordinals'], artifact['values'],
+                                                  artifact['prefix_sums'], artifact['columns'].tolist())
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable emission index {artifact_path}: {str(e)}")
+
+    if index is None:
+        index = _compile_emission_index(file_path)
+        try:
+            with open(artifact_path, 'wb') as f:
+                np.savez(f, source_hash=np.array(file_hash), day_ordinals=index.day_ordinals, values=index.values,
+                         prefix_sums=index.prefix_sums, columns=np.array(index.columns))
+        except OSError as e:
+            logger.warning(f"Could not write emission index {artifact_path}: {str(e)}")
+        logger.info(f"Compiled emission schedule index for {file_path}")
+
+    _emission_indexes[file_path] = (signature, index)
+    return index
+
+
+def read_emission_schedule(today_date: Union[str, datetime, date], file_path: str) -> Dict:
     """
-    Read the emission schedule CSV file and return a dictionary with processed data.
+    Read the emission schedule and return the new emissions of the given day and the totals up to it.
 
     Args:
     file_path (str): Path to the CSV file
-    today_date (datetime): Current date
+    today_date (str | datetime): Current date, as a datetime or a '%m/%d/%y' string
 
     Returns:
     Dict: Dictionary containing processed emission data
     """
     try:
-        df = pd.read_csv(file_path, sep='|', skipinitialspace=True)
-        df = df.dropna(axis=1, how='all')  # Remove empty columns
-
-        # Strip whitespace from column names and string columns
-        df.columns = df.columns.str.strip()
-        df = df.apply(lambda x: x.str.strip() if x.dtype == "object" else x)
-
-        df['Date'] = pd.to_datetime(df['Date'], format='%m/%d/%y', errors='coerce')
-        numeric_columns = df.columns.drop(['Day', 'Date'])
-        df[numeric_columns] = df[numeric_columns].apply(pd.to_numeric, errors='coerce')
-
-        # Filter data up to today's date
-        df_until_today = df[df['Date'] <= today_date]
+        index = load_emission_index(file_path)
+        position = index.position(to_day_ordinal(today_date))
 
-        if df_until_today.empty:
+        if position < 0:
             logger.warning("No data found up to the specified date.")
             return {'new_emissions': {}, 'total_emissions': {}}
 
-        # Calculate new emissions for today
-        last_day = df_until_today.iloc[-1]
-        previous_day = df_until_today.iloc[-2] if len(df_until_today) > 1 else pd.Series(0, index=last_day.index)
+        last_day = index.values[position]
+        previous_day = index.values[position - 1] if position > 0 else np.zeros_like(last_day)
+        running_totals = index.prefix_sums[position]
 
-        emission_categories = ['Capital Emission', 'Code Emission', 'Compute Emission', 'Community Emission',
-                               'Protection Emission']
-
-        new_emissions = {category: last_day[category] - previous_day[category] for category in emission_categories}
-        total_emissions = {category: df_until_today[category].sum() for category in emission_categories}
+        new_emissions = {}
+        total_emissions = {}
+        for category in EMISSION_CATEGORIES:
+            column = index.column_index[category]
+            new_emissions[category] = float(last_day[column] - previous_day[column])
+            total_emissions[category] = float(running_totals[column])
 
         new_emissions['Total Emission'] = sum(new_emissions.values())
-        total_emissions['Total Emission'] = df_until_today['Total Emission'].sum()
+        total_emissions['Total Emission'] = float(running_totals[index.column_index['Total Emission']])
 
         logger.info(f"Successfully processed emission data up to {today_date}")
         return {
@@ -63,6 +178,75 @@ def read_emission_schedule(today_date: datetime, file_path: str) -> Dict:
         raise
 
 
+def _emission_dict(labels: List[str], row: np.ndarray) -> Dict[str, float]:
+    return {label: float(value) for label, value in zip(labels, row)}
+
+
+def get_emissions_on_date(day: Union[str, datetime, date], file_path: str) -> Dict:
+    """
+    Returns the new and cumulative emissions per category for a single day of the schedule.
+
+    Dates after the last scheduled day report that last day, dates before the first one raise a ValueError.
+    """
+    index = load_emission_index(file_path)
+    position = index.position(to_day_ordinal(day))
+    if position < 0:
+        raise ValueError(f"{day} is before the start of the emission schedule")
+
+    cumulative = index.cumulative[position]
+    new = cumulative - index.cumulative_before(np.array([position]))[0]
+
+    return {
+        "date": date.fromordinal(int(index.day_ordinals[position])).isoformat(),
+        "new_emissions": _emission_dict(index.cumulative_labels, new),
+        "cumulative_emissions": _emission_dict(index.cumulative_labels, cumulative)
+    }
+
+
+def get_emissions_in_range(start_date: Union[str, datetime, date], end_date: Union[str, datetime, date],
+                           file_path: str, resolution: str = 'daily') -> List[Dict]:
+    """
+    Returns the emission schedule between two dates (inclusive) bucketed by day, ISO week or calendar month.
+
+    Each period reports the amount emitted within it (only counting days inside the requested range) and the
+    cumulative emissions at its last day.
+    """
+    if resolution not in RESOLUTIONS:
+        raise ValueError(f"Unknown resolution '{resolution}', expected one of {', '.join(RESOLUTIONS)}")
+
+    index = load_emission_index(file_path)
+    first = int(np.searchsorted(index.day_ordinals, to_day_ordinal(start_date), side='left'))
+    last = int(np.searchsorted(index.day_ordinals, to_day_ordinal(end_date), side='right'))
+    if first >= last:
+        return []
+
+    day_ordinals = index.day_ordinals[first:last]
+    if resolution == 'daily':
+        period_keys = day_ordinals
+    elif resolution == 'weekly':
+        period_keys = (day_ordinals - 1) // 7  # Ordinal 1 (01/01/0001) is a Monday
+    else:
+        period_keys = index.month_keys[first:last]
+
+    # Rows are sorted, so each period is a contiguous run of equal keys
+    boundaries = np.flatnonzero(np.diff(period_keys)) + 1
+    period_starts = np.concatenate([[0], boundaries]) + first
+    period_ends = np.concatenate([boundaries, [len(period_keys)]]) + first - 1
+
+    cumulative = index.cumulative[period_ends]
+    new = cumulative - index.cumulative_before(period_starts)
+
+    return [
+        {
+            "period_start": date.fromordinal(int(index.day_ordinals[start])).isoformat(),
+            "period_end": date.fromordinal(int(index.day_ordinals[end])).isoformat(),
+            "new_emissions": _emission_dict(index.cumulative_labels, new_row),
+            "cumulative_emissions": _emission_dict(index.cumulative_labels, cumulative_row)
+        }
+        for start, end, new_row, cumulative_row in zip(period_starts, period_ends, new, cumulative)
+    ]
+
+
 def calculate_total_emissions(df: pd.DataFrame) -> List[Dict]:
     """
     Calculate the total emissions for each category.
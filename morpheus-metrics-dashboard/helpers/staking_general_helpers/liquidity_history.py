@@ -0,0 +1,180 @@
+"""
+Daily history of the protocol owned Uniswap V3 liquidity.
+
+Each day is snapshotted at its day-boundary block (the last Arbitrum block before 00:00 UTC) with batched archive
+calls: the owner's position ids, the positions and one slot0 per pool, all read at that block. The series is kept
+as columnar arrays in an npz file, one row per day.
+"""
+import logging
+import os
+import threading
+import time
+from datetime import date, datetime, timezone
+from typing import Dict, List, Optional
+import numpy as np
+from app.core.config import LIQUIDITY_HISTORY_PATH, LIQUIDITY_HISTORY_START_DATE
+from helpers.staking_general_helpers.position import w3, fetch_all_nfts, read_positions
+from helpers.staking_general_helpers.uniswap_v3_valuation import group_positions_by_pool, value_pools
+from helpers.supply_helpers.price_volume_store import load_store
+
+logger = logging.getLogger(__name__)
+
+HISTORY_FIELDS = {
+    "unix_day": np.int64,  # Days since 01/01/1970 of the 00:00 UTC boundary the snapshot was taken at
+    "block_number": np.int64,
+    "position_count": np.int64,
+    "mor_amount": np.float64,
+    "steth_amount": np.float64,
+    "value_in_mor": np.float64  # stETH converted at each pool's own price
+}
+
+_history_lock = threading.Lock()
+_loaded_history = {}
+
+
+def _empty_history() -> Dict[str, np.ndarray]:
+    return {field: np.empty(0, dtype=dtype) for field, dtype in HISTORY_FIELDS.items()}
+
+
+def load_liquidity_history(history_path: str = LIQUIDITY_HISTORY_PATH) -> Dict[str, np.ndarray]:
+    """Returns the history as arrays sorted by `unix_day`, re-read only when the file changes."""
+    if not os.path.exists(history_path):
+        return _empty_history()
+
+    stat = os.stat(history_path)
+    signature = (stat.st_mtime_ns, stat.st_size)
+    cached = _loaded_history.get(history_path)
+    if cached and cached[0] == signature:
+        return cached[1]
+
+    with np.load(history_path) as data:
+        history = {field: data[field] for field in HISTORY_FIELDS}
+    _loaded_history[history_path] = (signature, history)
+    return history
+
+
+def _save_liquidity_history(history: Dict[str, np.ndarray], history_path: str) -> None:
+    tmp_path = f"{history_path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        np.savez(f, **history)
+    os.replace(tmp_path, history_path)
+
+
+class BlockTimestamps:
+    """Caches block timestamps and finds the last block at or before a timestamp."""
+
+    def __init__(self, w3):
+        self.w3 = w3
+        self.timestamps = {}
+
+    def timestamp(self, block_number: int) -> int:
+        if block_number not in self.timestamps:
+            self.timestamps[block_number] = self.w3.eth.get_block(block_number)['timestamp']
+        return self.timestamps[block_number]
+
+    def last_block_before(self, timestamp: int, low: int, high: int) -> int:
+        """
+        Returns the last block in [low, high] with a timestamp at or before `timestamp`, given that `low` is one.
+        Interpolation steps (block times are close to regular) alternate with bisection steps, which bound the
+        worst case.
+        """
+        if self.timestamp(high) <= timestamp:
+            return high
+
+        interpolate = True
+        while high - low > 1:
+            if interpolate:
+                low_time, high_time = self.timestamp(low), self.timestamp(high)
+                guess = low + int((timestamp - low_time) * (high - low) / max(high_time - low_time, 1))
+            else:
+                guess = (low + high) // 2
+            guess = min(max(guess, low + 1), high - 1)
+
+            if self.timestamp(guess) <= timestamp:
+                low = guess
+            else:
+                high = guess
+            interpolate = not interpolate
+        return low
+
+
+def snapshot_liquidity(address: str, block_number: int) -> Dict:
+    """Reads and values the address's positions at `block_number`."""
+    nft_ids = fetch_all_nfts(address, block_identifier=block_number)
+    if not nft_ids:
+        return {"position_count": 0, "mor_amount": 0.0, "steth_amount": 0.0, "value_in_mor": 0.0}
+
+    pools = group_positions_by_pool(read_positions(nft_ids, block_identifier=block_number))
+    # Valued with MOR (token0) at 1, so stETH is converted at the pool price
+    valuation = value_pools(pools, 1.0, 0.0)
+    value_in_mor = sum(float(totals["token0"][0] + totals["token1"][0] / pools[key]["sqrt_price"] ** 2)
+                       for key, totals in valuation["pools"].items())
+
+    return {
+        "position_count": len(nft_ids),
+        "mor_amount": float(valuation["token0"][0]),
+        "steth_amount": float(valuation["token1"][0]),
+        "value_in_mor": value_in_mor
+    }
+
+
+def update_liquidity_history(address: str, history_path: str = LIQUIDITY_HISTORY_PATH,
+                             max_days: Optional[int] = None) -> Dict[str, np.ndarray]:
+    """
+    Snapshots every day boundary after the last recorded one (from LIQUIDITY_HISTORY_START_DATE on the first run)
+    up to today's, saving after each day so an interrupted backfill resumes where it stopped.
+    """
+    with _history_lock:
+        history = load_liquidity_history(history_path)
+        today = int(time.time() // 86400)
+        first_day = int(history["unix_day"][-1]) + 1 if len(history["unix_day"]) else \
+            (date.fromisoformat(LIQUIDITY_HISTORY_START_DATE) - date(1970, 1, 1)).days
+        days = list(range(first_day, today + 1))[:max_days]
+        if not days:
+            return history
+
+        blocks = BlockTimestamps(w3)
+        latest_block = w3.eth.block_number
+        low_block = int(history["block_number"][-1]) if len(history["block_number"]) else 1
+
+        for unix_day in days:
+            block_number = blocks.last_block_before(unix_day * 86400 - 1, low_block, latest_block)
+            snapshot = snapshot_liquidity(address, block_number)
+
+            row = {"unix_day": unix_day, "block_number": block_number, **snapshot}
+            history = {field: np.append(history[field], np.array([row[field]], dtype=dtype))
+                       for field, dtype in HISTORY_FIELDS.items()}
+            _save_liquidity_history(history, history_path)
+            low_block = block_number
+
+        logger.info(f"Protocol liquidity history updated with {len(days)} days up to block {low_block}")
+        return history
+
+
+def format_liquidity_history(history: Dict[str, np.ndarray]) -> List[Dict]:
+    """
+    Returns the history latest first as [{"date": DD/MM/YYYY, ...}], valued in USD with the daily MOR prices of the
+    local price store when it has the day.
+    """
+    price_store = load_store()
+    positions = np.searchsorted(price_store["unix_day"], history["unix_day"])
+    positions = np.clip(positions, 0, max(len(price_store["unix_day"]) - 1, 0))
+    has_price = np.zeros(len(history["unix_day"]), dtype=bool)
+    mor_prices = np.zeros(len(history["unix_day"]))
+    if len(price_store["unix_day"]):
+        has_price = price_store["unix_day"][positions] == history["unix_day"]
+        mor_prices = price_store["average_price"][positions]
+
+    rows = []
+    for i in range(len(history["unix_day"]) - 1, -1, -1):
+        day = datetime.fromtimestamp(int(history["unix_day"][i]) * 86400, tz=timezone.utc)
+        rows.append({
+            "date": day.strftime('%d/%m/%Y'),
+            "block_number": int(history["block_number"][i]),
+            "position_count": int(history["position_count"][i]),
+            "mor_amount": float(history["mor_amount"][i]),
+            "steth_amount": float(history["steth_amount"][i]),
+            "value_in_mor": float(history["value_in_mor"][i]),
+            "value_usd": float(history["value_in_mor"][i] * mor_prices[i]) if has_price[i] else None
+        })
+    return rows
@@ -0,0 +1,42 @@
+from typing import Any, List, Optional, Sequence
+from eth_utils.abi import get_abi_output_types
+from app.core.config import MULTICALL3_ADDRESS, MULTICALL3_ABI, MULTICALL_BATCH_SIZE
+
+_multicall_contracts = {}
+
+
+def _get_multicall_contract(w3):
+    contract = _multicall_contracts.get(id(w3))
+    if contract is None:
+        contract = w3.eth.contract(address=w3.to_checksum_address(MULTICALL3_ADDRESS), abi=MULTICALL3_ABI)
+        _multicall_contracts[id(w3)] = contract
+    return contract
+
+
+def multicall(w3, calls: Sequence, block_identifier='latest', allow_failure: bool = False,
+              batch_size: int = MULTICALL_BATCH_SIZE) -> List[Optional[Any]]:
+    """
+    Runs contract calls (e.g. `contract.functions.slot0()`) through Multicall3's aggregate3, `batch_size` calls per
+    request, and returns their decoded results in order. Single value outputs are unwrapped, like `.call()` does.
+
+    With `allow_failure` a reverting call returns None instead of failing the whole batch.
+    """
+    multicall_contract = _get_multicall_contract(w3)
+    results = []
+
+    for start in range(0, len(calls), batch_size):
+        batch = calls[start:start + batch_size]
+        encoded = [(call.address, allow_failure, call._encode_transaction_data()) for call in batch]
+        responses = multicall_contract.functions.aggregate3(encoded).call(block_identifier=block_identifier)
+
+        for call, (success, return_data) in zip(batch, responses):
+            if not success:
+                results.append(None)
+                continue
+            output_types = get_abi_output_types(call.abi)
+            # Checksum addresses, as `.call()` returns them
+            decoded = [w3.to_checksum_address(value) if output_type == 'address' else value
+                       for output_type, value in zip(output_types, w3.codec.decode(output_types, return_data))]
+            results.append(decoded[0] if len(decoded) == 1 else list(decoded))
+
+    return results
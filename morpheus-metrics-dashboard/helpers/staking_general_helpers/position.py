@@ -1,15 +1,13 @@
-from web3 import Web3
 import os, json
-import math
-from collections import defaultdict
-import requests
-from app.core.config import (ARB_RPC_URL, STETH_TOKEN_ADDRESS, MOR_ARBITRUM_ADDRESS, UNISWAP_V3_POSITIONS_NFT_ADDRESS,
-                             UNISWAP_V3_FACTORY_ADDRESS, POSITIONS_NFT_ABI, FACTORY_NFT_ABI, POOL_ABI)
+import numpy as np
+from app.core.config import (web3_arb, UNISWAP_V3_POSITIONS_NFT_ADDRESS, UNISWAP_V3_FACTORY_ADDRESS,
+                             POSITIONS_NFT_ABI, FACTORY_NFT_ABI, POOL_ABI)
+from helpers.price_helpers.price_oracle import get_price
+from helpers.staking_general_helpers.multicall import multicall
+from helpers.staking_general_helpers.uniswap_v3_valuation import (Q96, sqrt_prices_at_ticks, position_amounts,
+                                                                  group_positions_by_pool, value_pools)
 
-w3 = Web3(Web3.HTTPProvider(ARB_RPC_URL))
-
-MOR_TOKEN_ADDRESS = MOR_ARBITRUM_ADDRESS
-DEX_API_URL = "https://api.dexscreener.io/latest/dex/tokens/{}"
+w3 = web3_arb
 
 positions_nft_contract = w3.eth.contract(address=w3.to_checksum_address(UNISWAP_V3_POSITIONS_NFT_ADDRESS),
                                          abi=POSITIONS_NFT_ABI)
@@ -17,81 +15,98 @@ factory_contract = w3.eth.contract(address=w3.to_checksum_address(UNISWAP_V3_FAC
                                    abi=FACTORY_NFT_ABI)
 
 
-def fetch_token_price(token_address):
-    """Fetches the token price in USD from the Dex Screener API."""
-    api_url = DEX_API_URL.format(token_address)
-    response = requests.get(api_url)
-
-    if response.status_code == 200:
-        data = response.json()
-        if 'pairs' in data and len(data['pairs']) > 0 and 'priceUsd' in data['pairs'][0]:
-            return float(data['pairs'][0]['priceUsd'])
+# Pool addresses never change for a (token0, token1, fee), so they are cached for the life of the process
+_pool_addresses = {}
+_pool_contracts = {}
 
-    return None
+# Positions and prices of the last protocol_liquidity run, re-valued by price_shock_table
+_last_valuation = {}
 
 
-def fetch_all_nfts(address):
+def fetch_all_nfts(address, block_identifier='latest'):
     """Fetches all NFTs owned by the address."""
-    balance = positions_nft_contract.functions.balanceOf(address).call()
-    nfts = []
-    for i in range(balance):
-        token_id = positions_nft_contract.functions.tokenOfOwnerByIndex(address, i).call()
-        nfts.append(token_id)
-    return nfts
+    balance = positions_nft_contract.functions.balanceOf(address).call(block_identifier=block_identifier)
+    calls = [positions_nft_contract.functions.tokenOfOwnerByIndex(address, i) for i in range(balance)]
+    return multicall(w3, calls, block_identifier=block_identifier)
+
+
+def get_pool_contract(pool_address):
+    pool_contract = _pool_contracts.get(pool_address)
+    if pool_contract is None:
+        pool_contract = w3.eth.contract(address=pool_address, abi=POOL_ABI)
+        _pool_contracts[pool_address] = pool_contract
+    return pool_contract
+
+
+def get_pool_addresses(pool_keys):
+    """Returns the pool address of each (token0, token1, fee), only looking up the ones not cached yet."""
+    missing = list({key for key in pool_keys if key not in _pool_addresses})
+    if missing:
+        addresses = multicall(w3, [factory_contract.functions.getPool(*key) for key in missing])
+        _pool_addresses.update(zip(missing, addresses))
+    return {key: _pool_addresses[key] for key in pool_keys}
+
+
+def get_pool_slot0s(pool_addresses, block_identifier='latest'):
+    """Reads slot0 once for each distinct pool."""
+    unique_pools = list(dict.fromkeys(pool_addresses))
+    slot0s = multicall(w3, [get_pool_contract(pool).functions.slot0() for pool in unique_pools],
+                       block_identifier=block_identifier)
+    return dict(zip(unique_pools, slot0s))
+
+
+def read_positions(token_ids, block_identifier='latest'):
+    """Reads the NFT positions with their pool's sqrt price and tick at `block_identifier`, batching every call."""
+    positions = multicall(w3, [positions_nft_contract.functions.positions(token_id) for token_id in token_ids],
+                          block_identifier=block_identifier)
+
+    pool_keys = [(position[2], position[3], position[4]) for position in positions]
+    pool_addresses = get_pool_addresses(pool_keys)
+    slot0s = get_pool_slot0s([pool_addresses[key] for key in pool_keys], block_identifier)
+
+    raw_positions = []
+    for position, key in zip(positions, pool_keys):
+        slot0 = slot0s[pool_addresses[key]]
+        raw_positions.append({
+            'token0': key[0],
+            'token1': key[1],
+            'fee': key[2],
+            'tick_lower': position[5],
+            'tick_upper': position[6],
+            'liquidity': position[7],
+            'sqrt_price_x96': slot0[0],
+            'current_tick': slot0[1]
+        })
+    return raw_positions
+
+
+def get_all_asset_balances(token_ids):
+    """Fetches the asset balances of NFT positions, computing every position's amounts at once."""
+    raw_positions = read_positions(token_ids)
+    if not raw_positions:
+        return []
+
+    amount0, amount1 = position_amounts(
+        np.array([float(p['liquidity']) for p in raw_positions]),
+        sqrt_prices_at_ticks([p['tick_lower'] for p in raw_positions]),
+        sqrt_prices_at_ticks([p['tick_upper'] for p in raw_positions]),
+        np.array([p['sqrt_price_x96'] / Q96 for p in raw_positions])
+    )
+
+    return [{
+        'token0': {'address': p['token0'], 'amount': float(a0)},
+        'token1': {'address': p['token1'], 'amount': float(a1)},
+        'fee': p['fee'],
+        'liquidity': p['liquidity'],
+        'tick_lower': p['tick_lower'],
+        'tick_upper': p['tick_upper'],
+        'current_tick': p['current_tick']
+    } for p, a0, a1 in zip(raw_positions, amount0.tolist(), amount1.tolist())]
 
 
 def get_asset_balances(token_id):
     """Fetches the asset balances for a specific NFT position."""
-    position = positions_nft_contract.functions.positions(token_id).call()
-
-    # Extract relevant information
-    token0 = position[2]
-    token1 = position[3]
-    fee = position[4]
-    tick_lower = position[5]
-    tick_upper = position[6]
-    liquidity = position[7]
-
-    # Get pool address
-    pool_address = factory_contract.functions.getPool(token0, token1, fee).call()
-    pool_contract = w3.eth.contract(address=pool_address, abi=POOL_ABI)
-
-    # Fetch current tick and sqrt price
-    slot0 = pool_contract.functions.slot0().call()
-    sqrt_price_x96 = slot0[0]
-    current_tick = slot0[1]
-
-    # Calculate amounts
-    amount0, amount1 = calculate_amounts(liquidity, sqrt_price_x96, current_tick, tick_lower, tick_upper)
-
-    return {
-        'token0': {'address': token0, 'amount': amount0},
-        'token1': {'address': token1, 'amount': amount1},
-        'fee': fee,
-        'liquidity': liquidity,
-        'tick_lower': tick_lower,
-        'tick_upper': tick_upper,
-        'current_tick': current_tick
-    }
-
-
-def calculate_amounts(liquidity, sqrt_price_x96, tick_current, tick_lower, tick_upper):
-    """Calculates the token balances based on the tick and liquidity."""
-    sqrt_ratio_a = math.sqrt(1.0001 ** tick_lower)
-    sqrt_ratio_b = math.sqrt(1.0001 ** tick_upper)
-    sqrt_price = sqrt_price_x96 / (1 << 96)
-
-    if tick_current < tick_lower:
-        amount0 = liquidity * (1 / sqrt_ratio_a - 1 / sqrt_ratio_b)
-        amount1 = 0
-    elif tick_current < tick_upper:
-        amount0 = liquidity * (1 / sqrt_price - 1 / sqrt_ratio_b)
-        amount1 = liquidity * (sqrt_price - sqrt_ratio_a)
-    else:
-        amount0 = 0
-        amount1 = liquidity * (sqrt_ratio_b - sqrt_ratio_a)
-
-    return amount0 / (10 ** 18), amount1 / (10 ** 18)  # Convert to standard unit
+    return get_all_asset_balances([token_id])[0]
 
 
 def protocol_liquidity(address):
@@ -102,38 +117,30 @@ def protocol_liquidity(address):
         # print(f"No NFTs found for address {address}")
         return
 
-    # print(f"Found {len(nft_ids)} NFTs for address {address}")
-
     # Fetch MOR and stETH prices
-    mor_price = fetch_token_price(MOR_TOKEN_ADDRESS)
-    steth_price = fetch_token_price(STETH_TOKEN_ADDRESS)
+    mor_price = get_price("MOR")
+    steth_price = get_price("STETH")
 
     if mor_price is None or steth_price is None:
         raise Exception("Could not fetch MOR or stETH prices.")
 
-    aggregated_positions = defaultdict(lambda: {'token0': {'balance': 0, 'address': None},
-                                                'token1': {'balance': 0, 'address': None},
-                                                'liquidity': 0})
-
-    total_value_usd = 0
-
-    for nft_id in nft_ids:
-        balances = get_asset_balances(nft_id)
-        key = f"{balances['token0']['address']}_{balances['token1']['address']}_{balances['fee']}"
-
-        aggregated_positions[key]['token0']['address'] = balances['token0']['address']
-        aggregated_positions[key]['token1']['address'] = balances['token1']['address']
-        aggregated_positions[key]['token0']['balance'] += balances['token0']['amount']
-        aggregated_positions[key]['token1']['balance'] += balances['token1']['amount']
-        aggregated_positions[key]['liquidity'] += balances['liquidity']
-
-        # Calculate the total value in USD for the position
-        token0_value_usd = balances['token0']['amount'] * mor_price
-        token1_value_usd = balances['token1']['amount'] * steth_price
-        total_value_usd += token0_value_usd + token1_value_usd
-
-    # Convert defaultdict to regular dict for JSON serialization
-    aggregated_positions = dict(aggregated_positions)
+    # Positions are valued as token0 = MOR and token1 = stETH
+    pools = group_positions_by_pool(read_positions(nft_ids))
+    _last_valuation.update({"address": address, "pools": pools, "mor_price": mor_price, "steth_price": steth_price})
+    return summarize_liquidity(pools, value_pools(pools, mor_price, steth_price), mor_price, steth_price)
+
+
+def summarize_liquidity(pools, valuation, mor_price, steth_price):
+    """Shapes the first price change of a `value_pools` valuation as the /protocol_liquidity response."""
+    aggregated_positions = {
+        key: {
+            'token0': {'balance': float(valuation['pools'][key]['token0'][0]), 'address': pool['token0']},
+            'token1': {'balance': float(valuation['pools'][key]['token1'][0]), 'address': pool['token1']},
+            'liquidity': pool['total_liquidity']
+        }
+        for key, pool in pools.items()
+    }
+    total_value_usd = float(valuation['value_usd'][0])
 
     # Return USD, MOR, and stETH values
     return {
@@ -142,3 +149,30 @@ def protocol_liquidity(address):
         "mor_value": total_value_usd / mor_price if mor_price else 0,
         "steth_value": total_value_usd / steth_price if steth_price else 0
     }
+
+
+def price_shock_table(address, price_shocks_pct):
+    """
+    Re-values the protocol's positions with the MOR price moved by each percentage in `price_shocks_pct` (stETH
+    held fixed), reusing the positions and prices of the last `protocol_liquidity` run for that address.
+
+    Returns the unshocked figures and the table, both from that one snapshot, or None when there are no positions.
+    """
+    if _last_valuation.get("address") != address and protocol_liquidity(address) is None:
+        return None
+
+    snapshot = dict(_last_valuation)
+    valuation = value_pools(snapshot["pools"], snapshot["mor_price"], snapshot["steth_price"],
+                            [0.0] + [shock / 100 for shock in price_shocks_pct])
+    base_value = valuation['value_usd'][0]
+
+    table = [{
+        "mor_price_change_pct": shock,
+        "mor_price": float(valuation['token0_prices'][i]),
+        "mor_amount": float(valuation['token0'][i]),
+        "steth_amount": float(valuation['token1'][i]),
+        "total_value_usd": float(valuation['value_usd'][i]),
+        "value_change_pct": float((valuation['value_usd'][i] / base_value - 1) * 100) if base_value else 0.0
+    } for i, shock in enumerate(price_shocks_pct, start=1)]
+    return {**summarize_liquidity(snapshot["pools"], valuation, snapshot["mor_price"], snapshot["steth_price"]),
+            "price_shock_table": table}
@@ -0,0 +1,139 @@
+"""
+Uniswap V3 position valuation over arrays of positions.
+
+Tick boundaries are converted to sqrt prices with the exact integer TickMath of the pool contracts (Q64.96), then
+the token amounts of every position are computed at once with NumPy. Because the amounts only depend on the pool's
+sqrt price, re-valuing the positions at hypothetical prices (a price shock table) is a few array operations.
+"""
+from typing import Dict, List, Sequence
+import numpy as np
+
+MIN_TICK = -887272
+MAX_TICK = 887272
+Q96 = 1 << 96
+TOKEN_DECIMALS = 18
+
+# TickMath.getSqrtRatioAtTick factors: 1 / sqrt(1.0001) ** (2 ** i) as Q128.128, for bit i of |tick|
+_TICK_FACTORS = [
+    (0x2, 0xfff97272373d413259a46990580e213a),
+    (0x4, 0xfff2e50f5f656932ef12357cf3c7fdcc),
+    (0x8, 0xffe5caca7e10e4e61c3624eaa0941cd0),
+    (0x10, 0xffcb9843d60f6159c9db58835c926644),
+    (0x20, 0xff973b41fa98c081472e6896dfb254c0),
+    (0x40, 0xff2ea16466c96a3843ec78b326b52861),
+    (0x80, 0xfe5dee046a99a2a811c461f1969c3053),
+    (0x100, 0xfcbe86c7900a88aedcffc83b479aa3a4),
+    (0x200, 0xf987a7253ac413176f2b074cf7815e54),
+    (0x400, 0xf3392b0822b70005940c7a398e4b70f3),
+    (0x800, 0xe7159475a2c29b7443b29c7fa6e889d9),
+    (0x1000, 0xd097f3bdfd2022b8845ad8f792aa5825),
+    (0x2000, 0xa9f746462d870fdf8a65dc1f90e061e5),
+    (0x4000, 0x70d869a156d2a1b890bb3df62baf32f7),
+    (0x8000, 0x31be135f97d08fd981231505542fcfa6),
+    (0x10000, 0x9aa508b5b7a84e1c677de54f3e99bc9),
+    (0x20000, 0x5d6af8dedb81196699c329225ee604),
+    (0x40000, 0x2216e584f5fa1ea926041bedfe98),
+    (0x80000, 0x48a170391f7dc42444e8fa2),
+]
+_UINT256_MAX = (1 << 256) - 1
+
+
+def get_sqrt_ratio_at_tick(tick: int) -> int:
+    """Returns sqrt(1.0001 ** tick) as a Q64.96 integer, exactly as the pool contracts compute it."""
+    tick = int(tick)
+    abs_tick = abs(tick)
+    if abs_tick > MAX_TICK:
+        raise ValueError(f"Tick {tick} is outside [{MIN_TICK}, {MAX_TICK}]")
+
+    ratio = 0xfffcb933bd6fad37aa2d162d1a594001 if abs_tick & 0x1 else 1 << 128
+    for bit, factor in _TICK_FACTORS:
+        if abs_tick & bit:
+            ratio = (ratio * factor) >> 128
+    if tick > 0:
+        ratio = _UINT256_MAX // ratio
+
+    # Q128.128 to Q64.96, rounding up
+    return (ratio >> 32) + (0 if ratio % (1 << 32) == 0 else 1)
+
+
+def sqrt_prices_at_ticks(ticks: Sequence[int]) -> np.ndarray:
+    """Returns the sqrt prices (Q64.96 / 2 ** 96) of the ticks, computing each distinct tick once."""
+    ticks = np.asarray(ticks, dtype=np.int64)
+    unique_ticks, inverse = np.unique(ticks, return_inverse=True)
+    unique_prices = np.array([get_sqrt_ratio_at_tick(t) / Q96 for t in unique_ticks.tolist()], dtype=np.float64)
+    return unique_prices[inverse].reshape(ticks.shape)
+
+
+def position_amounts(liquidity: np.ndarray, sqrt_lower: np.ndarray, sqrt_upper: np.ndarray,
+                     sqrt_price) -> (np.ndarray, np.ndarray):
+    """
+    Returns the token0 and token1 amounts (in whole tokens) of positions at `sqrt_price`, which can be a scalar
+    or an array of prices (with a trailing axis to broadcast against the positions).
+    """
+    price = np.clip(sqrt_price, sqrt_lower, sqrt_upper)
+    amount0 = liquidity * (1 / price - 1 / sqrt_upper)
+    amount1 = liquidity * (price - sqrt_lower)
+    scale = 10 ** TOKEN_DECIMALS
+    return amount0 / scale, amount1 / scale
+
+
+def group_positions_by_pool(positions: List[Dict]) -> Dict[str, Dict]:
+    """
+    Groups raw positions ({"token0", "token1", "fee", "tick_lower", "tick_upper", "liquidity", "sqrt_price_x96",
+    "current_tick"}) into per pool arrays, keyed "token0_token1_fee".
+    """
+    grouped = {}
+    for position in positions:
+        key = f"{position['token0']}_{position['token1']}_{position['fee']}"
+        grouped.setdefault(key, []).append(position)
+
+    pools = {}
+    for key, pool_positions in grouped.items():
+        first = pool_positions[0]
+        pools[key] = {
+            "token0": first['token0'],
+            "token1": first['token1'],
+            "fee": first['fee'],
+            "sqrt_price": first['sqrt_price_x96'] / Q96,
+            "current_tick": first['current_tick'],
+            "liquidity": np.array([float(p['liquidity']) for p in pool_positions], dtype=np.float64),
+            "total_liquidity": sum(p['liquidity'] for p in pool_positions),
+            "sqrt_lower": sqrt_prices_at_ticks([p['tick_lower'] for p in pool_positions]),
+            "sqrt_upper": sqrt_prices_at_ticks([p['tick_upper'] for p in pool_positions])
+        }
+    return pools
+
+
+def value_pools(pools: Dict[str, Dict], token0_price: float, token1_price: float,
+                token0_price_changes: Sequence[float] = (0.0,)) -> Dict:
+    """
+    Values every pool's positions in USD with token0 priced at `token0_price` and token1 at `token1_price`.
+
+    Each entry of `token0_price_changes` (e.g. -0.25 for -25%) moves token0's price with token1's held fixed; the
+    pools' prices move the same way, so the positions are re-balanced before they are valued.
+    Returns per pool token totals and the overall token and USD totals, one value per price change.
+    """
+    changes = np.asarray(token0_price_changes, dtype=np.float64)
+    price_factors = 1 + changes
+    total_token0 = np.zeros(len(changes))
+    total_token1 = np.zeros(len(changes))
+    pool_totals = {}
+
+    for key, pool in pools.items():
+        # The pool price is token1 per token0, its square root moves with the square root of the price change
+        sqrt_prices = pool["sqrt_price"] * np.sqrt(price_factors)[:, None]
+        amount0, amount1 = position_amounts(pool["liquidity"], pool["sqrt_lower"], pool["sqrt_upper"], sqrt_prices)
+        pool_token0, pool_token1 = amount0.sum(axis=1), amount1.sum(axis=1)
+        pool_totals[key] = {"token0": pool_token0, "token1": pool_token1}
+        total_token0 += pool_token0
+        total_token1 += pool_token1
+
+    token0_prices = token0_price * price_factors
+    return {
+        "price_changes": changes,
+        "token0_prices": token0_prices,
+        "pools": pool_totals,
+        "token0": total_token0,
+        "token1": total_token1,
+        "value_usd": total_token0 * token0_prices + total_token1 * token1_price
+    }
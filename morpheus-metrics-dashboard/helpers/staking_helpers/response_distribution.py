@@ -5,9 +5,9 @@ from datetime import datetime, timedelta
 import csv
 from collections import defaultdict
 from decimal import Decimal
-import requests
 import ipdb
-from helpers.staking_general_helpers.distribution import OptimizedMultiplierCalculator, OptimizedRewardCalculator
+from helpers.staking_general_helpers.distribution import OptimizedMultiplierCalculator
+from helpers.staking_helpers.reward_simulator import get_reward_grid, power_factors, DEFAULT_STAKING_PERIODS
 import numpy as np
 import logging
 
@@ -163,68 +163,20 @@ def calculate_pool_rewards_summary(csv_file_path):
     return pool_rewards
 
 def calculate_power_factor(staking_period_days):
-    # Convert days to years
-    years = staking_period_days // 365
-    
-    # Define static multipliers for years 0-6
-    multipliers = [1, 2.12, 4.17, 6.08, 7.82, 9.35, 10.67]
-    
-    # If years is greater than 6, use the last multiplier
-    if years >= 6:
-        return multipliers[-1]
-    else:
-        return multipliers[years]
-
-def get_crypto_price(crypto_id):
-    base_url = "https://api.coingecko.com/api/v3/simple/price"
-    params = {
-        "ids": crypto_id,
-        "vs_currencies": "usd"
-    }
-
-    try:
-        response = requests.get(base_url, params=params)
-        response.raise_for_status()  # Raises an HTTPError for bad responses
-        data = response.json()
-
-        if crypto_id in data and "usd" in data[crypto_id]:
-            return data[crypto_id]["usd"]
-        else:
-            return None
-    except requests.RequestException as e:
-        print(f"An error occurred: {e}")
-        return None
-
-def calculate_mor_rewards(mor_daily_emission, staking_period_days,mor_price, eth_price):
-    calculator = OptimizedRewardCalculator()
-    total_virtual_steth = calculator.get_virtual_steth_pool(0)
-    # Calculate power factor
-    power_factor = calculate_power_factor(staking_period_days)
-    # Calculate APR
-    apr = (mor_daily_emission * 365 * mor_price * power_factor) / (total_virtual_steth * eth_price)
-    # Calculate APY assuming compounding once per year
-    apy = (1 + apr) ** 1 - 1
-    # Calculate daily MOR rewards per 1 deposited stETH
-    daily_mor_rewards = (mor_daily_emission * power_factor) / total_virtual_steth
-    return apy, daily_mor_rewards
+    # Power factor of the full years locked, capped at 6 years
+    return float(power_factors(np.array([staking_period_days]))[0])
 
 def give_more_reward_response():
-    mor_daily_emission = 3456  # Replace with the actual daily emission
-    staking_periods = [0, 365, 730, 1095, 1460, 1825, 2190]  # 0, 1 year, 2 years, 3 years, 4 years, 5 years, 6 years
-    
-    # print(f"MOR Rewards Calculator")
-    # print(f"MOR Daily Emission: {mor_daily_emission}")
-    mor_price = get_crypto_price("morpheusai")
-    eth_price = get_crypto_price("staked-ether")  # WETH address
-    
-    # print("\nAPY per 1 deposited stETH:")
+    # One pool state and price snapshot for every staking period, at today's scheduled capital emission
+    grid = get_reward_grid(lock_days=DEFAULT_STAKING_PERIODS, deposits=[1])
+
     rewards_data = {
         "apy_per_steth": [],
         "daily_mor_rewards_per_steth": []
     }
-    
-    for period in staking_periods:
-        apy, daily_mor_rewards = calculate_mor_rewards(mor_daily_emission, period,mor_price, eth_price)
+
+    for i, period in enumerate(grid["lock_days"]):
+        apy, daily_mor_rewards = grid["apy"][0][i][0], grid["daily_mor_rewards_per_steth"][0][i][0]
         rewards_data["apy_per_steth"].append({
             "staking_period": period,
             "apy": f"{apy:.2%}"
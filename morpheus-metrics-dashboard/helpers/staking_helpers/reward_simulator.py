@@ -0,0 +1,117 @@
+import logging
+import threading
+import time
+from datetime import date
+from typing import Dict, List, Optional
+import numpy as np
+from app.core.config import distribution_contract, EMISSION_SCHEDULE_CSV_PATH, REWARD_SNAPSHOT_TTL_SECONDS
+from helpers.price_helpers.price_oracle import get_price
+from helpers.staking_general_helpers.emissions import get_emissions_on_date
+
+logger = logging.getLogger(__name__)
+
+# Power factor per full year of lock, locks of 6 years or more get the last one
+POWER_FACTORS = np.array([1, 2.12, 4.17, 6.08, 7.82, 9.35, 10.67])
+DEFAULT_MOR_DAILY_EMISSION = 3456  # Capital pool emission used when the emission schedule can't be read
+DEFAULT_STAKING_PERIODS = [0, 365, 730, 1095, 1460, 1825, 2190]  # 0 to 6 years, in days
+DEFAULT_DEPOSITS = [1]  # stETH
+CAPITAL_POOL_ID = 0
+MAX_CACHED_GRIDS = 64
+
+_snapshot_lock = threading.Lock()
+_snapshot = {}
+_grids_lock = threading.Lock()
+_grids = {}  # (lock days, deposits, emissions, snapshot taken_at) -> grid
+
+
+def power_factors(lock_days: np.ndarray) -> np.ndarray:
+    years = np.asarray(lock_days, dtype=np.int64) // 365
+    return POWER_FACTORS[np.clip(years, 0, len(POWER_FACTORS) - 1)]
+
+
+def get_capital_daily_emission(day: Optional[date] = None) -> float:
+    """Returns the capital pool's new emission for `day` (today by default) from the emission schedule."""
+    try:
+        emissions = get_emissions_on_date(day or date.today(), EMISSION_SCHEDULE_CSV_PATH)
+        return emissions["new_emissions"]["Capital Emission"]
+    except Exception as e:
+        logger.warning(f"Using the default daily emission, emission schedule lookup failed: {str(e)}")
+        return DEFAULT_MOR_DAILY_EMISSION
+
+
+def get_reward_snapshot(max_age: float = REWARD_SNAPSHOT_TTL_SECONDS) -> Dict:
+    """
+    Returns the capital pool's total virtual deposit, the MOR and stETH prices and today's capital emission,
+    read once and reused for `max_age` seconds.
+    """
+    with _snapshot_lock:
+        if _snapshot and time.time() - _snapshot["taken_at"] < max_age:
+            return dict(_snapshot)
+
+        pool_data = distribution_contract.functions.poolsData(CAPITAL_POOL_ID).call()
+        mor_price, steth_price = get_price("MOR"), get_price("STETH")
+        if mor_price is None or steth_price is None:
+            raise Exception("Could not fetch MOR or stETH prices.")
+
+        _snapshot.clear()
+        _snapshot.update({
+            "total_virtual_steth": pool_data[2] / 1e18,
+            "mor_price": mor_price,
+            "steth_price": steth_price,
+            "mor_daily_emission": get_capital_daily_emission(),
+            "taken_at": time.time()
+        })
+        return dict(_snapshot)
+
+
+def simulate_rewards(snapshot: Dict, lock_days: np.ndarray, deposits: np.ndarray,
+                     emissions: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Computes APY and daily MOR per deposited stETH over a grid of daily emissions x lock periods x deposits.
+
+    A deposit joins the pool with its power factor applied, so large deposits dilute their own share.
+    Returned arrays have the shape (len(emissions), len(lock_days), len(deposits)).
+    """
+    virtual_deposits = power_factors(lock_days)[:, None] * np.asarray(deposits, dtype=np.float64)[None, :]
+    pool_share = virtual_deposits / (snapshot["total_virtual_steth"] + virtual_deposits)
+
+    daily_mor = np.asarray(emissions, dtype=np.float64)[:, None, None] * pool_share[None, :, :]
+    daily_mor_per_steth = daily_mor / np.asarray(deposits, dtype=np.float64)[None, None, :]
+
+    # Yearly rewards valued against the deposit, no compounding
+    apy = daily_mor_per_steth * 365 * snapshot["mor_price"] / snapshot["steth_price"]
+    return {"apy": apy, "daily_mor_rewards_per_steth": daily_mor_per_steth}
+
+
+def get_reward_grid(lock_days: Optional[List[int]] = None, deposits: Optional[List[float]] = None,
+                    emissions: Optional[List[float]] = None) -> Dict:
+    """
+    Returns the simulated grid with its inputs. Grids are cached until the snapshot they were computed from expires.
+    """
+    snapshot = get_reward_snapshot()
+    lock_days = lock_days or DEFAULT_STAKING_PERIODS
+    deposits = deposits or DEFAULT_DEPOSITS
+    emissions = emissions or [snapshot["mor_daily_emission"]]
+
+    key = (tuple(lock_days), tuple(deposits), tuple(emissions), snapshot["taken_at"])
+    with _grids_lock:
+        cached = _grids.get(key)
+    if cached is not None:
+        return cached
+
+    grid = simulate_rewards(snapshot, np.array(lock_days), np.array(deposits), np.array(emissions))
+    result = {
+        "snapshot": {k: v for k, v in snapshot.items() if k != "taken_at"},
+        "lock_days": list(lock_days),
+        "deposits": list(deposits),
+        "daily_emissions": list(emissions),
+        "apy": grid["apy"].tolist(),
+        "daily_mor_rewards_per_steth": grid["daily_mor_rewards_per_steth"].tolist()
+    }
+
+    # Grids from older snapshots are never requested again
+    with _grids_lock:
+        if len(_grids) >= MAX_CACHED_GRIDS or any(k[3] != snapshot["taken_at"] for k in _grids):
+            _grids.clear()
+        _grids[key] = result
+    return result
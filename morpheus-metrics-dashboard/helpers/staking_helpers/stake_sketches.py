@@ -0,0 +1,264 @@
+import csv
+import functools
+import json
+import logging
+import math
+import os
+import threading
+from datetime import datetime, date
+
+import numpy as np
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+STAKE_SKETCH_PATH = os.path.join(current_dir, 'staking_csv_files', 'stake_sketches.json')
+
+DEFAULT_SKETCH_K = 200
+YEAR_IN_SECONDS = 365.25 * 24 * 60 * 60
+POWER_MULTIPLIER_SCALE = 1e25
+DEFAULT_STAKE_TIME_BINS = [0, 1, 2, 3, 4, 5, 1000]  # Using 1000 years as an effective "infinity"
+DEFAULT_POWER_MULTIPLIER_BINS = [0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11]
+SKETCH_METRICS = ('stake_time', 'power_multiplier')
+QUERY_CACHE_SIZE = 256  # Distinct (sketch version, filters, bins, percentiles) answers kept in memory
+
+
+class KLLSketch:
+    """
+    Mergeable KLL quantile sketch.
+
+    Items on level `h` carry a weight of 2**h. When the sketch grows past its capacity the lowest full
+    level is sorted and every other item is promoted to the next level. The promotion offset alternates
+    per level instead of being random, so rebuilding a sketch from the same events gives the same answer.
+    """
+
+    def __init__(self, k=DEFAULT_SKETCH_K):
+        self.k = k
+        self.n = 0
+        self.levels = [[]]
+        self.offsets = [0]
+
+    def _capacity(self, level):
+        depth = len(self.levels) - level - 1
+        return max(2, int(math.ceil(self.k * (2 / 3) ** depth)))
+
+    def _compress(self):
+        while sum(len(items) for items in self.levels) > sum(self._capacity(h) for h in range(len(self.levels))):
+            for level, items in enumerate(self.levels):
+                if len(items) < self._capacity(level):
+                    continue
+
+                if level + 1 == len(self.levels):
+                    self.levels.append([])
+                    self.offsets.append(0)
+
+                items = sorted(items)
+                kept = [items.pop()] if len(items) % 2 else []
+                offset = self.offsets[level]
+                self.offsets[level] ^= 1
+
+                self.levels[level + 1].extend(items[offset::2])
+                self.levels[level] = kept
+                break
+
+    def update(self, value):
+        self.levels[0].append(float(value))
+        self.n += 1
+        if len(self.levels[0]) >= self._capacity(0):
+            self._compress()
+
+    def merge(self, other):
+        while len(self.levels) < len(other.levels):
+            self.levels.append([])
+            self.offsets.append(0)
+        for level, items in enumerate(other.levels):
+            self.levels[level].extend(items)
+        self.n += other.n
+        self._compress()
+        return self
+
+    def _weighted_items(self):
+        values = np.fromiter((v for items in self.levels for v in items), dtype=float)
+        weights = np.concatenate([np.full(len(items), 2.0 ** level) for level, items in enumerate(self.levels)])
+        order = np.argsort(values, kind='stable')
+        return values[order], weights[order]
+
+    def quantiles(self, fractions):
+        """Returns the approximate value at each fraction (0-1) of the distribution."""
+        values, weights = self._weighted_items()
+        if not len(values):
+            return [None for _ in fractions]
+
+        cumulative = np.cumsum(weights)
+        targets = np.asarray(fractions, dtype=float) * cumulative[-1]
+        indices = np.clip(np.searchsorted(cumulative, targets, side='left'), 0, len(values) - 1)
+        return values[indices].tolist()
+
+    def histogram(self, edges):
+        """Returns approximate counts for the (edges[i], edges[i + 1]] bins, same as np.digitize(right=True)."""
+        values, weights = self._weighted_items()
+        edges = np.asarray(edges, dtype=float)
+        bin_indices = np.searchsorted(edges, values, side='left')
+        counts = np.bincount(bin_indices, weights=weights, minlength=len(edges) + 1)[1:len(edges)]
+        return np.rint(counts).astype(int).tolist()
+
+    def to_dict(self):
+        return {"k": self.k, "n": self.n, "levels": self.levels, "offsets": self.offsets}
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(data.get("k", DEFAULT_SKETCH_K))
+        sketch.n = data["n"]
+        sketch.levels = [list(items) for items in data["levels"]]
+        sketch.offsets = list(data["offsets"])
+        return sketch
+
+
+# In-process copy of the persisted sketches, refreshed when the staking CSV changes
+_sketch_state = {"csv_mtime": None, "last_block": 0, "sketches": {}, "version": 0}
+# Held while rows are ingested into or merged out of the shared sketches, by the cache task and /get_stake_info
+_sketch_lock = threading.RLock()
+
+
+def _load_sketch_state(sketch_path):
+    if not os.path.exists(sketch_path):
+        return 0, {}
+    try:
+        with open(sketch_path, 'r') as f:
+            data = json.load(f)
+    except json.JSONDecodeError as e:
+        logger.warning(f"Ignoring corrupted stake sketch file {sketch_path}: {e}")
+        return 0, {}
+
+    sketches = {
+        pool_id: {
+            day: {metric: KLLSketch.from_dict(sketch) for metric, sketch in metrics.items()}
+            for day, metrics in days.items()
+        }
+        for pool_id, days in data.get("pools", {}).items()
+    }
+    return data.get("last_block", 0), sketches
+
+
+def _save_sketch_state(sketch_path, last_block, sketches):
+    data = {
+        "last_block": last_block,
+        "pools": {
+            pool_id: {
+                day: {metric: sketch.to_dict() for metric, sketch in metrics.items()}
+                for day, metrics in days.items()
+            }
+            for pool_id, days in sketches.items()
+        }
+    }
+    tmp_path = f"{sketch_path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, sketch_path)
+
+
+def update_stake_sketches(csv_file_path, sketch_path=STAKE_SKETCH_PATH):
+    """
+    Feeds lock events newer than the last ingested block into the per pool, per day sketches.
+
+    Unlike `get_wallet_stake_info`, every lock event is recorded (not only the longest lock per wallet),
+    since a sketch for a past day must not change once written.
+    """
+    with _sketch_lock:
+        return _update_stake_sketches(csv_file_path, sketch_path)
+
+
+def _update_stake_sketches(csv_file_path, sketch_path):
+    csv_mtime = os.path.getmtime(csv_file_path)
+    if _sketch_state["csv_mtime"] == csv_mtime:
+        return _sketch_state
+
+    if _sketch_state["csv_mtime"] is None:
+        _sketch_state["last_block"], _sketch_state["sketches"] = _load_sketch_state(sketch_path)
+
+    last_block = _sketch_state["last_block"]
+    sketches = _sketch_state["sketches"]
+    new_events = 0
+
+    with open(csv_file_path, 'r') as csvfile:
+        reader = csv.DictReader(csvfile)
+        for row in reader:
+            block_number = int(row['BlockNumber'])
+            claim_lock_start = int(row['claimLockStart'])
+            claim_lock_end = int(row['claimLockEnd'])
+            if block_number <= _sketch_state["last_block"] or claim_lock_start == 0 or claim_lock_end == 0:
+                continue
+
+            day = datetime.fromisoformat(row['Timestamp']).date().isoformat()
+            day_sketches = sketches.setdefault(row['poolId'], {}).setdefault(
+                day, {metric: KLLSketch() for metric in SKETCH_METRICS})
+            day_sketches['stake_time'].update((claim_lock_end - claim_lock_start) / YEAR_IN_SECONDS)
+            day_sketches['power_multiplier'].update(int(row['multiplier']) / POWER_MULTIPLIER_SCALE)
+
+            last_block = max(last_block, block_number)
+            new_events += 1
+
+    if new_events:
+        _save_sketch_state(sketch_path, last_block, sketches)
+        _sketch_state["version"] += 1
+        logger.info(f"Added {new_events} lock events to the stake sketches up to block {last_block}")
+
+    _sketch_state["last_block"] = last_block
+    _sketch_state["csv_mtime"] = csv_mtime
+    return _sketch_state
+
+
+def _describe(sketch, bins, percentiles):
+    ranges = [[float(bins[i]), float(bins[i + 1]) if i < len(bins) - 2 else None] for i in range(len(bins) - 1)]
+    result = {
+        "ranges": ranges,
+        "frequencies": sketch.histogram(bins)
+    }
+    if percentiles:
+        values = sketch.quantiles([p / 100 for p in percentiles])
+        result["percentiles"] = {f"{p:g}": value for p, value in zip(percentiles, values)}
+    return result
+
+
+def query_stake_distribution(csv_file_path, pool_id=None, start_date=None, end_date=None, percentiles=None,
+                             stake_time_bins=None, power_multiplier_bins=None):
+    """
+    Answers stake time and power multiplier distribution queries from the per day sketches.
+
+    :param pool_id: Restrict to a single pool, both pools are combined when None
+    :param start_date: First day (inclusive) as a `date`, open ended when None
+    :param end_date: Last day (inclusive) as a `date`, open ended when None
+    :param percentiles: Percentiles (0-100) to report for both metrics
+    :param stake_time_bins: Bin edges in years, defaults to DEFAULT_STAKE_TIME_BINS
+    :param power_multiplier_bins: Bin edges for the multiplier, defaults to DEFAULT_POWER_MULTIPLIER_BINS
+    """
+    start_day = start_date.isoformat() if isinstance(start_date, date) else None
+    end_day = end_date.isoformat() if isinstance(end_date, date) else None
+
+    with _sketch_lock:
+        state = update_stake_sketches(csv_file_path)
+        return _merged_distribution(state["version"], pool_id, start_day, end_day, tuple(percentiles or ()),
+                                    tuple(stake_time_bins or DEFAULT_STAKE_TIME_BINS),
+                                    tuple(power_multiplier_bins or DEFAULT_POWER_MULTIPLIER_BINS))
+
+
+@functools.lru_cache(maxsize=QUERY_CACHE_SIZE)
+def _merged_distribution(version, pool_id, start_day, end_day, percentiles, stake_time_bins, power_multiplier_bins):
+    """Merges the matching day sketches, cached per sketch version so new lock events bypass older answers."""
+    merged = {metric: KLLSketch() for metric in SKETCH_METRICS}
+    for pool, days in _sketch_state["sketches"].items():
+        if pool_id is not None and pool != str(pool_id):
+            continue
+        for day, metrics in days.items():
+            # ISO dates compare correctly as strings
+            if (start_day and day < start_day) or (end_day and day > end_day):
+                continue
+            for metric in SKETCH_METRICS:
+                merged[metric].merge(metrics[metric])
+
+    return {
+        "stake_time": _describe(merged['stake_time'], list(stake_time_bins), list(percentiles)),
+        "power_multiplier": _describe(merged['power_multiplier'], list(power_multiplier_bins), list(percentiles)),
+        "total_lock_events": merged['stake_time'].n
+    }
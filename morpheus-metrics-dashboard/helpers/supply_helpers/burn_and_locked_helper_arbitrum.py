@@ -1,78 +1,114 @@
-import json
 import asyncio
+import json
+import logging
+import os
 from datetime import datetime
-from web3 import Web3
-from pathlib import Path
-import sys
-from app.core.config import (erc20_abi, ARB_RPC_URL, MOR_ARBITRUM_ADDRESS, BURN_FROM_ADDRESS, BURN_TO_ADDRESS,
-                             SAFE_ADDRESS, BURN_START_BLOCK)
-
+from app.core.config import (web3_arb, async_web3_arb, erc20_abi, MOR_ARBITRUM_ADDRESS, BURN_FROM_ADDRESS, BURN_TO_ADDRESS,
+                             SAFE_ADDRESS, BURN_START_BLOCK, BURN_AND_LOCKED_STATE_PATH)
+
+logger = logging.getLogger(__name__)
+
+token_contract = async_web3_arb.eth.contract(address=web3_arb.to_checksum_address(MOR_ARBITRUM_ADDRESS),
+                                             abi=erc20_abi)
+
+# Transfer recipients tracked for BURN_FROM_ADDRESS, mapped to their series label
+TRACKED_RECIPIENTS = {
+    web3_arb.to_checksum_address(BURN_TO_ADDRESS): "cumulative_mor_burnt",
+    web3_arb.to_checksum_address(SAFE_ADDRESS): "cumulative_mor_locked"
+}
+
+_tracker_lock = asyncio.Lock()
+
+
+def load_tracker_state(state_path: str = BURN_AND_LOCKED_STATE_PATH) -> dict:
+    """
+    Returns the persisted tracker state: the last scanned block and, per label, the running total in wei and the
+    cumulative amount (MOR) at the end of each day with a transfer.
+    """
+    if os.path.exists(state_path):
+        with open(state_path, 'r') as f:
+            return json.load(f)
+    return {
+        "last_block": BURN_START_BLOCK - 1,
+        "series": {label: {"total_wei": 0, "cumulative_by_date": {}} for label in TRACKED_RECIPIENTS.values()}
+    }
 
-def set_web3_on_arbitrum():
-    w3 = Web3(Web3.HTTPProvider(ARB_RPC_URL))  # ARBITRUM CONNECTION
 
-    if not w3.is_connected():
-        raise ConnectionError("Failed to connect to Arbitrum via Alchemy")
+def _save_tracker_state(state: dict, state_path: str) -> None:
+    tmp_path = f"{state_path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f)
+    os.replace(tmp_path, state_path)
 
-    token_contract = w3.eth.contract(address=w3.to_checksum_address(MOR_ARBITRUM_ADDRESS), abi=erc20_abi)
 
-    return w3, token_contract
+def process_events(state, events, block_timestamps):
+    """Adds Transfer events (in chain order) to the cumulative series of their recipient."""
+    for event in events:
+        label = TRACKED_RECIPIENTS.get(event['args']['to'])
+        if label is None:
+            continue
 
+        series = state["series"][label]
+        series["total_wei"] += event['args']['value']
 
-def create_event_filter(w3, token_contract, from_address, to_address):
-    return token_contract.events.Transfer.create_filter(
-        from_block=BURN_START_BLOCK,
-        to_block='latest',
-        argument_filters={
-            'from': w3.to_checksum_address(from_address),
-            'to': w3.to_checksum_address(to_address)
-        }
-    )
+        txn_date = datetime.utcfromtimestamp(block_timestamps[event['blockNumber']]).strftime('%d/%m/%Y')
+        series["cumulative_by_date"][txn_date] = series["total_wei"] / pow(10, 18)
 
 
-def process_events(w3, events):
-    amounts_by_date = {}
-    total_amount = 0
+async def _get_block_timestamp(block_number: int) -> int:
+    return (await async_web3_arb.eth.get_block(block_number))['timestamp']
 
-    for event in events:
-        amount = float(event['args']['value']) / pow(10, 18)
 
-        # Fetch block timestamp
-        block = w3.eth.get_block(event['blockNumber'])
-        block_timestamp = block['timestamp']
-        txn_date = datetime.utcfromtimestamp(block_timestamp).strftime('%d/%m/%Y')
+async def refresh_burn_and_locked(state_path: str = BURN_AND_LOCKED_STATE_PATH) -> dict:
+    """
+    Scans Transfers sent by BURN_FROM_ADDRESS since the last checkpoint and updates the burn and lock series.
 
-        total_amount += amount
+    A single log query covers both recipients, and each new block's timestamp is fetched once (concurrently, within
+    the async provider's request limit), so a refresh only costs as much as the transfers made since the previous
+    one.
+    """
+    async with _tracker_lock:
+        state = load_tracker_state(state_path)
+        latest_block = await async_web3_arb.eth.block_number
+        from_block = state["last_block"] + 1
+        if from_block > latest_block:
+            return state
 
-        # Update cumulative amount for the date
-        if txn_date in amounts_by_date:
-            amounts_by_date[txn_date] += amount
-        else:
-            amounts_by_date[txn_date] = total_amount
+        events = await token_contract.events.Transfer.get_logs(
+            from_block=from_block,
+            to_block=latest_block,
+            argument_filters={'from': web3_arb.to_checksum_address(BURN_FROM_ADDRESS)}
+        )
+        events = [event for event in events if event['args']['to'] in TRACKED_RECIPIENTS]
+        events.sort(key=lambda e: (e['blockNumber'], e['logIndex']))
 
-    return amounts_by_date, total_amount
+        block_numbers = sorted({event['blockNumber'] for event in events})
+        timestamps = await asyncio.gather(*(_get_block_timestamp(block_number) for block_number in block_numbers))
+        block_timestamps = dict(zip(block_numbers, timestamps))
 
+        process_events(state, events, block_timestamps)
+        state["last_block"] = latest_block
+        _save_tracker_state(state, state_path)
 
-async def get_amounts(from_address, to_address, label):
-    w3, token_contract = set_web3_on_arbitrum()
+        logger.info(f"Burn and locked tracker scanned blocks {from_block}-{latest_block}, {len(events)} new transfers")
+        return state
 
-    event_filter = create_event_filter(w3, token_contract, from_address, to_address)
-    events = event_filter.get_all_entries()
 
-    amounts_by_date, total_amount = process_events(w3, events)
+def get_amounts(state: dict, label: str) -> str:
+    series = state["series"][label]
 
     # Create result dictionary
     result = {
-        label: amounts_by_date,
-        f"total_{label.split('_')[-1]}_till_now": total_amount
+        label: series["cumulative_by_date"],
+        f"total_{label.split('_')[-1]}_till_now": series["total_wei"] / pow(10, 18)
     }
     result_json = json.dumps(result, indent=4)
     return result_json
 
 
 async def get_burned_amounts():
-    return await get_amounts(BURN_FROM_ADDRESS, BURN_TO_ADDRESS, "cumulative_mor_burnt")
+    return get_amounts(await refresh_burn_and_locked(), "cumulative_mor_burnt")
 
 
 async def get_locked_amounts():
-    return await get_amounts(BURN_FROM_ADDRESS, SAFE_ADDRESS, "cumulative_mor_locked")
\ No newline at end of file
+    return get_amounts(await refresh_burn_and_locked(), "cumulative_mor_locked")
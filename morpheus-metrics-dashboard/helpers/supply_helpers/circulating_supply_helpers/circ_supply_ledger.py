@@ -0,0 +1,138 @@
+"""
+Append-only ledger of daily UserClaimed totals and the running circulating supply.
+
+Rows are only ever appended, in ascending date order. When new claims arrive for a day that is already in the
+ledger a second row is appended for that day with the updated totals, so readers keep the last row per date.
+The tail file holds the latest state (the last row plus the last scanned block) so an update never needs to read
+the ledger itself.
+"""
+import csv
+import json
+import logging
+import os
+import time
+from datetime import datetime
+from app.core.config import CIRC_SUPPLY_CSV_PATH, CIRC_SUPPLY_LEDGER_PATH, CIRC_SUPPLY_LEDGER_TAIL_PATH
+
+logger = logging.getLogger(__name__)
+
+LEDGER_FIELDS = ["date", "circulating_supply_at_that_date", "block_timestamp_at_that_date", "total_claimed_that_day",
+                 "last_block_number"]
+
+
+def read_ledger_tail(tail_path: str = CIRC_SUPPLY_LEDGER_TAIL_PATH) -> dict:
+    """Returns the latest ledger state, or an empty dict when there is no ledger yet."""
+    if not os.path.exists(tail_path):
+        return {}
+    with open(tail_path, 'r') as f:
+        return json.load(f)
+
+
+def _write_ledger_tail(tail: dict, tail_path: str) -> None:
+    tmp_path = f"{tail_path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(tail, f)
+    os.replace(tmp_path, tail_path)
+
+
+def bootstrap_ledger(source_csv: str = CIRC_SUPPLY_CSV_PATH, ledger_path: str = CIRC_SUPPLY_LEDGER_PATH,
+                     tail_path: str = CIRC_SUPPLY_LEDGER_TAIL_PATH) -> None:
+    """Seeds the ledger from the consolidated circulating supply CSV, which is kept latest date first."""
+    with open(source_csv, 'r') as f:
+        rows = list(csv.DictReader(f))
+    rows.sort(key=lambda row: int(row['block_timestamp_at_that_date']))
+
+    with open(ledger_path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=LEDGER_FIELDS)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow({**row, "last_block_number": ""})
+
+    latest = rows[-1] if rows else None
+    _write_ledger_tail({
+        "date": latest['date'] if latest else None,
+        "circulating_supply": float(latest['circulating_supply_at_that_date']) if latest else 0.0,
+        "block_timestamp": int(latest['block_timestamp_at_that_date']) if latest else 0,
+        "total_claimed": float(latest['total_claimed_that_day']) if latest else 0.0,
+        "last_block": None,
+        "updated_at": time.time()
+    }, tail_path)
+    logger.info(f"Bootstrapped circulating supply ledger with {len(rows)} days from {source_csv}")
+
+
+def _rebuild_tail(ledger_path: str, tail_path: str) -> None:
+    last_row = None
+    with open(ledger_path, 'r') as f:
+        for last_row in csv.DictReader(f):
+            pass
+
+    _write_ledger_tail({
+        "date": last_row['date'] if last_row else None,
+        "circulating_supply": float(last_row['circulating_supply_at_that_date']) if last_row else 0.0,
+        "block_timestamp": int(last_row['block_timestamp_at_that_date']) if last_row else 0,
+        "total_claimed": float(last_row['total_claimed_that_day']) if last_row else 0.0,
+        "last_block": int(last_row['last_block_number']) if last_row and last_row['last_block_number'] else None,
+        "updated_at": 0
+    }, tail_path)
+
+
+def ensure_ledger(ledger_path: str = CIRC_SUPPLY_LEDGER_PATH, tail_path: str = CIRC_SUPPLY_LEDGER_TAIL_PATH) -> str:
+    """Returns the ledger path, bootstrapping the ledger (or rebuilding a lost tail file) on first use."""
+    if not os.path.exists(ledger_path):
+        bootstrap_ledger(ledger_path=ledger_path, tail_path=tail_path)
+    elif not os.path.exists(tail_path):
+        _rebuild_tail(ledger_path, tail_path)
+    return ledger_path
+
+
+def append_claims(claims, last_block: int, ledger_path: str = CIRC_SUPPLY_LEDGER_PATH,
+                  tail_path: str = CIRC_SUPPLY_LEDGER_TAIL_PATH) -> int:
+    """
+    Appends daily totals for new claims and advances the tail to `last_block`.
+
+    :param claims: Iterable of (block_timestamp, amount in MOR) in chain order, newer than the tail
+    :param last_block: Last block covered by `claims`, the next update starts after it
+    :return: Number of day rows appended
+    """
+    tail = read_ledger_tail(tail_path)
+    circulating_supply = tail.get("circulating_supply", 0.0)
+    current = {"date": tail.get("date"), "block_timestamp": tail.get("block_timestamp", 0),
+               "total_claimed": tail.get("total_claimed", 0.0)}
+
+    new_rows = []
+    for timestamp, amount in claims:
+        date_str = datetime.utcfromtimestamp(timestamp).strftime('%d/%m/%Y')
+        if date_str != current["date"]:
+            current = {"date": date_str, "block_timestamp": timestamp, "total_claimed": 0.0}
+
+        circulating_supply += amount
+        current["total_claimed"] += amount
+        current["block_timestamp"] = max(current["block_timestamp"], timestamp)
+
+        row = {
+            "date": date_str,
+            "circulating_supply_at_that_date": circulating_supply,
+            "block_timestamp_at_that_date": current["block_timestamp"],
+            "total_claimed_that_day": current["total_claimed"],
+            "last_block_number": last_block
+        }
+        # One row per day and update, the latest claim of the day overwrites the pending row
+        if new_rows and new_rows[-1]["date"] == date_str:
+            new_rows[-1] = row
+        else:
+            new_rows.append(row)
+
+    if new_rows:
+        with open(ledger_path, 'a', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=LEDGER_FIELDS)
+            writer.writerows(new_rows)
+
+    _write_ledger_tail({
+        "date": current["date"],
+        "circulating_supply": circulating_supply,
+        "block_timestamp": current["block_timestamp"],
+        "total_claimed": current["total_claimed"],
+        "last_block": last_block,
+        "updated_at": time.time()
+    }, tail_path)
+    return len(new_rows)
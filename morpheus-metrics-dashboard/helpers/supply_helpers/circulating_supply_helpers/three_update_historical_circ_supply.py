@@ -1,8 +1,10 @@
-import csv
-from datetime import datetime
+import logging
 from web3.exceptions import BlockNotFound
-from pathlib import Path
 from app.core.config import (web3, distribution_contract)
+from helpers.supply_helpers.circulating_supply_helpers.circ_supply_ledger import (ensure_ledger, read_ledger_tail,
+                                                                                   append_claims)
+
+logger = logging.getLogger(__name__)
 
 
 def get_block_number_by_timestamp(timestamp):
@@ -26,94 +28,45 @@ def get_block_number_by_timestamp(timestamp):
     return left  # Return the closest block number
 
 
-def update_circulating_supply_csv(csv_file):
-    # Read the existing CSV
-    with open(csv_file, 'r') as f:
-        reader = csv.DictReader(f)
-        existing_data = list(reader)
+def get_block_timestamps(block_numbers):
+    """Fetches the timestamp of each distinct block once."""
+    timestamps = {}
+    for block_number in block_numbers:
+        if block_number not in timestamps:
+            timestamps[block_number] = web3.eth.get_block(block_number)['timestamp']
+    return timestamps
+
 
-    if not existing_data:
-        print("Error: CSV file is empty")
-        return
+def update_circulating_supply_ledger():
+    """
+    Appends the UserClaimed events since the ledger tail to the circulating supply ledger.
 
-    # Create a dictionary of existing data for easy lookup and update
-    existing_data_dict = {row['date']: row for row in existing_data}
+    Only the events after the last scanned block are read, so an update costs O(new events) regardless of how
+    long the ledger is. A ledger seeded from the consolidated CSV has no scanned block yet, in which case the
+    start block is found once from the latest recorded timestamp.
+    """
+    ensure_ledger()
+    tail = read_ledger_tail()
 
-    latest_record = max(existing_data, key=lambda x: int(x['block_timestamp_at_that_date']))
-    latest_block_timestamp = int(latest_record['block_timestamp_at_that_date'])
-    latest_circulating_supply = float(latest_record['circulating_supply_at_that_date'])
+    if tail.get("last_block") is not None:
+        start_block = tail["last_block"] + 1
+    else:
+        start_block = get_block_number_by_timestamp(tail.get("block_timestamp", 0)) + 1
 
-    # Find the block number for the latest timestamp
-    start_block = get_block_number_by_timestamp(latest_block_timestamp)
-    start_block += 1
+    latest_block = web3.eth.get_block('latest')['number']
+    if start_block > latest_block:
+        return 0
 
-    # Create a filter for UserClaimed events from the latest block timestamp
+    # Create a filter for UserClaimed events since the tail
     event_filter = distribution_contract.events.UserClaimed.create_filter(
         from_block=start_block,
-        to_block='latest'
+        to_block=latest_block
     )
+    events = sorted(event_filter.get_all_entries(), key=lambda e: (e['blockNumber'], e['logIndex']))
 
-    # Fetch all new events
-    events = event_filter.get_all_entries()
-
-    # Process new events
-    new_data = {}
-    for event in events:
-        try:
-            block_number = event['blockNumber']
-            block = web3.eth.get_block(block_number)
-            timestamp = block['timestamp']
-            date_str = datetime.utcfromtimestamp(timestamp).strftime('%d/%m/%Y')
-
-            amount = float(event['args']['amount']) / 10 ** 18
-            latest_circulating_supply += amount
-
-            if date_str not in new_data:
-                new_data[date_str] = {
-                    "circulating_supply": latest_circulating_supply,
-                    "block_timestamp": timestamp,
-                    "total_claimed": 0
-                }
-
-            new_data[date_str]["total_claimed"] += amount
-            new_data[date_str]["block_timestamp"] = max(new_data[date_str]["block_timestamp"], timestamp)
-            new_data[date_str]["circulating_supply"] = latest_circulating_supply
-
-        except BlockNotFound:
-            print(f"Block {block_number} not found. Skipping...")
-            continue
-        except Exception as e:
-            print(f"Error processing event: {e}")
-            break
-
-    # Update existing data and add new records
-    for date, data in new_data.items():
-        new_record = {
-            "date": date,
-            "circulating_supply_at_that_date": data["circulating_supply"],
-            "block_timestamp_at_that_date": data["block_timestamp"],
-            "total_claimed_that_day": data["total_claimed"]
-        }
-
-        if date in existing_data_dict:
-            # Update existing record if new block timestamp is later
-            if data["block_timestamp"] > int(existing_data_dict[date]["block_timestamp_at_that_date"]):
-                existing_data_dict[date] = new_record
-        else:
-            # Add new record
-            existing_data_dict[date] = new_record
-
-    # Convert back to list and sort
-    updated_data = list(existing_data_dict.values())
-    updated_data.sort(key=lambda x: datetime.strptime(x['date'], '%d/%m/%Y'), reverse=True)
-
-    # Write the updated data back to CSV
-    with open(csv_file, 'w', newline='') as f:
-        writer = csv.DictWriter(f, fieldnames=[
-            "date", "circulating_supply_at_that_date", "block_timestamp_at_that_date", "total_claimed_that_day"
-        ])
-        writer.writeheader()
-        writer.writerows(updated_data)
+    timestamps = get_block_timestamps(event['blockNumber'] for event in events)
+    claims = ((timestamps[event['blockNumber']], float(event['args']['amount']) / 10 ** 18) for event in events)
 
-    # print(f"Updated {csv_file}. Total records: {len(updated_data)}")
-    return len(updated_data)  # Return number of records as a success indicator
+    appended_days = append_claims(claims, latest_block)
+    logger.info(f"Appended {appended_days} days to the circulating supply ledger up to block {latest_block}")
+    return appended_days
@@ -0,0 +1,42 @@
+import os
+from app.core.config import CIRC_SUPPLY_LEDGER_PATH
+from datetime import date
+import numpy as np
+import pandas as pd
+
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+# Parsed series per CSV path, reloaded only when the file's (mtime, size) change
+_circulating_supply_series = {}
+
+
+def load_circulating_supply_series(csv_file: str = CIRC_SUPPLY_LEDGER_PATH) -> dict:
+    """
+    Returns the circulating supply history as arrays sorted by day ordinal (`date.toordinal()`):
+    `day_ordinals`, `dates` ('%d/%m/%Y' strings), `circulating_supply` and `total_claimed`.
+    Works on both the circulating supply ledger and the older consolidated CSV (latest date first).
+    """
+    stat = os.stat(csv_file)
+    signature = (stat.st_mtime_ns, stat.st_size)
+    cached = _circulating_supply_series.get(csv_file)
+    if cached and cached["signature"] == signature:
+        return cached
+
+    df = pd.read_csv(csv_file, dtype={'date': str}, float_precision='round_trip')
+    dates = pd.to_datetime(df['date'], format='%d/%m/%Y')
+    day_ordinals = dates.to_numpy().astype('datetime64[D]').astype(np.int64) + EPOCH_ORDINAL
+    order = np.argsort(day_ordinals, kind='stable')
+
+    # The ledger appends a new row when a day gets more claims, keep the last row of each day
+    sorted_days = day_ordinals[order]
+    order = order[np.append(sorted_days[1:] != sorted_days[:-1], True)]
+
+    series = {
+        "signature": signature,
+        "day_ordinals": day_ordinals[order],
+        "dates": df['date'].to_numpy(dtype=object)[order],
+        "circulating_supply": df['circulating_supply_at_that_date'].to_numpy(dtype=np.float64)[order],
+        "total_claimed": df['total_claimed_that_day'].to_numpy(dtype=np.float64)[order]
+    }
+    _circulating_supply_series[csv_file] = series
+    return series
@@ -1,33 +1,56 @@
+import os
 from collections import OrderedDict
 from app.core.config import TOTAL_SUPPLY_CSV_PATH
-from datetime import datetime
+from datetime import datetime, date
+import numpy as np
 import pandas as pd
 
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
 
-def get_json_from_csv():
-    # Load the CSV into a pandas DataFrame
-    df = pd.read_csv(TOTAL_SUPPLY_CSV_PATH)
+# Parsed schedule, reloaded only when the CSV's (mtime, size) change
+_total_supply_schedule = {"signature": None}
+
+
+def load_total_supply_schedule(csv_path: str = TOTAL_SUPPLY_CSV_PATH) -> dict:
+    """
+    Returns the total supply schedule as arrays sorted by day ordinal (`date.toordinal()`):
+    `day_ordinals`, `total_supply` (rounded to 4 decimals) and `dates` ('%d/%m/%Y' strings).
+    """
+    stat = os.stat(csv_path)
+    signature = (csv_path, stat.st_mtime_ns, stat.st_size)
+    if _total_supply_schedule["signature"] == signature:
+        return _total_supply_schedule
 
-    # Convert the Date column to datetime for comparison
-    df['Date'] = pd.to_datetime(df['Date'], format='%d/%m/%Y')
+    df = pd.read_csv(csv_path, usecols=['Date', 'Total Supply'])
+    dates = pd.to_datetime(df['Date'], format='%d/%m/%Y')
 
-    # Get the current date
-    current_date = datetime.utcnow().date()
+    day_ordinals = dates.to_numpy().astype('datetime64[D]').astype(np.int64) + EPOCH_ORDINAL
+    order = np.argsort(day_ordinals, kind='stable')
 
-    # Filter rows from the earliest date in the CSV to the current date
-    df = df[df['Date'].dt.date <= current_date]
+    _total_supply_schedule.update({
+        "signature": signature,
+        "day_ordinals": day_ordinals[order],
+        "total_supply": df['Total Supply'].round(4).to_numpy(dtype=np.float64)[order],
+        "dates": dates.dt.strftime('%d/%m/%Y').to_numpy(dtype=object)[order]
+    })
+    return _total_supply_schedule
 
-    # Sort by date in descending order (latest first)
-    df = df.sort_values(by='Date', ascending=False)
 
-    # Round the 'Total Supply' column to 4 decimal places
-    df['Total Supply'] = df['Total Supply'].round(4)
+def get_total_supply_until(day_ordinal: int = None) -> dict:
+    """Returns the schedule arrays sliced up to `day_ordinal` (inclusive, defaults to today in UTC)."""
+    schedule = load_total_supply_schedule()
+    if day_ordinal is None:
+        day_ordinal = datetime.utcnow().date().toordinal()
 
-    # Create JSON output: dates as keys, total supply as values
-    json_output = OrderedDict()
-    for _, row in df.iterrows():
-        date_str = row['Date'].strftime('%d/%m/%Y')  # Convert back to DD/MM/YYYY format
-        total_supply = row['Total Supply']
-        json_output[date_str] = total_supply
+    end = int(np.searchsorted(schedule["day_ordinals"], day_ordinal, side='right'))
+    return {
+        "day_ordinals": schedule["day_ordinals"][:end],
+        "total_supply": schedule["total_supply"][:end],
+        "dates": schedule["dates"][:end]
+    }
 
-    return json_output
+
+def get_json_from_csv():
+    # Schedule up to today, latest date first, with dates (DD/MM/YYYY) as keys and total supply as values
+    schedule = get_total_supply_until()
+    return OrderedDict(zip(schedule["dates"][::-1].tolist(), schedule["total_supply"][::-1].tolist()))
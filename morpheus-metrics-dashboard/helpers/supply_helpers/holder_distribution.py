@@ -0,0 +1,170 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, Iterable, List, Optional
+import numpy as np
+from app.core.config import MOR_HOLDERS_SOURCE, MOR_HOLDERS_DUNE_CROSS_CHECK, DUNE_HOLDER_SNAPSHOT_PATH
+from helpers.supply_helpers.supply_main import get_mor_holders, get_latest_dune_execution_id
+from helpers.supply_helpers.holder_ledger import get_ledger_holder_rows, compare_with_dune
+
+logger = logging.getLogger(__name__)
+
+ZERO_ADDRESS = "0x0000000000000000000000000000000000000000"
+MIN_HOLDER_BALANCE = 0.001  # Dust balances below this aren't counted as holders
+DEFAULT_HOLDER_RANGE_EDGES = [0, 50, 100, 200, 500, 1000, 10000, 500000]
+DEFAULT_TOP_N = [10, 100, 1000]
+DEFAULT_HOLDER_PERCENTILES = [25, 50, 75, 90, 99]
+
+_holder_snapshot = None
+
+
+def build_holder_snapshot(rows: Iterable[Dict]) -> Dict:
+    """
+    Turns holder rows ({"address", "amount"}) into an ascending balance array and its prefix sums, without the
+    zero address and dust balances.
+    """
+    balances = np.fromiter((row['amount'] for row in rows
+                            if row['address'] != ZERO_ADDRESS and row['amount'] > MIN_HOLDER_BALANCE),
+                           dtype=np.float64)
+    balances.sort()
+    return {"balances": balances, "prefix_sums": np.cumsum(balances), "taken_at": time.time()}
+
+
+def set_holder_snapshot(snapshot: Dict) -> None:
+    # Rebound rather than updated in place, the snapshot being set is often the current one
+    global _holder_snapshot
+    _holder_snapshot = snapshot
+
+
+def get_holder_snapshot() -> Optional[Dict]:
+    """Returns the latest holder snapshot, or None before the first one is taken."""
+    return _holder_snapshot
+
+
+def load_holder_snapshot(snapshot_path: str = DUNE_HOLDER_SNAPSHOT_PATH) -> Optional[Dict]:
+    """Returns the persisted Dune holder snapshot, or None when there isn't one."""
+    if not os.path.exists(snapshot_path):
+        return None
+    try:
+        with np.load(snapshot_path) as data:
+            balances = data['balances']
+            return {"balances": balances, "prefix_sums": np.cumsum(balances), "taken_at": float(data['taken_at']),
+                    "execution_id": str(data['execution_id'])}
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable holder snapshot {snapshot_path}: {str(e)}")
+        return None
+
+
+def _save_holder_snapshot(snapshot: Dict, snapshot_path: str) -> None:
+    tmp_path = f"{snapshot_path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        np.savez(f, balances=snapshot["balances"], taken_at=np.array(snapshot["taken_at"]),
+                 execution_id=np.array(snapshot["execution_id"]))
+    os.replace(tmp_path, snapshot_path)
+
+
+async def _refresh_dune_snapshot(snapshot_path: str = DUNE_HOLDER_SNAPSHOT_PATH) -> Dict:
+    """
+    Downloads Dune's latest holder rows only when the query has a new execution, otherwise keeps the current
+    snapshot (from memory, or from disk after a restart). If Dune can't be reached the current snapshot is kept.
+    """
+    current = get_holder_snapshot()
+    if not current or "execution_id" not in current:
+        current = load_holder_snapshot(snapshot_path)
+
+    try:
+        execution_id = await get_latest_dune_execution_id()
+    except Exception as e:
+        if current is None:
+            raise
+        logger.warning(f"Keeping the holder snapshot of execution {current['execution_id']}, "
+                       f"Dune check failed: {str(e)}")
+        return current
+
+    if current and current["execution_id"] == execution_id:
+        return current
+
+    holders_response = await get_mor_holders()
+    snapshot = build_holder_snapshot(holders_response.result.rows)
+    snapshot["execution_id"] = holders_response.execution_id
+    _save_holder_snapshot(snapshot, snapshot_path)
+    logger.info(f"Holder snapshot refreshed from Dune execution {snapshot['execution_id']} "
+                f"with {len(snapshot['balances'])} holders")
+    return snapshot
+
+
+async def _refresh_ledger_snapshot() -> Dict:
+    """Builds the holder snapshot from the local Transfer log ledger, optionally cross-checked against Dune."""
+    rows = await asyncio.to_thread(get_ledger_holder_rows)
+    if MOR_HOLDERS_DUNE_CROSS_CHECK:
+        try:
+            holders_response = await get_mor_holders()
+            check = compare_with_dune(rows, holders_response.result.rows)
+            log = logger.warning if check["mismatch_count"] else logger.info
+            log(f"Holder ledger vs Dune: {check['ledger_holders']} / {check['dune_holders']} holders, "
+                f"{check['mismatch_count']} balance mismatches")
+        except Exception as e:
+            logger.warning(f"Dune cross-check of the holder ledger failed: {str(e)}")
+
+    snapshot = build_holder_snapshot(rows)
+    logger.info(f"Holder snapshot refreshed from the ledger with {len(snapshot['balances'])} holders")
+    return snapshot
+
+
+async def refresh_holder_snapshot(snapshot_path: str = DUNE_HOLDER_SNAPSHOT_PATH) -> Dict:
+    """Brings the holder snapshot up to date from MOR_HOLDERS_SOURCE ("dune" or "ledger") and keeps it in memory."""
+    if MOR_HOLDERS_SOURCE == "ledger":
+        snapshot = await _refresh_ledger_snapshot()
+    else:
+        snapshot = await _refresh_dune_snapshot(snapshot_path)
+    set_holder_snapshot(snapshot)
+    return snapshot
+
+
+def _edge_label(edge: float) -> str:
+    return str(int(edge)) if float(edge).is_integer() else str(edge)
+
+
+def holder_range_counts(snapshot: Dict, edges: Optional[List[float]] = None) -> Dict[str, int]:
+    """Counts holders per [edges[i], edges[i + 1]) range, e.g. {"0-50": 120, "50-100": 40, ...}."""
+    edges = edges or DEFAULT_HOLDER_RANGE_EDGES
+    positions = np.searchsorted(snapshot["balances"], edges, side='left')
+    counts = np.diff(positions)
+    return {f"{_edge_label(low)}-{_edge_label(high)}": int(count)
+            for low, high, count in zip(edges[:-1], edges[1:], counts)}
+
+
+def holder_statistics(snapshot: Dict, top_n: Optional[List[int]] = None,
+                      percentiles: Optional[List[float]] = None) -> Dict:
+    """
+    Returns the share of supply held by the top N holders, balance percentiles and the Gini coefficient, all read
+    from the sorted balances and their prefix sums.
+    """
+    balances, prefix_sums = snapshot["balances"], snapshot["prefix_sums"]
+    top_n = top_n or DEFAULT_TOP_N
+    percentiles = percentiles or DEFAULT_HOLDER_PERCENTILES
+    holder_count = len(balances)
+    total = float(prefix_sums[-1]) if holder_count else 0.0
+
+    top_shares = {}
+    for requested in top_n:
+        n = min(int(requested), holder_count)
+        held = total - (float(prefix_sums[holder_count - n - 1]) if holder_count - n > 0 else 0.0)
+        top_shares[str(int(requested))] = held / total if total else 0.0
+
+    # Gini from the Lorenz curve of the ascending balances
+    if holder_count and total:
+        gini = (holder_count + 1 - 2 * float(prefix_sums.sum()) / total) / holder_count
+    else:
+        gini = 0.0
+
+    balance_percentiles = np.percentile(balances, percentiles).tolist() if holder_count else [0.0] * len(percentiles)
+
+    return {
+        "holder_count": holder_count,
+        "total_balance": total,
+        "top_n_share": top_shares,
+        "percentiles": {_edge_label(p): value for p, value in zip(percentiles, balance_percentiles)},
+        "gini": gini
+    }
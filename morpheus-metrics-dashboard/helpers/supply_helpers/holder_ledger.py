@@ -0,0 +1,208 @@
+"""
+Local MOR (Arbitrum) balance ledger built from the token's Transfer logs.
+
+Balances are kept per address as exact integers (wei) split into two uint64 limbs, `balance_hi` and `balance_lo`,
+next to a fixed width `addresses` array (20 raw bytes each). The ledger is checkpointed to an npz file after every
+log batch together with `last_block`, so updates resume where the previous one stopped.
+"""
+import json
+import logging
+import os
+import threading
+from collections import defaultdict
+from typing import Dict, List, Tuple
+import numpy as np
+from app.core.config import (web3_arb, MOR_ARBITRUM_ADDRESS, MOR_ARBITRUM_START_BLOCK, HOLDER_LEDGER_PATH,
+                             HOLDER_LEDGER_BATCH_BLOCKS)
+
+logger = logging.getLogger(__name__)
+
+TRANSFER_TOPIC = web3_arb.to_hex(web3_arb.keccak(text="Transfer(address,address,uint256)"))
+ZERO_ADDRESS_BYTES = bytes(20)
+LIMB = 1 << 64
+MIN_BATCH_BLOCKS = 1_000
+
+_ledger_lock = threading.Lock()
+
+
+class Web3TransferLogSource:
+    """Reads the token's Transfer logs from an RPC node."""
+
+    def __init__(self, w3=web3_arb, token_address: str = MOR_ARBITRUM_ADDRESS):
+        self.w3 = w3
+        self.token_address = w3.to_checksum_address(token_address)
+
+    def latest_block(self) -> int:
+        return self.w3.eth.block_number
+
+    def get_transfers(self, from_block: int, to_block: int) -> List[Tuple[bytes, bytes, int]]:
+        """Returns (from, to, value) for every Transfer in the block range, addresses as 20 raw bytes."""
+        logs = self.w3.eth.get_logs({
+            "address": self.token_address,
+            "topics": [TRANSFER_TOPIC],
+            "fromBlock": from_block,
+            "toBlock": to_block
+        })
+        return [(bytes(log['topics'][1])[-20:], bytes(log['topics'][2])[-20:],
+                 int.from_bytes(bytes(log['data']), 'big')) for log in logs]
+
+
+class RecordedTransferLogSource:
+    """
+    Replays Transfer logs recorded as JSON lines ({"blockNumber", "from", "to", "value"}), a stand-in for the RPC
+    node in tests and benchmarks.
+    """
+
+    def __init__(self, path: str):
+        with open(path, 'r') as f:
+            self.logs = sorted((json.loads(line) for line in f if line.strip()), key=lambda log: log['blockNumber'])
+        self.block_numbers = [log['blockNumber'] for log in self.logs]
+
+    def latest_block(self) -> int:
+        return self.block_numbers[-1] if self.block_numbers else 0
+
+    def get_transfers(self, from_block: int, to_block: int) -> List[Tuple[bytes, bytes, int]]:
+        start, end = np.searchsorted(self.block_numbers, [from_block, to_block + 1])
+        return [(bytes.fromhex(log['from'][2:]), bytes.fromhex(log['to'][2:]), int(log['value']))
+                for log in self.logs[start:end]]
+
+
+def _empty_ledger() -> Dict:
+    return {
+        "last_block": MOR_ARBITRUM_START_BLOCK - 1,
+        "addresses": np.empty(0, dtype='S20'),
+        "balance_hi": np.empty(0, dtype=np.uint64),
+        "balance_lo": np.empty(0, dtype=np.uint64)
+    }
+
+
+def _address_key(address: bytes) -> bytes:
+    # numpy drops trailing zero bytes when reading 'S20' items back
+    return address.ljust(20, b'\0')
+
+
+def load_holder_ledger(ledger_path: str = HOLDER_LEDGER_PATH) -> Dict:
+    if not os.path.exists(ledger_path):
+        return _empty_ledger()
+    with np.load(ledger_path) as data:
+        return {
+            "last_block": int(data['last_block']),
+            "addresses": data['addresses'],
+            "balance_hi": data['balance_hi'],
+            "balance_lo": data['balance_lo']
+        }
+
+
+def _save_holder_ledger(ledger: Dict, ledger_path: str) -> None:
+    tmp_path = f"{ledger_path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        np.savez(f, last_block=np.array(ledger["last_block"]), addresses=ledger["addresses"],
+                 balance_hi=ledger["balance_hi"], balance_lo=ledger["balance_lo"])
+    os.replace(tmp_path, ledger_path)
+
+
+def apply_transfers(ledger: Dict, transfers: List[Tuple[bytes, bytes, int]]) -> Dict:
+    """
+    Returns the ledger with the transfers' net balance changes applied. Mints (from the zero address) aren't
+    debited, so the zero address only accumulates burns.
+    """
+    deltas = defaultdict(int)
+    for sender, recipient, value in transfers:
+        if sender != ZERO_ADDRESS_BYTES:
+            deltas[_address_key(sender)] -= value
+        deltas[_address_key(recipient)] += value
+    if not deltas:
+        return ledger
+
+    positions = {_address_key(address): i for i, address in enumerate(ledger["addresses"].tolist())}
+    balance_hi, balance_lo = ledger["balance_hi"].copy(), ledger["balance_lo"].copy()
+    new_addresses, new_balances = [], []
+
+    for address, delta in deltas.items():
+        i = positions.get(address)
+        balance = (int(balance_hi[i]) * LIMB + int(balance_lo[i]) if i is not None else 0) + delta
+        if balance < 0:
+            raise ValueError(f"Negative balance for 0x{address.hex()}, the ledger is missing Transfer logs")
+        if i is None:
+            new_addresses.append(address)
+            new_balances.append(balance)
+        else:
+            balance_hi[i], balance_lo[i] = divmod(balance, LIMB)
+
+    if new_addresses:
+        balance_hi = np.concatenate([balance_hi, np.array([b // LIMB for b in new_balances], dtype=np.uint64)])
+        balance_lo = np.concatenate([balance_lo, np.array([b % LIMB for b in new_balances], dtype=np.uint64)])
+        addresses = np.concatenate([ledger["addresses"], np.array(new_addresses, dtype='S20')])
+    else:
+        addresses = ledger["addresses"]
+
+    return {**ledger, "addresses": addresses, "balance_hi": balance_hi, "balance_lo": balance_lo}
+
+
+def update_holder_ledger(source=None, ledger_path: str = HOLDER_LEDGER_PATH,
+                         batch_blocks: int = HOLDER_LEDGER_BATCH_BLOCKS) -> Dict:
+    """
+    Applies the Transfer logs since the ledger's checkpoint, one block batch at a time, saving after each batch.
+    A failing log query (usually a provider result limit) is retried with half the batch size.
+    """
+    source = source or Web3TransferLogSource()
+    with _ledger_lock:
+        ledger = load_holder_ledger(ledger_path)
+        latest_block = source.latest_block()
+
+        while ledger["last_block"] < latest_block:
+            from_block = ledger["last_block"] + 1
+            to_block = min(from_block + batch_blocks - 1, latest_block)
+            try:
+                transfers = source.get_transfers(from_block, to_block)
+            except Exception as e:
+                if batch_blocks <= MIN_BATCH_BLOCKS:
+                    raise
+                batch_blocks = max(MIN_BATCH_BLOCKS, batch_blocks // 2)
+                logger.warning(f"Transfer log query {from_block}-{to_block} failed ({str(e)}), "
+                               f"retrying with {batch_blocks} blocks")
+                continue
+
+            ledger = apply_transfers(ledger, transfers)
+            ledger["last_block"] = to_block
+            _save_holder_ledger(ledger, ledger_path)
+            logger.info(f"Holder ledger applied {len(transfers)} transfers from blocks {from_block}-{to_block}")
+
+        return ledger
+
+
+def ledger_holder_rows(ledger: Dict) -> List[Dict]:
+    """Returns the ledger as holder rows ({"address", "amount" in MOR}), in the same shape as the Dune rows."""
+    amounts = (ledger["balance_hi"].astype(np.float64) * float(LIMB) + ledger["balance_lo"].astype(np.float64)) / 1e18
+    return [{"address": f"0x{_address_key(address).hex()}", "amount": amount}
+            for address, amount in zip(ledger["addresses"].tolist(), amounts.tolist())]
+
+
+def compare_with_dune(ledger_rows: List[Dict], dune_rows: List[Dict], tolerance: float = 1e-6) -> Dict:
+    """
+    Cross-checks ledger balances against Dune's holder rows. Returns the holder counts, totals and the addresses
+    whose balances differ by more than `tolerance` MOR (at most 20 of them).
+    """
+    ledger_balances = {row['address'].lower(): row['amount'] for row in ledger_rows if row['amount'] > 0}
+    dune_balances = {row['address'].lower(): row['amount'] for row in dune_rows if row['amount'] > 0}
+
+    mismatches = []
+    for address in ledger_balances.keys() | dune_balances.keys():
+        ledger_amount, dune_amount = ledger_balances.get(address, 0.0), dune_balances.get(address, 0.0)
+        if abs(ledger_amount - dune_amount) > tolerance:
+            mismatches.append({"address": address, "ledger": ledger_amount, "dune": dune_amount})
+    mismatches.sort(key=lambda m: abs(m["ledger"] - m["dune"]), reverse=True)
+
+    return {
+        "ledger_holders": len(ledger_balances),
+        "dune_holders": len(dune_balances),
+        "ledger_total": sum(ledger_balances.values()),
+        "dune_total": sum(dune_balances.values()),
+        "mismatch_count": len(mismatches),
+        "largest_mismatches": mismatches[:20]
+    }
+
+
+def get_ledger_holder_rows(source=None) -> List[Dict]:
+    """Brings the ledger up to date and returns its holder rows."""
+    return ledger_holder_rows(update_holder_ledger(source))
@@ -0,0 +1,218 @@
+import asyncio
+import csv
+import json
+import logging
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+import httpx
+import numpy as np
+from app.core.config import COINGECKO_MARKET_CHART_URL, PRICES_AND_VOLUME_STORE_PATH
+
+logger = logging.getLogger(__name__)
+
+MS_PER_DAY = 86_400_000
+STORE_FIELDS = ['unix_day', 'date', 'open', 'high', 'low', 'close', 'average_price', 'average_volume']
+_NUMERIC_FIELDS = ['open', 'high', 'low', 'close', 'average_price', 'average_volume']
+
+_refresh_lock = asyncio.Lock()
+
+
+def _empty_store() -> Dict[str, np.ndarray]:
+    store = {'unix_day': np.empty(0, dtype=np.int64)}
+    store.update({field: np.empty(0, dtype=np.float64) for field in _NUMERIC_FIELDS})
+    return store
+
+
+def load_store(store_path: str = PRICES_AND_VOLUME_STORE_PATH) -> Dict[str, np.ndarray]:
+    """Returns the stored daily series as arrays sorted by `unix_day` (days since 01/01/1970)."""
+    if not os.path.exists(store_path):
+        return _empty_store()
+
+    data = np.genfromtxt(store_path, delimiter=',', names=True, dtype=None, encoding='utf-8', ndmin=1)
+    if data.size == 0:
+        return _empty_store()
+
+    store = {'unix_day': data['unix_day'].astype(np.int64)}
+    store.update({field: data[field].astype(np.float64) for field in _NUMERIC_FIELDS})
+    return store
+
+
+def _history_start_path(store_path: str) -> str:
+    return f"{os.path.splitext(store_path)[0]}_history_start.json"
+
+
+def load_history_start(store_path: str = PRICES_AND_VOLUME_STORE_PATH) -> Optional[int]:
+    """Returns the first day CoinGecko has data for, once a full fetch has shown where MOR's history starts."""
+    try:
+        with open(_history_start_path(store_path), 'r') as f:
+            return int(json.load(f)["unix_day"])
+    except (FileNotFoundError, ValueError, KeyError):
+        return None
+
+
+def _save_history_start(unix_day: int, store_path: str) -> None:
+    with open(_history_start_path(store_path), 'w') as f:
+        json.dump({"unix_day": unix_day}, f)
+
+
+def _save_store(store: Dict[str, np.ndarray], store_path: str) -> None:
+    iso_dates = np.datetime_as_string(store['unix_day'].astype('datetime64[D]'))
+    tmp_path = f"{store_path}.tmp"
+    with open(tmp_path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(STORE_FIELDS)
+        for i, iso_date in enumerate(iso_dates):
+            writer.writerow([int(store['unix_day'][i]), iso_date] +
+                            [repr(float(store[field][i])) for field in _NUMERIC_FIELDS])
+    os.replace(tmp_path, store_path)
+
+
+def bucket_by_day(points: List[List[float]]) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+    """
+    Buckets [timestamp_ms, value] points into UTC days.
+
+    Returns the distinct days and, per day, the open/high/low/close and average of the values.
+    """
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    if not len(points):
+        return np.empty(0, dtype=np.int64), {}
+
+    order = np.argsort(points[:, 0], kind='stable')
+    days = points[order, 0].astype(np.int64) // MS_PER_DAY
+    values = points[order, 1]
+
+    starts = np.flatnonzero(np.r_[True, days[1:] != days[:-1]])
+    ends = np.r_[starts[1:], len(days)] - 1
+
+    return days[starts], {
+        'open': values[starts],
+        'high': np.maximum.reduceat(values, starts),
+        'low': np.minimum.reduceat(values, starts),
+        'close': values[ends],
+        'average': np.add.reduceat(values, starts) / (ends - starts + 1)
+    }
+
+
+def build_daily_series(data: dict) -> Dict[str, np.ndarray]:
+    """Turns a CoinGecko market_chart response into the store's daily columns."""
+    price_days, prices = bucket_by_day(data.get('prices', []))
+    volume_days, volumes = bucket_by_day(data.get('total_volumes', []))
+    if not len(price_days):
+        return _empty_store()
+
+    series = {'unix_day': price_days}
+    series.update({field: prices[field] for field in ('open', 'high', 'low', 'close')})
+    series['average_price'] = prices['average']
+
+    # Volumes are reported on their own timestamps, align them to the price days
+    average_volume = np.full(len(price_days), np.nan)
+    if len(volume_days):
+        positions = np.clip(np.searchsorted(volume_days, price_days), 0, len(volume_days) - 1)
+        matched = volume_days[positions] == price_days
+        average_volume[matched] = volumes['average'][positions[matched]]
+    series['average_volume'] = average_volume
+    return series
+
+
+def merge_series(store: Dict[str, np.ndarray], fresh: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """
+    Merges freshly fetched days into the store. Fresh days replace stored ones, except the first fresh day, which
+    only covers the part of the day inside the fetch window and is used only when the store doesn't have it.
+    """
+    if not len(fresh['unix_day']):
+        return store
+
+    fresh_days = fresh['unix_day']
+    keep_fresh = np.ones(len(fresh_days), dtype=bool)
+    if np.isin(fresh_days[0], store['unix_day']):
+        keep_fresh[0] = False
+
+    keep_store = ~np.isin(store['unix_day'], fresh_days[keep_fresh])
+    merged = {field: np.concatenate([store[field][keep_store], fresh[field][keep_fresh]]) for field in store}
+
+    order = np.argsort(merged['unix_day'], kind='stable')
+    return {field: values[order] for field, values in merged.items()}
+
+
+def fetch_window(store: Dict[str, np.ndarray], lookback_days: int, history_start: Optional[int],
+                 today: int) -> Tuple[int, bool]:
+    """
+    Returns how many days to download and whether that is a backfill of the whole lookback, needed when the store
+    doesn't reach back `lookback_days` and hasn't reached the start of MOR's history either.
+    """
+    if not len(store['unix_day']):
+        return lookback_days, True
+    first_day = int(store['unix_day'][0])
+    if first_day > today - lookback_days and (history_start is None or first_day > history_start):
+        return lookback_days, True
+    return max(1, today - int(store['unix_day'][-1]) + 1), False
+
+
+async def refresh_store(lookback_days: int, store_path: str = PRICES_AND_VOLUME_STORE_PATH,
+                        only_if_stale: bool = False) -> Dict[str, np.ndarray]:
+    """
+    Brings the store up to date and makes sure it covers `lookback_days`.
+
+    Only the window since the last stored day is downloaded, unless the store doesn't reach back far enough yet,
+    in which case the whole lookback is fetched once. A backfill that comes back shorter than asked for records
+    where the history starts, so longer lookbacks don't download it again.
+
+    :param only_if_stale: Skip the download when the store already has today and covers the lookback
+    """
+    async with _refresh_lock:
+        store = load_store(store_path)
+        history_start = load_history_start(store_path)
+        today = int(time.time() // 86400)
+
+        fetch_days, backfill = fetch_window(store, lookback_days, history_start, today)
+        if only_if_stale and not backfill and int(store['unix_day'][-1]) >= today:
+            return store
+
+        async with httpx.AsyncClient() as client:
+            response = await client.get(COINGECKO_MARKET_CHART_URL.format(days=fetch_days))
+            response.raise_for_status()
+            data = response.json()
+
+        fresh = build_daily_series(data)
+        # One day of slack for where the window boundary falls within the first day
+        if backfill and len(fresh['unix_day']) and int(fresh['unix_day'][0]) > today - fetch_days + 1:
+            _save_history_start(int(fresh['unix_day'][0]), store_path)
+            logger.info(f"Price history starts on day {int(fresh['unix_day'][0])}, shorter than {fetch_days} days")
+
+        store = merge_series(store, fresh)
+        _save_store(store, store_path)
+        logger.info(f"Price and volume store refreshed with a {fetch_days} day window")
+        return store
+
+
+async def get_store(lookback_days: int, store_path: str = PRICES_AND_VOLUME_STORE_PATH) -> Dict[str, np.ndarray]:
+    """
+    Returns the store for a request, read from disk unless it is missing today or doesn't cover the lookback.
+    A failed download falls back to the stored days when there are any.
+    """
+    try:
+        return await refresh_store(lookback_days, store_path, only_if_stale=True)
+    except Exception as e:
+        store = load_store(store_path)
+        if not len(store['unix_day']):
+            raise
+        logger.warning(f"Price and volume refresh failed, serving the stored days: {str(e)}")
+        return store
+
+
+def format_daily_series(store: Dict[str, np.ndarray], lookback_days: int) -> Tuple[List[List], List[List]]:
+    """Returns [[DD/MM/YYYY, average price]] and [[DD/MM/YYYY, average volume]] for the lookback, latest first."""
+    today = int(time.time() // 86400)
+    start = int(np.searchsorted(store['unix_day'], today - lookback_days, side='left'))
+
+    iso_dates = np.datetime_as_string(store['unix_day'][start:].astype('datetime64[D]')).tolist()
+    dates = [f"{d[8:10]}/{d[5:7]}/{d[0:4]}" for d in iso_dates]
+    prices = np.round(store['average_price'][start:], 4).tolist()
+    volumes = np.round(store['average_volume'][start:], 4).tolist()
+    has_volume = (~np.isnan(store['average_volume'][start:])).tolist()
+
+    sorted_prices = [[date, price] for date, price in zip(dates[::-1], prices[::-1])]
+    sorted_volumes = [[date, volume] for date, volume, valid in zip(dates[::-1], volumes[::-1], has_volume[::-1])
+                      if valid]
+    return sorted_prices, sorted_volumes
@@ -1,77 +1,106 @@
 import asyncio
-import json
-from collections import defaultdict
+import time
 from concurrent.futures import ThreadPoolExecutor
-from datetime import datetime, timedelta
+from datetime import timedelta
+from functools import partial
 from typing import Tuple, List, Dict
-import requests
-import csv
 import httpx
+import numpy as np
 from pathlib import Path
 import sys
 from dune_client.client import DuneClient
-from helpers.supply_helpers.burn_and_locked_helper_arbitrum import get_locked_amounts, get_burned_amounts
-from app.core.config import (web3, supply_contract, distribution_contract,
-                             MAINNET_BLOCK_1ST_JAN_2024, DEXSCREENER_URL, COINGECKO_HISTORICAL_PRICES,
+from helpers.supply_helpers.burn_and_locked_helper_arbitrum import refresh_burn_and_locked, get_amounts
+from app.core.config import (async_web3, async_supply_contract, async_distribution_contract,
+                             PRICES_AND_VOLUME_DATA_DAYS,
                              AVERAGE_BLOCK_TIME, TOTAL_SUPPLY_HISTORICAL_DAYS,
-                             TOTAL_SUPPLY_HISTORICAL_START_BLOCK, CIRC_SUPPLY_CSV_PATH, logger,
-                             DUNE_API_KEY, DUNE_QUERY_ID)
-from helpers.supply_helpers.get_historical_total_supply import get_json_from_csv
+                             TOTAL_SUPPLY_HISTORICAL_START_BLOCK, logger,
+                             DUNE_API_KEY, DUNE_QUERY_ID, CIRC_SUPPLY_FRESHNESS_SECONDS,
+                             MARKET_CAP_INPUT_TIMEOUT, DUNE_API_URL, DUNE_CHECK_TIMEOUT)
+from helpers.supply_helpers.get_historical_total_supply import get_total_supply_until
+from helpers.supply_helpers.get_historical_circ_supply import load_circulating_supply_series
+from helpers.price_helpers.price_oracle import get_price_async
+from helpers.supply_helpers.price_volume_store import refresh_store, get_store, format_daily_series
+from helpers.supply_helpers.circulating_supply_helpers.circ_supply_ledger import ensure_ledger, read_ledger_tail
 from helpers.supply_helpers.circulating_supply_helpers.three_update_historical_circ_supply import (
-    update_circulating_supply_csv)
-
-
-async def get_combined_supply_data():
+    update_circulating_supply_ledger, get_block_number_by_timestamp)
+
+
+def merge_join_days(left_days: List[int], right_days: List[int]) -> Tuple[List[int], List[int]]:
+    """Returns the index pairs of the days present in both ascending, duplicate free day lists."""
+    left_indices, right_indices = [], []
+    i, j = 0, 0
+    while i < len(left_days) and j < len(right_days):
+        if left_days[i] < right_days[j]:
+            i += 1
+        elif left_days[i] > right_days[j]:
+            j += 1
+        else:
+            left_indices.append(i)
+            right_indices.append(j)
+            i += 1
+            j += 1
+    return left_indices, right_indices
+
+
+async def get_combined_supply_data() -> Dict[str, List[Dict]]:
     try:
-        # Step 1: Retrieve the updated total supply data
-        total_supply_data = get_json_from_csv()
-
-        # Step 2: Get the earliest date from the total supply data
-        earliest_total_supply_date = min(
-            total_supply_data.keys(), key=lambda x: datetime.strptime(x, '%d/%m/%Y')
-        )
-
-        # Step 3: Read circulating supply data from the CSV file (no need for async here)
-        circulating_supply_data = get_historical_circulating_supply(earliest_total_supply_date)
+        # Step 1: Retrieve the total supply schedule up to today, sorted by day
+        total_supply = get_total_supply_until()
+
+        # Step 2: Read circulating supply data from the first scheduled day onwards (no need for async here)
+        earliest_day = int(total_supply["day_ordinals"][0]) if len(total_supply["day_ordinals"]) else 0
+        circulating_supply = get_historical_circulating_supply(earliest_day)
+        if not circulating_supply:
+            return {"data": []}
+
+        # Step 3: Join both series on their integer days, then list the latest date first
+        total_indices, circ_indices = merge_join_days(total_supply["day_ordinals"].tolist(),
+                                                      circulating_supply["day_ordinals"].tolist())
+        dates = total_supply["dates"][total_indices].tolist()
+        total_values = total_supply["total_supply"][total_indices].tolist()
+        circ_values = circulating_supply["circulating_supply"][circ_indices].tolist()
+        claimed_values = circulating_supply["total_claimed"][circ_indices].tolist()
+
+        combined_data = [
+            {
+                "date": date,
+                "total_supply": total,
+                "circulating_supply": circ,
+                "total_claimed_that_day": claimed
+            }
+            for date, total, circ, claimed in zip(dates[::-1], total_values[::-1], circ_values[::-1],
+                                                  claimed_values[::-1])
+        ]
+
+        return {"data": combined_data}
 
-        # Step 4: Combine both total supply and circulating supply into the desired format
-        combined_data = []
-        for date, total_supply in total_supply_data.items():
-            if date in circulating_supply_data:
-                combined_data.append({
-                    "date": date,
-                    "total_supply": total_supply,
-                    "circulating_supply": circulating_supply_data[date]['circulating_supply'],
-                    "total_claimed_that_day": circulating_supply_data[date]['total_claimed_that_day']
-                })
+    except Exception as e:
+        print(f"Error occurred while fetching data: {str(e)}")
+        return {"data": []}
 
-        return json.dumps({"data": combined_data}, indent=4)
 
+def update_circulating_supply() -> None:
+    """Appends new UserClaimed events to the circulating supply ledger, run as a scheduled job off the request path."""
+    try:
+        appended_days = update_circulating_supply_ledger()
+        logger.info(f"Circulating supply ledger updated, {appended_days} day rows appended")
     except Exception as e:
-        print(f"Error occurred while fetching data: {str(e)}")
-        return json.dumps({"data": []}, indent=4)
+        logger.error(f"Error updating circulating supply: {str(e)}")
 
 
-def get_historical_circulating_supply(earliest_date: str, csv_file: str = CIRC_SUPPLY_CSV_PATH) -> dict:
+def get_historical_circulating_supply(earliest_day: int, csv_file: str = None) -> dict:
+    """
+    Returns the already ingested circulating supply arrays (see `load_circulating_supply_series`) from
+    `earliest_day` onwards. New days are added by `update_circulating_supply`, not on this read path.
+    """
     try:
-        # Step 1: Update the CSV file with the latest circulating supply data
-        update_circulating_supply_csv(csv_file)
-
-        # Step 2: Read the CSV file for circulating supply data
-        circulating_supply_data = {}
-        with open(csv_file, 'r') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                date = row['date']
-                # Only include data from the earliest_date onwards
-                if datetime.strptime(date, '%d/%m/%Y') >= datetime.strptime(earliest_date, '%d/%m/%Y'):
-                    circulating_supply_data[date] = {
-                        "circulating_supply": float(row['circulating_supply_at_that_date']),
-                        "total_claimed_that_day": float(row['total_claimed_that_day'])
-                    }
-
-        # Return the circulating supply data
-        return circulating_supply_data
+        csv_file = csv_file or ensure_ledger()
+
+        # Slice the sorted series from the earliest day onwards
+        series = load_circulating_supply_series(csv_file)
+        start = int(np.searchsorted(series["day_ordinals"], earliest_day, side='left'))
+
+        return {key: values[start:] for key, values in series.items() if key != "signature"}
 
     except FileNotFoundError:
         print(f"CSV file not found at {csv_file}")
@@ -81,83 +110,117 @@ def get_historical_circulating_supply(earliest_date: str, csv_file: str = CIRC_S
         return {}
 
 
-async def get_historical_prices_and_trading_volume() -> Tuple[Dict[str, List[List]], Dict[str, List[List]]]:
-    async with httpx.AsyncClient() as client:
-        response = await client.get(COINGECKO_HISTORICAL_PRICES)
-        data = response.json()
+async def get_historical_prices_and_trading_volume(days: int = PRICES_AND_VOLUME_DATA_DAYS) -> Tuple[
+        Dict[str, List[List]], Dict[str, List[List]]]:
+    # Only the newest window is downloaded, the rest comes from the local daily store
+    store = await refresh_store(days)
+    sorted_prices, sorted_volumes = format_daily_series(store, days)
 
-    def process_data(data_points: List[Tuple[int, float]]) -> List[List]:
-        # Dictionary to hold aggregated data by day
-        aggregated_data = defaultdict(list)
+    # Create JSON structures
+    prices_json = {"prices": sorted_prices}
+    volumes_json = {"total_volumes": sorted_volumes}
 
-        # Convert timestamps to DD/MM/YYYY and aggregate data by day
-        for timestamp, value in data_points:
-            date = datetime.utcfromtimestamp(timestamp / 1000).strftime('%d/%m/%Y')
-            aggregated_data[date].append(value)
+    return prices_json, volumes_json
 
-        # Average the values for each day
-        averaged_data = []
-        for date, values in aggregated_data.items():
-            averaged_value = round((sum(values) / len(values)), 4)
-            averaged_data.append([date, averaged_value])
 
-        # Sort the data with the latest date at the top
-        averaged_data.sort(key=lambda x: datetime.strptime(x[0], '%d/%m/%Y'), reverse=True)
+async def get_stored_prices_and_trading_volume(days: int) -> Tuple[Dict[str, List[List]], Dict[str, List[List]]]:
+    # Request path: served from the local daily store, which is only downloaded into when it lacks today or the
+    # lookback
+    store = await get_store(days)
+    sorted_prices, sorted_volumes = format_daily_series(store, days)
+    return {"prices": sorted_prices}, {"total_volumes": sorted_volumes}
 
-        return averaged_data
 
-    # Process prices and total_volumes
-    sorted_prices = process_data(data['prices'])
-    sorted_volumes = process_data(data['total_volumes'])
+# Shared pool for the blocking file and Dune client calls made from the async helpers below, chain reads use
+# AsyncWeb3 instead
+BLOCKING_CALLS_EXECUTOR = ThreadPoolExecutor(max_workers=8, thread_name_prefix="supply-blocking")
 
-    # Create JSON structures
-    prices_json = {"prices": sorted_prices}
-    volumes_json = {"total_volumes": sorted_volumes}
+# Last successful market cap inputs, used when a fresh fetch fails or times out
+_market_cap_inputs = {}
 
-    return prices_json, volumes_json
+
+async def run_blocking(func, *args):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(BLOCKING_CALLS_EXECUTOR, partial(func, *args))
 
 
 async def get_current_total_supply() -> float:
-    loop = asyncio.get_running_loop()
-    with ThreadPoolExecutor() as pool:
-        total_supply = await loop.run_in_executor(pool,
-                                                  supply_contract.functions.getTotalRewards().call)
+    total_supply = await async_supply_contract.functions.getTotalRewards().call()
+    return round((total_supply / 10 ** 18), 4)
+
 
-        return round((total_supply / 10 ** 18), 4)
+# Running circulating supply past the ledger tail, advanced by market cap requests between ledger updates
+_circulating_supply_checkpoint = {"block": None, "circulating_supply": 0.0}
+_circulating_supply_lock = asyncio.Lock()
 
 
 async def get_current_circulating_supply() -> float:
-    circulating_supply = 0
+    """
+    Returns the current circulating supply from the ledger's running total.
 
-    event_filter = distribution_contract.events.UserClaimed.create_filter(
-        from_block=MAINNET_BLOCK_1ST_JAN_2024,
-        to_block='latest',
-    )
+    When the ledger was updated within CIRC_SUPPLY_FRESHNESS_SECONDS no RPC call is made. Otherwise only the
+    UserClaimed events after the latest checkpoint (the ledger tail or the last call) are summed.
+    """
+    await run_blocking(ensure_ledger)
+    tail = read_ledger_tail()
+
+    if tail.get("last_block") is not None and time.time() - tail.get("updated_at", 0) < CIRC_SUPPLY_FRESHNESS_SECONDS:
+        return round(tail["circulating_supply"], 4)
+
+    # Concurrent callers would otherwise add the same events to the checkpoint twice
+    async with _circulating_supply_lock:
+        checkpoint = _circulating_supply_checkpoint
+        if checkpoint["block"] is None or (tail.get("last_block") or 0) >= checkpoint["block"]:
+            last_block = tail.get("last_block")
+            if last_block is None:
+                # Ledger seeded from the consolidated CSV, locate its last block once
+                last_block = await run_blocking(get_block_number_by_timestamp, tail.get("block_timestamp", 0))
+            checkpoint = {"block": last_block, "circulating_supply": tail.get("circulating_supply", 0.0)}
 
-    events = event_filter.get_all_entries()
+        latest_block = await async_web3.eth.block_number
+        circulating_supply = checkpoint["circulating_supply"]
 
-    for event in events:
-        amount = float(event['args']['amount']) / pow(10, 18)
-        circulating_supply += amount
+        if latest_block > checkpoint["block"]:
+            events = await async_distribution_contract.events.UserClaimed.get_logs(
+                from_block=checkpoint["block"] + 1,
+                to_block=latest_block,
+            )
 
-    return round(circulating_supply, 4)
+            for event in events:
+                circulating_supply += float(event['args']['amount']) / pow(10, 18)
+
+        _circulating_supply_checkpoint.update({"block": latest_block, "circulating_supply": circulating_supply})
+        return round(circulating_supply, 4)
 
 
 async def get_current_mor_price() -> float:
-    response = requests.get(DEXSCREENER_URL)
+    return await get_price_async("MOR") or 0.0
+
+
+async def _get_market_cap_input(name: str, fetch) -> float:
+    """Fetches one market cap input within MARKET_CAP_INPUT_TIMEOUT, falling back to its last good value."""
+    try:
+        value = await asyncio.wait_for(fetch(), timeout=MARKET_CAP_INPUT_TIMEOUT)
+    except Exception as e:
+        if name not in _market_cap_inputs:
+            raise
+        logger.warning(f"Using cached {name} for market cap, fetch failed: {str(e) or type(e).__name__}")
+        return _market_cap_inputs[name]
 
-    if response.status_code == 200:
-        data = response.json()
-        mor_price = float(data['pairs'][0]['priceUsd'])
-    else:
-        mor_price = 0.0
-    return mor_price
+    if value:
+        _market_cap_inputs[name] = value
+        return value
+    # e.g. the price API answered with an error status and the price came back as 0.0
+    return _market_cap_inputs.get(name, value)
 
 
 async def get_market_cap() -> Tuple[float, float]:
-    current_mor_price = await get_current_mor_price()
-    current_circulating_supply = await get_current_circulating_supply()
-    current_total_supply = await get_current_total_supply()
+    # The three inputs are independent, so the latency is that of the slowest one
+    current_mor_price, current_circulating_supply, current_total_supply = await asyncio.gather(
+        _get_market_cap_input("mor_price", get_current_mor_price),
+        _get_market_cap_input("circulating_supply", get_current_circulating_supply),
+        _get_market_cap_input("total_supply", get_current_total_supply)
+    )
 
     total_supply_market_cap = current_total_supply * current_mor_price
     circulating_supply_market_cap = current_circulating_supply * current_mor_price
@@ -166,18 +229,38 @@ async def get_market_cap() -> Tuple[float, float]:
 
 
 async def get_historical_locked_and_burnt_mor() -> Tuple[Dict[str, List[List]], Dict[str, List[List]]]:
-    burnt_mor = await get_burned_amounts()
-    locked_mor = await get_locked_amounts()
+    # One scan per refresh covers both the burn address and the safe
+    state = await refresh_burn_and_locked()
+    burnt_mor = get_amounts(state, "cumulative_mor_burnt")
+    locked_mor = get_amounts(state, "cumulative_mor_locked")
 
     return burnt_mor, locked_mor
 
 
-async def get_mor_holders():
-    dune = DuneClient(
-        api_key=DUNE_API_KEY,
-        base_url="https://api.dune.com",
-        request_timeout=300
-    )
+_dune_client = None
+
+
+def _get_dune_client() -> DuneClient:
+    global _dune_client
+    if _dune_client is None:
+        _dune_client = DuneClient(
+            api_key=DUNE_API_KEY,
+            base_url=DUNE_API_URL,
+            request_timeout=300
+        )
+    return _dune_client
+
+
+async def get_latest_dune_execution_id() -> str:
+    """Returns the execution id of the holders query's latest result without downloading its rows."""
+    # dune_client has no public call for only the metadata, so this asks the results API for a single row
+    async with httpx.AsyncClient(timeout=DUNE_CHECK_TIMEOUT) as client:
+        response = await client.get(f"{DUNE_API_URL}/api/v1/query/{DUNE_QUERY_ID}/results", params={"limit": 1},
+                                    headers={"X-Dune-API-Key": DUNE_API_KEY or ""})
+        response.raise_for_status()
+        return response.json()["execution_id"]
 
-    token_holders = dune.get_latest_result(DUNE_QUERY_ID)
+
+async def get_mor_holders():
+    token_holders = await run_blocking(_get_dune_client().get_latest_result, DUNE_QUERY_ID)
     return token_holders
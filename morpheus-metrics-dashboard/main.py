@@ -1,3 +1,4 @@
+import asyncio
 import json
 import os
 from fastapi import FastAPI, HTTPException
@@ -6,19 +7,31 @@ from fastapi.middleware.cors import CORSMiddleware
 from datetime import datetime, date
 import numpy as np
 import logging
+from typing import Optional
 
 ################################# Helpers Imported #####################################################################
 
-from helpers.staking_general_helpers.emissions import read_emission_schedule
+from helpers.staking_general_helpers.emissions import (read_emission_schedule, get_emissions_on_date,
+                                                        get_emissions_in_range)
 from helpers.staking_general_helpers.daily_process_script import daily_process
-from helpers.staking_general_helpers.position import protocol_liquidity
+from helpers.staking_general_helpers.position import protocol_liquidity, price_shock_table
+from helpers.staking_general_helpers.liquidity_history import (update_liquidity_history, load_liquidity_history,
+                                                               format_liquidity_history)
 from helpers.staking_helpers.response_distribution import (analyze_mor_stakers, get_wallet_stake_info,
                                                            calculate_average_multipliers,
                                                            calculate_pool_rewards_summary, give_more_reward_response)
+from helpers.staking_helpers.stake_sketches import update_stake_sketches, query_stake_distribution
+from helpers.staking_helpers.reward_simulator import get_reward_grid
+from helpers.series_helpers.downsampling import (DOWNSAMPLING_METHODS, MIN_POINTS, downsample_pairs,
+                                                 downsample_records, downsample_date_map, get_downsampled)
+from helpers.series_helpers.delta import (parse_since, next_cursor, pairs_since, records_since, date_map_since)
+from app.core.config import EMISSION_SCHEDULE_CSV_PATH, MAX_REWARD_GRID_SIZE, BURN_FROM_ADDRESS
 from helpers.supply_helpers.supply_main import (get_combined_supply_data,
-                                                get_historical_prices_and_trading_volume, get_market_cap,
-                                                get_mor_holders,
-                                                get_historical_locked_and_burnt_mor)
+                                                get_historical_prices_and_trading_volume,
+                                                get_stored_prices_and_trading_volume, get_market_cap,
+                                                get_historical_locked_and_burnt_mor, update_circulating_supply)
+from helpers.supply_helpers.holder_distribution import (refresh_holder_snapshot, get_holder_snapshot,
+                                                        holder_range_counts, holder_statistics)
 
 ################################# Init & Cache Config ##################################################################
 
@@ -50,6 +63,9 @@ LAST_CACHE_UPDATE_TIME = None
 
 CACHE_FILE = 'cache.json'
 
+# Owner of the protocol's Uniswap V3 positions
+PROTOCOL_LIQUIDITY_ADDRESS = BURN_FROM_ADDRESS
+
 
 # Function to read cache from a file
 def read_cache() -> dict:
@@ -85,6 +101,196 @@ def write_cache(cache_data: dict):
         print(f"Error writing to cache file: {e}")
 
 
+def parse_float_list(value: Optional[str], name: str) -> Optional[list]:
+    """Parses a comma separated query parameter such as `?bins=0,50,100` into a list of floats"""
+    if value is None:
+        return None
+    try:
+        return [float(item) for item in value.split(',') if item.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"'{name}' must be a comma separated list of numbers")
+
+
+def parse_bin_edges(value: Optional[str], name: str) -> Optional[list]:
+    """Parses histogram bin edges, which need at least two strictly increasing values"""
+    edges = parse_float_list(value, name)
+    if edges is not None and (len(edges) < 2 or any(b <= a for a, b in zip(edges, edges[1:]))):
+        raise HTTPException(status_code=400, detail=f"'{name}' needs at least two strictly increasing bin edges")
+    return edges
+
+
+def validate_downsampling(max_points: Optional[int], method: str) -> None:
+    if max_points is not None and max_points < MIN_POINTS:
+        raise HTTPException(status_code=400, detail=f"'max_points' must be at least {MIN_POINTS}")
+    if method not in DOWNSAMPLING_METHODS:
+        raise HTTPException(status_code=400, detail=f"'method' must be one of {', '.join(DOWNSAMPLING_METHODS)}")
+
+
+def parse_since_param(since: Optional[str]) -> Optional[int]:
+    if since is None:
+        return None
+    try:
+        return parse_since(since)
+    except ValueError:
+        raise HTTPException(status_code=400,
+                            detail="'since' must be a cursor or a date (YYYY-MM-DD or DD/MM/YYYY)")
+
+
+def series_response(name: str, data, since: Optional[int], max_points: Optional[int], method: str, delta,
+                    downsample, length, cached: bool = True):
+    """
+    Shapes a historical series response: `delta(data, since, version)` keeps only the points after `since`, then
+    `downsample(data, max_points, method)` runs when `max_points` is below `length(data)`, the longest series'
+    point count. Sorted indexes and full-history downsampling results are reused until the cache file changes,
+    `cached=False` marks data that isn't from it.
+    """
+    version = os.path.getmtime(CACHE_FILE) if cached and os.path.exists(CACHE_FILE) else None
+    if since is not None:
+        data = delta(data, since, version)
+    if max_points is None or max_points >= length(data):
+        return data
+    if since is not None or version is None:
+        return downsample(data, max_points, method)
+    return get_downsampled(name, max_points, method, version, lambda: downsample(data, max_points, method))
+
+
+def staking_metrics_since(staking_metrics: dict, since: int, version) -> dict:
+    staker_analysis = staking_metrics['staker_analysis']
+    daily_unique_stakers, newest = date_map_since('daily_unique_stakers', version,
+                                                  staker_analysis['daily_unique_stakers'], since)
+    return {**staking_metrics, "staker_analysis": {**staker_analysis, "daily_unique_stakers": daily_unique_stakers},
+            "cursor": next_cursor(since, newest)}
+
+
+def supply_since(supply: dict, since: int, version) -> dict:
+    data, newest = records_since('total_and_circ_supply', version, supply['data'], since)
+    return {"data": data, "cursor": next_cursor(since, newest)}
+
+
+def prices_and_volume_since(prices_and_volume: dict, since: int, version) -> dict:
+    prices, newest_price = pairs_since('prices', version, prices_and_volume['prices'], since)
+    volumes, newest_volume = pairs_since('total_volumes', version, prices_and_volume['total_volumes'], since)
+    return {"prices": prices, "total_volumes": volumes, "cursor": next_cursor(since, newest_price, newest_volume)}
+
+
+def locked_and_burnt_since(locked_and_burnt: dict, since: int, version) -> dict:
+    burnt_mor, locked_mor = locked_and_burnt['burnt_mor'], locked_and_burnt['locked_mor']
+    burnt, newest_burnt = date_map_since('cumulative_mor_burnt', version, burnt_mor['cumulative_mor_burnt'], since)
+    locked, newest_locked = date_map_since('cumulative_mor_locked', version, locked_mor['cumulative_mor_locked'],
+                                           since)
+    return {
+        "burnt_mor": {**burnt_mor, "cumulative_mor_burnt": burnt},
+        "locked_mor": {**locked_mor, "cumulative_mor_locked": locked},
+        "cursor": next_cursor(since, newest_burnt, newest_locked)
+    }
+
+
+def staking_metrics_length(staking_metrics: dict) -> int:
+    return len(staking_metrics['staker_analysis']['daily_unique_stakers'])
+
+
+def downsample_staking_metrics(staking_metrics: dict, max_points: int, method: str) -> dict:
+    staker_analysis = staking_metrics['staker_analysis']
+    daily_unique_stakers = downsample_date_map(staker_analysis['daily_unique_stakers'], max_points, method,
+                                               value=lambda v: v['combined'])
+    return {**staking_metrics, "staker_analysis": {**staker_analysis, "daily_unique_stakers": daily_unique_stakers}}
+
+
+def records_length(records: dict) -> int:
+    return len(records['data'])
+
+
+def downsample_supply(supply: dict, max_points: int, method: str) -> dict:
+    return {**supply, "data": downsample_records(supply['data'], 'circulating_supply', max_points, method)}
+
+
+def prices_and_volume_length(prices_and_volume: dict) -> int:
+    return max(len(prices_and_volume['prices']), len(prices_and_volume['total_volumes']))
+
+
+def downsample_prices_and_volume(prices_and_volume: dict, max_points: int, method: str) -> dict:
+    return {
+        **prices_and_volume,
+        "prices": downsample_pairs(prices_and_volume['prices'], max_points, method),
+        "total_volumes": downsample_pairs(prices_and_volume['total_volumes'], max_points, method)
+    }
+
+
+def liquidity_history_since(liquidity_history: dict, since: int, version) -> dict:
+    data, newest = records_since('protocol_liquidity_history', version, liquidity_history['data'], since)
+    return {"data": data, "cursor": next_cursor(since, newest)}
+
+
+def downsample_liquidity_history(liquidity_history: dict, max_points: int, method: str) -> dict:
+    return {**liquidity_history,
+            "data": downsample_records(liquidity_history['data'], 'value_in_mor', max_points, method)}
+
+
+def locked_and_burnt_length(locked_and_burnt: dict) -> int:
+    return max(len(locked_and_burnt['burnt_mor']['cumulative_mor_burnt']),
+               len(locked_and_burnt['locked_mor']['cumulative_mor_locked']))
+
+
+def downsample_locked_and_burnt(locked_and_burnt: dict, max_points: int, method: str) -> dict:
+    burnt_mor, locked_mor = locked_and_burnt['burnt_mor'], locked_and_burnt['locked_mor']
+    return {
+        **locked_and_burnt,
+        "burnt_mor": {**burnt_mor, "cumulative_mor_burnt": downsample_date_map(
+            burnt_mor['cumulative_mor_burnt'], max_points, method)},
+        "locked_mor": {**locked_mor, "cumulative_mor_locked": downsample_date_map(
+            locked_mor['cumulative_mor_locked'], max_points, method)}
+    }
+
+
+def build_staking_metrics(csv_file_path: str, emission_file_path: str) -> dict:
+    staker_analysis = analyze_mor_stakers(csv_file_path)
+    multiplier_analysis = calculate_average_multipliers(csv_file_path)
+    stakereward_analysis = calculate_pool_rewards_summary(csv_file_path)
+    today = datetime.today()
+    formatted_date = today.strftime("%m/%d/%y")
+    emissionreward_analysis = read_emission_schedule(formatted_date, emission_file_path)
+
+    # Convert date objects to strings
+    staker_analysis['daily_unique_stakers'] = {
+        k.isoformat() if isinstance(k, date) else k: v
+        for k, v in staker_analysis['daily_unique_stakers'].items()
+    }
+
+    # Convert timedelta objects to string representations
+    for pool_id, time_delta in staker_analysis['average_stake_time'].items():
+        staker_analysis['average_stake_time'][pool_id] = str(time_delta)
+    staker_analysis['combined_average_stake_time'] = str(staker_analysis['combined_average_stake_time'])
+
+    # Convert numpy types to Python native types
+    def convert_np(obj):
+        if isinstance(obj, np.generic):
+            return obj.item()
+        elif isinstance(obj, dict):
+            return {k: convert_np(v) for k, v in obj.items()}
+        elif isinstance(obj, list):
+            return [convert_np(i) for i in obj]
+        return obj
+
+    emissionreward_analysis = convert_np(emissionreward_analysis)
+
+    return {
+        "staker_analysis": staker_analysis,
+        "multiplier_analysis": {
+            "overall_average": float(multiplier_analysis['overall_average']),
+            "capital_average": float(multiplier_analysis['capital_average']),
+            "code_average": float(multiplier_analysis['code_average'])
+        },
+        "stakereward_analysis": {str(k): v for k, v in stakereward_analysis.items()},
+        "emissionreward_analysis": emissionreward_analysis
+    }
+
+
+def build_stake_info(csv_file_path: str) -> dict:
+    stake_info = get_wallet_stake_info(csv_file_path)
+    update_stake_sketches(csv_file_path)
+    return stake_info
+
+
 ################################# Scheduled Cache Update Task ##########################################################
 
 @app.on_event("startup")
@@ -99,108 +305,76 @@ def scheduled_daily_process() -> None:
 
 
 @app.on_event("startup")
-@repeat_every(seconds=60 * 60 * 12)  # Run every 12 hours
-async def update_cache_task() -> None:
-    try:
-        cache_data = read_cache()
+@repeat_every(seconds=60 * 60)  # Run every hour
+def scheduled_circulating_supply_update() -> None:
+    # Keeps the on-chain scan off the /total_and_circ_supply request path
+    logger.info("Starting scheduled circulating supply update")
+    update_circulating_supply()
 
-        # Staking Metrics Cache
-        csv_file_path = "helpers/staking_general_helpers/general_csv_files/usermultiplier2.csv"
-        emission_file_path = "helpers/staking_general_helpers/general_csv_files/emissions.csv"
 
-        staker_analysis = analyze_mor_stakers(csv_file_path)
-        multiplier_analysis = calculate_average_multipliers(csv_file_path)
-        stakereward_analysis = calculate_pool_rewards_summary(csv_file_path)
-        today = datetime.today()
-        formatted_date = today.strftime("%m/%d/%y")
-        emissionreward_analysis = read_emission_schedule(formatted_date, emission_file_path)
+@app.on_event("startup")
+@repeat_every(seconds=60 * 60 * 6)  # Run every 6 hours
+def scheduled_liquidity_history_update() -> None:
+    # Backfills the daily protocol liquidity snapshots on the first run, then only adds the new days
+    logger.info("Starting scheduled protocol liquidity history update")
+    try:
+        update_liquidity_history(PROTOCOL_LIQUIDITY_ADDRESS)
+    except Exception as e:
+        logger.error(f"Error in scheduled protocol liquidity history update: {str(e)}")
 
-        # Convert date objects to strings
-        staker_analysis['daily_unique_stakers'] = {
-            k.isoformat() if isinstance(k, date) else k: v
-            for k, v in staker_analysis['daily_unique_stakers'].items()
-        }
 
-        # Convert timedelta objects to string representations
-        for pool_id, time_delta in staker_analysis['average_stake_time'].items():
-            staker_analysis['average_stake_time'][pool_id] = str(time_delta)
-        staker_analysis['combined_average_stake_time'] = str(staker_analysis['combined_average_stake_time'])
+async def refresh_cache() -> None:
+    """Recomputes every cached response and writes the cache file, also run on its own by tests/benchmark.py."""
+    try:
+        cache_data = read_cache()
 
-        # Convert numpy types to Python native types
-        def convert_np(obj):
-            if isinstance(obj, np.generic):
-                return obj.item()
-            elif isinstance(obj, dict):
-                return {k: convert_np(v) for k, v in obj.items()}
-            elif isinstance(obj, list):
-                return [convert_np(i) for i in obj]
-            return obj
+        csv_file_path = "helpers/staking_general_helpers/general_csv_files/usermultiplier2.csv"
+        emission_file_path = "helpers/staking_general_helpers/general_csv_files/emissions.csv"
 
-        emissionreward_analysis = convert_np(emissionreward_analysis)
+        # The refreshes are independent, so they run side by side: the AsyncWeb3 and HTTP ones on the event loop,
+        # the CSV analyses and the multicall based reads in worker threads. Requests keep being served meanwhile.
+        (staking_metrics, combined_supply_data, (prices_data, volume_data),
+         (total_supply_market_cap, circulating_supply_market_cap), give_mor_reward, stake_info, holder_snapshot,
+         (burnt_mor, locked_mor), protocol_liquidity_result) = await asyncio.gather(
+            asyncio.to_thread(build_staking_metrics, csv_file_path, emission_file_path),
+            get_combined_supply_data(),
+            get_historical_prices_and_trading_volume(),
+            get_market_cap(),
+            asyncio.to_thread(give_more_reward_response),
+            asyncio.to_thread(build_stake_info, csv_file_path),
+            refresh_holder_snapshot(),
+            get_historical_locked_and_burnt_mor(),
+            asyncio.to_thread(protocol_liquidity, PROTOCOL_LIQUIDITY_ADDRESS)
+        )
 
-        # Cache the staking analysis results
-        cache_data['staking_metrics'] = {
-            "staker_analysis": staker_analysis,
-            "multiplier_analysis": {
-                "overall_average": float(multiplier_analysis['overall_average']),
-                "capital_average": float(multiplier_analysis['capital_average']),
-                "code_average": float(multiplier_analysis['code_average'])
-            },
-            "stakereward_analysis": {str(k): v for k, v in stakereward_analysis.items()},
-            "emissionreward_analysis": emissionreward_analysis
-        }
+        # Staking Metrics Cache
+        cache_data['staking_metrics'] = staking_metrics
 
-        # Use get_combined_supply_data to cache the supply metrics
-        combined_supply_data = await get_combined_supply_data()
-        cache_data['total_and_circ_supply'] = json.loads(combined_supply_data)['data']  # Ensure correct data format
+        # Supply metrics from get_combined_supply_data
+        cache_data['total_and_circ_supply'] = combined_supply_data['data']
 
         # Cache for prices and trading volume
-        prices_data, volume_data = await get_historical_prices_and_trading_volume()
         cache_data['prices_and_volume'] = {
             "prices": prices_data["prices"],
             "total_volumes": volume_data["total_volumes"]
         }
 
         # Cache for market cap
-        total_supply_market_cap, circulating_supply_market_cap = await get_market_cap()
         cache_data['market_cap'] = {
             "total_supply_market_cap": total_supply_market_cap,
             "circulating_supply_market_cap": circulating_supply_market_cap
         }
 
         # Cache for give_mor_reward
-        cache_data['give_mor_reward'] = give_more_reward_response()
+        cache_data['give_mor_reward'] = give_mor_reward
 
         # Cache for get_stake_info
-        cache_data['stake_info'] = get_wallet_stake_info(csv_file_path)
+        cache_data['stake_info'] = stake_info
 
         # Cache for mor_holders_by_range
-        holders_response = await get_mor_holders()
-        holders_data = holders_response.result.rows
-        clean_holders = [
-            holder['amount']
-            for holder in holders_data
-            if holder['address'] != "0x0000000000000000000000000000000000000000" and holder['amount'] > 0.001
-        ]
-        ranges = [
-            {"range": "0-50", "min": 0, "max": 50},
-            {"range": "50-100", "min": 50, "max": 100},
-            {"range": "100-200", "min": 100, "max": 200},
-            {"range": "200-500", "min": 200, "max": 500},
-            {"range": "500-1000", "min": 500, "max": 1000},
-            {"range": "1000-10000", "min": 1000, "max": 10000},
-            {"range": "10000-500000", "min": 10000, "max": 500000}
-        ]
-        range_counts = {r['range']: 0 for r in ranges}
-        for amount in clean_holders:
-            for r in ranges:
-                if r['min'] <= amount < r['max']:
-                    range_counts[r['range']] += 1
-                    break
-        cache_data['mor_holders_by_range'] = {"range_counts": range_counts}
+        cache_data['mor_holders_by_range'] = {"range_counts": holder_range_counts(holder_snapshot)}
 
         # Cache for locked_and_burnt_mor
-        burnt_mor, locked_mor = await get_historical_locked_and_burnt_mor()
         burnt_mor_data = json.loads(burnt_mor)
         locked_mor_data = json.loads(locked_mor)
         cache_data['locked_and_burnt_mor'] = {
@@ -215,8 +389,7 @@ async def update_cache_task() -> None:
         }
 
         # Cache for protocol_liquidity
-        result = protocol_liquidity("0x151c2b49CdEC10B150B2763dF3d1C00D70C90956")
-        cache_data['protocol_liquidity'] = result
+        cache_data['protocol_liquidity'] = protocol_liquidity_result
 
         # Write the updated cache data to the cache file
         try:
@@ -230,6 +403,12 @@ async def update_cache_task() -> None:
         print(f"Error in cache update task: {str(e)}")
 
 
+@app.on_event("startup")
+@repeat_every(seconds=60 * 60 * 12)  # Run every 12 hours
+async def update_cache_task() -> None:
+    await refresh_cache()
+
+
 ################################# Root Endpoint ###########################################################
 
 @app.get("/")
@@ -240,11 +419,15 @@ async def root():
 ################################# Staking Metrics ###########################################################
 
 @app.get("/analyze-mor-stakers")
-async def get_mor_staker_analysis():
+async def get_mor_staker_analysis(since: Optional[str] = None, max_points: Optional[int] = None, method: str = "lttb"):
+    validate_downsampling(max_points, method)
+    since = parse_since_param(since)
     cache_data = read_cache()
 
     if 'staking_metrics' in cache_data:
-        return cache_data['staking_metrics']
+        return series_response('staking_metrics', cache_data['staking_metrics'], since, max_points, method,
+                               staking_metrics_since, downsample_staking_metrics,
+                               staking_metrics_length)
 
     # If cache not available, load the data and cache it
     try:
@@ -287,7 +470,9 @@ async def get_mor_staker_analysis():
         # Save to cache
         write_cache(cache_data)
 
-        return cache_data['staking_metrics']
+        return series_response('staking_metrics', cache_data['staking_metrics'], since, max_points, method,
+                               staking_metrics_since, downsample_staking_metrics,
+                               staking_metrics_length)
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
@@ -317,8 +502,61 @@ async def give_more_reward():
         raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
 
 
+@app.get("/simulate_rewards")
+async def simulate_rewards(lock_days: Optional[str] = None, deposits: Optional[str] = None,
+                           emissions: Optional[str] = None):
+    # Comma separated grids, e.g. ?lock_days=0,365,730&deposits=1,10,100&emissions=3456,3000
+    parsed_lock_days = parse_float_list(lock_days, "lock_days")
+    parsed_deposits = parse_float_list(deposits, "deposits")
+    parsed_emissions = parse_float_list(emissions, "emissions")
+
+    if parsed_lock_days and any(days < 0 for days in parsed_lock_days):
+        raise HTTPException(status_code=400, detail="'lock_days' must not be negative")
+    if parsed_deposits and any(deposit <= 0 for deposit in parsed_deposits):
+        raise HTTPException(status_code=400, detail="'deposits' must be positive")
+    if parsed_emissions and any(emission < 0 for emission in parsed_emissions):
+        raise HTTPException(status_code=400, detail="'emissions' must not be negative")
+
+    grid_size = np.prod([len(values) for values in (parsed_lock_days, parsed_deposits, parsed_emissions) if values])
+    if grid_size > MAX_REWARD_GRID_SIZE:
+        raise HTTPException(status_code=400, detail=f"The grid can have at most {MAX_REWARD_GRID_SIZE} points")
+
+    try:
+        # A missing snapshot is fetched over RPC and HTTP, and waits on a refresh already running in the cache task
+        return await asyncio.to_thread(
+            get_reward_grid, lock_days=[int(days) for days in parsed_lock_days] if parsed_lock_days else None,
+            deposits=parsed_deposits, emissions=parsed_emissions)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
+
+
 @app.get("/get_stake_info")
-async def get_stake_info():
+async def get_stake_info(pool_id: Optional[int] = None, start_date: Optional[date] = None,
+                         end_date: Optional[date] = None, percentiles: Optional[str] = None,
+                         stake_time_bins: Optional[str] = None, power_multiplier_bins: Optional[str] = None):
+    # Any query parameter switches to the per pool, per day sketches with fixed (or caller supplied) bins
+    if any(param is not None for param in (pool_id, start_date, end_date, percentiles,
+                                             stake_time_bins, power_multiplier_bins)):
+        parsed_percentiles = parse_float_list(percentiles, "percentiles")
+        if parsed_percentiles and not all(0 <= p <= 100 for p in parsed_percentiles):
+            raise HTTPException(status_code=400, detail="'percentiles' must be between 0 and 100")
+        stake_time_edges = parse_bin_edges(stake_time_bins, "stake_time_bins")
+        power_multiplier_edges = parse_bin_edges(power_multiplier_bins, "power_multiplier_bins")
+        try:
+            # Reading new CSV rows and merging the day sketches are blocking, keep them off the event loop
+            return await asyncio.to_thread(
+                query_stake_distribution,
+                "helpers/staking_general_helpers/general_csv_files/usermultiplier2.csv",
+                pool_id=pool_id,
+                start_date=start_date,
+                end_date=end_date,
+                percentiles=parsed_percentiles,
+                stake_time_bins=stake_time_edges,
+                power_multiplier_bins=power_multiplier_edges
+            )
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
+
     cache_data = read_cache()
 
     if 'stake_info' in cache_data:
@@ -341,9 +579,37 @@ async def get_stake_info():
         raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
 
 
+######################################### Emission Schedule Endpoints #################################################
+@app.get("/emission_schedule")
+async def emission_schedule(date: Optional[date] = None):
+    # Served from the compiled schedule index, defaults to today
+    try:
+        return get_emissions_on_date(date or datetime.today(), EMISSION_SCHEDULE_CSV_PATH)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
+
+
+@app.get("/emission_schedule/range")
+async def emission_schedule_range(start_date: date, end_date: date, resolution: str = "daily"):
+    if start_date > end_date:
+        raise HTTPException(status_code=400, detail="'start_date' must not be after 'end_date'")
+
+    try:
+        periods = get_emissions_in_range(start_date, end_date, EMISSION_SCHEDULE_CSV_PATH, resolution)
+        return {"resolution": resolution, "data": periods}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
+
+
 ######################################### Supply Endpoints ############################################################
 @app.get("/total_and_circ_supply")
-async def total_and_circ_supply():
+async def total_and_circ_supply(since: Optional[str] = None, max_points: Optional[int] = None, method: str = "lttb"):
+    validate_downsampling(max_points, method)
+    since = parse_since_param(since)
     # Read the cached data
     cache_data = read_cache()
 
@@ -351,7 +617,8 @@ async def total_and_circ_supply():
     if 'total_and_circ_supply' in cache_data:
         print("Returning cached total_and_circ_supply data")
         # Directly return the cached data without the extra "data" key
-        return {"data": cache_data['total_and_circ_supply']}
+        return series_response('total_and_circ_supply', {"data": cache_data['total_and_circ_supply']},
+                               since, max_points, method, supply_since, downsample_supply, records_length)
 
     # If cache is missing or invalid, fetch fresh data
     try:
@@ -362,11 +629,12 @@ async def total_and_circ_supply():
 
         # Cache the result by saving the combined data
         # Ensure the result is not nested under 'data' twice
-        cache_data['total_and_circ_supply'] = json.loads(combined_supply_data)['data']
+        cache_data['total_and_circ_supply'] = combined_supply_data['data']
         write_cache(cache_data)
 
         # Return the combined supply data directly in the correct structure
-        return {"data": cache_data['total_and_circ_supply']}
+        return series_response('total_and_circ_supply', {"data": cache_data['total_and_circ_supply']},
+                               since, max_points, method, supply_since, downsample_supply, records_length)
 
     except Exception as e:
         # Handle any exceptions and return an appropriate error response
@@ -375,11 +643,28 @@ async def total_and_circ_supply():
 
 
 @app.get("/prices_and_trading_volume")
-async def historical_prices_and_volume():
+async def historical_prices_and_volume(days: Optional[int] = None, since: Optional[str] = None,
+                                       max_points: Optional[int] = None, method: str = "lttb"):
+    validate_downsampling(max_points, method)
+    since = parse_since_param(since)
+    # A custom lookback is served from the local daily store, downloading only the days it is missing
+    if days is not None:
+        if days < 1:
+            raise HTTPException(status_code=400, detail="'days' must be at least 1")
+        try:
+            prices_data, volume_data = await get_stored_prices_and_trading_volume(days)
+            response_data = {"prices": prices_data["prices"], "total_volumes": volume_data["total_volumes"]}
+            return series_response('prices_and_volume', response_data, since, max_points, method,
+                                   prices_and_volume_since, downsample_prices_and_volume, prices_and_volume_length,
+                                   cached=False)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
+
     cache_data = read_cache()
 
     if 'prices_and_volume' in cache_data:
-        return cache_data['prices_and_volume']
+        return series_response('prices_and_volume', cache_data['prices_and_volume'], since, max_points, method,
+                               prices_and_volume_since, downsample_prices_and_volume, prices_and_volume_length)
 
     # If cache not available, load the data and cache it
     try:
@@ -391,7 +676,8 @@ async def historical_prices_and_volume():
         }
         write_cache(cache_data)
 
-        return cache_data['prices_and_volume']
+        return series_response('prices_and_volume', cache_data['prices_and_volume'], since, max_points, method,
+                               prices_and_volume_since, downsample_prices_and_volume, prices_and_volume_length)
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
@@ -421,7 +707,16 @@ async def market_cap():
 
 
 @app.get("/mor_holders_by_range")
-async def mor_holders_by_range():
+async def mor_holders_by_range(bins: Optional[str] = None):
+    # Custom bin edges (e.g. ?bins=0,10,100,1000) are counted from the in-memory holder snapshot
+    edges = parse_bin_edges(bins, "bins")
+    if edges is not None:
+        try:
+            holder_snapshot = get_holder_snapshot() or await refresh_holder_snapshot()
+            return {"range_counts": holder_range_counts(holder_snapshot, edges)}
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
+
     cache_data = read_cache()
 
     if 'mor_holders_by_range' in cache_data:
@@ -431,34 +726,8 @@ async def mor_holders_by_range():
     print("Cache miss, fetching new data")  # Debug print
 
     try:
-        holders_response = await get_mor_holders()
-        holders_data = holders_response.result.rows
-
-        clean_holders = [
-            holder['amount']
-            for holder in holders_data
-            if holder['address'] != "0x0000000000000000000000000000000000000000" and holder['amount'] > 0.001
-        ]
-
-        ranges = [
-            {"range": "0-50", "min": 0, "max": 50},
-            {"range": "50-100", "min": 50, "max": 100},
-            {"range": "100-200", "min": 100, "max": 200},
-            {"range": "200-500", "min": 200, "max": 500},
-            {"range": "500-1000", "min": 500, "max": 1000},
-            {"range": "1000-10000", "min": 1000, "max": 10000},
-            {"range": "10000-500000", "min": 10000, "max": 500000}
-        ]
-
-        range_counts = {r['range']: 0 for r in ranges}
-
-        for amount in clean_holders:
-            for r in ranges:
-                if r['min'] <= amount < r['max']:
-                    range_counts[r['range']] += 1
-                    break
-
-        result = {"range_counts": range_counts}
+        holder_snapshot = await refresh_holder_snapshot()
+        result = {"range_counts": holder_range_counts(holder_snapshot)}
         cache_data['mor_holders_by_range'] = result
         write_cache(cache_data)
 
@@ -469,12 +738,33 @@ async def mor_holders_by_range():
         raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
 
 
+@app.get("/mor_holders_distribution")
+async def mor_holders_distribution(top_n: Optional[str] = None, percentiles: Optional[str] = None):
+    # e.g. ?top_n=10,100&percentiles=50,90,99
+    parsed_top_n = parse_float_list(top_n, "top_n")
+    parsed_percentiles = parse_float_list(percentiles, "percentiles")
+    if parsed_top_n and any(n < 1 for n in parsed_top_n):
+        raise HTTPException(status_code=400, detail="'top_n' values must be at least 1")
+    if parsed_percentiles and any(p < 0 or p > 100 for p in parsed_percentiles):
+        raise HTTPException(status_code=400, detail="'percentiles' must be between 0 and 100")
+
+    try:
+        holder_snapshot = get_holder_snapshot() or await refresh_holder_snapshot()
+        return holder_statistics(holder_snapshot, [int(n) for n in parsed_top_n] if parsed_top_n else None,
+                                 parsed_percentiles)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
+
+
 @app.get("/locked_and_burnt_mor")
-async def locked_and_burnt_mor():
+async def locked_and_burnt_mor(since: Optional[str] = None, max_points: Optional[int] = None, method: str = "lttb"):
+    validate_downsampling(max_points, method)
+    since = parse_since_param(since)
     cache_data = read_cache()
 
     if 'locked_and_burnt_mor' in cache_data:
-        return cache_data['locked_and_burnt_mor']
+        return series_response('locked_and_burnt_mor', cache_data['locked_and_burnt_mor'], since, max_points, method,
+                               locked_and_burnt_since, downsample_locked_and_burnt, locked_and_burnt_length)
 
     try:
         # Fetch the historical locked and burnt MOR data
@@ -500,14 +790,29 @@ async def locked_and_burnt_mor():
         write_cache(cache_data)
 
         # Return the combined data
-        return response_data
+        return series_response('locked_and_burnt_mor', response_data, since, max_points, method,
+                               locked_and_burnt_since, downsample_locked_and_burnt, locked_and_burnt_length)
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
 
 
 @app.get("/protocol_liquidity")
-async def get_protocol_liquidity():
+async def get_protocol_liquidity(price_shocks: Optional[str] = None):
+    # e.g. ?price_shocks=-50,-25,25,50 adds the value of the positions with the MOR price moved by each percentage
+    shocks = parse_float_list(price_shocks, "price_shocks")
+    if shocks is not None:
+        if any(shock <= -100 for shock in shocks):
+            raise HTTPException(status_code=400, detail="'price_shocks' must be greater than -100")
+        # The base figures come from the same positions and prices as the table, not from the cache file
+        try:
+            result = await asyncio.to_thread(price_shock_table, PROTOCOL_LIQUIDITY_ADDRESS, shocks)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
+        if result is None:
+            raise HTTPException(status_code=404, detail="No NFTs found for the default address")
+        return result
+
     cache_data = read_cache()
 
     if 'protocol_liquidity' in cache_data:
@@ -515,7 +820,7 @@ async def get_protocol_liquidity():
 
     try:
         # Call the protocol_liquidity function with the default address
-        result = protocol_liquidity("0x151c2b49CdEC10B150B2763dF3d1C00D70C90956")
+        result = protocol_liquidity(PROTOCOL_LIQUIDITY_ADDRESS)
 
         if not result:
             raise HTTPException(status_code=404, detail="No NFTs found for the default address")
@@ -530,6 +835,21 @@ async def get_protocol_liquidity():
         raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
 
 
+@app.get("/protocol_liquidity_history")
+async def get_protocol_liquidity_history(since: Optional[str] = None, max_points: Optional[int] = None,
+                                         method: str = "lttb"):
+    # Daily snapshots recorded by the scheduled liquidity history job, this endpoint only reads them
+    validate_downsampling(max_points, method)
+    since = parse_since_param(since)
+    try:
+        response_data = {"data": format_liquidity_history(load_liquidity_history())}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
+
+    return series_response('protocol_liquidity_history', response_data, since, max_points, method,
+                           liquidity_history_since, downsample_liquidity_history, records_length, cached=False)
+
+
 ######################################### General Endpoints ############################################################
 # Function to get the last updated time
 @app.get("/last_cache_update_time")
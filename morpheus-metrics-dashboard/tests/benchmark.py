@@ -0,0 +1,127 @@
+"""
+Offline benchmark of the cache refresh pipeline and every endpoint, against the stand-in of tests/replay_harness.py.
+
+The app runs from a temporary copy of the project, so the ledgers, stores and cache.json it writes never touch the
+working tree and every run starts from the same state. Record once with network access, then replay anywhere:
+
+    python tests/benchmark.py --record                  # real services, saves tests/fixtures/replay.jsonl
+    python tests/benchmark.py --latency-ms 80 --rate-limit 25
+
+Recorded requests that depend on the current date (today's price window, new liquidity history days) miss when
+replayed on a later day; misses are counted in the report.
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+import time
+from typing import Dict, List
+import httpx
+import numpy as np
+from replay_harness import (DEFAULT_FIXTURES_PATH, FixtureStore, StandInServer, stand_in_env, upstreams_from_env)
+from full_mor_metrics_v1_test import endpoints
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+COPY_IGNORE = shutil.ignore_patterns("__pycache__", "rpc_cache", "fixtures", ".env", "*.tmp")
+
+
+def copy_project(target_dir: str) -> str:
+    app_dir = os.path.join(target_dir, "app_copy")
+    shutil.copytree(PROJECT_ROOT, app_dir, ignore=COPY_IGNORE)
+    return app_dir
+
+
+def summarize(durations: List[float]) -> Dict[str, float]:
+    values = np.array(durations) * 1000
+    return {"p50": float(np.percentile(values, 50)), "p95": float(np.percentile(values, 95)),
+            "max": float(values.max())}
+
+
+async def benchmark_app(app_module, args) -> None:
+    """Times the refresh runs, then every endpoint, on one event loop as under uvicorn."""
+    for run in range(args.refresh_runs):
+        start = time.perf_counter()
+        await app_module.refresh_cache()
+        print(f"refresh_cache run {run + 1}: {time.perf_counter() - start:.2f}s")
+
+    # Startup events (the scheduled jobs) don't run through the ASGI transport
+    transport = httpx.ASGITransport(app=app_module.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+        print(f"\n{'endpoint':<80} {'status':>6} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9}")
+        for endpoint in endpoints:
+            durations, statuses = [], set()
+            for _ in range(args.endpoint_runs):
+                start = time.perf_counter()
+                response = await client.get(endpoint)
+                durations.append(time.perf_counter() - start)
+                statuses.add(response.status_code)
+            stats = summarize(durations)
+            print(f"{endpoint:<80} {','.join(map(str, sorted(statuses))):>6} "
+                  f"{stats['p50']:>9.1f} {stats['p95']:>9.1f} {stats['max']:>9.1f}")
+
+
+def run_benchmark(args) -> None:
+    if args.record:
+        from dotenv import load_dotenv
+        load_dotenv(os.path.join(PROJECT_ROOT, ".env"))
+        if os.path.exists(args.fixtures):
+            os.remove(args.fixtures)
+
+    fixtures = FixtureStore(args.fixtures)
+    server = StandInServer(fixtures, record=args.record, rpc_upstreams=upstreams_from_env(),
+                           latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, rate_limit=args.rate_limit,
+                           burst=args.burst).start()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        app_dir = copy_project(work_dir)
+        os.environ.update(stand_in_env(server.url))
+        os.environ["RPC_CACHE_ENABLED"] = "false" if args.no_rpc_cache else "true"
+        os.environ["RPC_CACHE_DIR"] = os.path.join(work_dir, "rpc_cache")
+        # main.py reads its CSVs relative to the project directory
+        os.chdir(app_dir)
+        sys.path.insert(0, app_dir)
+
+        import main
+        from app.core.config import rpc_response_cache, async_web3, async_web3_arb
+        from app.core.rpc import rpc_registry
+
+        print(f"{'Recording' if args.record else 'Replaying'} through {server.url}, {len(fixtures)} fixtures loaded")
+
+        async def run():
+            try:
+                await benchmark_app(main, args)
+            finally:
+                await async_web3.provider.disconnect()
+                await async_web3_arb.provider.disconnect()
+
+        asyncio.run(run())
+
+        print(f"\nStand-in: {dict(server.stats)}")
+        if rpc_response_cache is not None:
+            print(f"RPC response cache: {rpc_response_cache.stats()}")
+        print(f"RPC URL health: {rpc_registry.health_report()}")
+        os.chdir(PROJECT_ROOT)
+
+    server.stop()
+    if args.record:
+        print(f"Recorded {len(fixtures)} exchanges to {args.fixtures}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the refresh pipeline and endpoints without network")
+    parser.add_argument("--fixtures", default=DEFAULT_FIXTURES_PATH)
+    parser.add_argument("--record", action="store_true", help="Run against the real services and record them")
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--rate-limit", type=float, default=None, help="Stand-in requests per second")
+    parser.add_argument("--burst", type=int, default=10)
+    parser.add_argument("--refresh-runs", type=int, default=2, help="Later runs show the warm RPC response cache")
+    parser.add_argument("--endpoint-runs", type=int, default=5)
+    parser.add_argument("--no-rpc-cache", action="store_true")
+    run_benchmark(parser.parse_args())
+
+
+if __name__ == "__main__":
+    main()
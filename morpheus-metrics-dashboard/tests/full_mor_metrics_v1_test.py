@@ -7,14 +7,30 @@ BASE_URL = "http://127.0.0.1:8000"  # Adjust this if your API is hosted elsewher
 endpoints = [
     "/",
     "/analyze-mor-stakers",
+    "/analyze-mor-stakers?max_points=100",
     "/give_mor_reward",
+    "/simulate_rewards?lock_days=0,365,730,2190&deposits=1,100,1000&emissions=3456,3000",
     "/get_stake_info",
+    "/get_stake_info?pool_id=0&percentiles=25,50,75",
+    "/emission_schedule",
+    "/emission_schedule/range?start_date=2024-02-08&end_date=2025-02-08&resolution=monthly",
     "/total_and_circ_supply",
+    "/total_and_circ_supply?max_points=100&method=minmax",
+    "/total_and_circ_supply?since=2024-10-01",
     "/prices_and_trading_volume",
+    "/prices_and_trading_volume?days=30",
+    "/prices_and_trading_volume?max_points=100",
     "/get_market_cap",
     "/mor_holders_by_range",
+    "/mor_holders_by_range?bins=0,10,100,1000,100000",
+    "/mor_holders_distribution?top_n=10,100&percentiles=50,90,99",
     "/locked_and_burnt_mor",
-    "/protocol_liquidity"
+    "/locked_and_burnt_mor?max_points=100",
+    "/locked_and_burnt_mor?since=2024-10-01",
+    "/protocol_liquidity",
+    "/protocol_liquidity?price_shocks=-50,-25,25,50",
+    "/protocol_liquidity_history",
+    "/protocol_liquidity_history?max_points=100"
 ]
 
 
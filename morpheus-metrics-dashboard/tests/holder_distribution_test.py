@@ -0,0 +1,82 @@
+import asyncio
+import os
+import sys
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from helpers.supply_helpers import holder_distribution  # noqa: E402
+
+ROWS = [
+    {"address": "0x" + "11" * 20, "amount": 10.0},
+    {"address": "0x" + "22" * 20, "amount": 75.0},
+    {"address": "0x" + "33" * 20, "amount": 600.0},
+    {"address": "0x" + "44" * 20, "amount": 0.0001},  # Dust
+    {"address": holder_distribution.ZERO_ADDRESS, "amount": 5000.0}
+]
+EXPECTED_COUNTS = {"0-50": 1, "50-100": 1, "100-200": 0, "200-500": 0, "500-1000": 1, "1000-10000": 0,
+                   "10000-500000": 0}
+
+
+class StubDune:
+    """Stands in for the Dune calls, counting how often the holder rows are downloaded."""
+
+    def __init__(self, execution_id):
+        self.execution_id = execution_id
+        self.downloads = 0
+        self.fail_check = False
+
+    async def get_latest_dune_execution_id(self):
+        if self.fail_check:
+            raise ConnectionError("Dune unreachable")
+        return self.execution_id
+
+    async def get_mor_holders(self):
+        self.downloads += 1
+        return SimpleNamespace(execution_id=self.execution_id, result=SimpleNamespace(rows=ROWS))
+
+
+def stub_dune(monkeypatch, execution_id="01-first"):
+    dune = StubDune(execution_id)
+    monkeypatch.setattr(holder_distribution, "MOR_HOLDERS_SOURCE", "dune")
+    monkeypatch.setattr(holder_distribution, "get_latest_dune_execution_id", dune.get_latest_dune_execution_id)
+    monkeypatch.setattr(holder_distribution, "get_mor_holders", dune.get_mor_holders)
+    monkeypatch.setattr(holder_distribution, "_holder_snapshot", None)
+    return dune
+
+
+def refresh(snapshot_path):
+    return asyncio.run(holder_distribution.refresh_holder_snapshot(str(snapshot_path)))
+
+
+def test_unchanged_execution_keeps_the_snapshot(monkeypatch, tmp_path):
+    dune = stub_dune(monkeypatch)
+    snapshot_path = tmp_path / "snapshot.npz"
+
+    for _ in range(3):
+        snapshot = refresh(snapshot_path)
+        assert holder_distribution.holder_range_counts(snapshot) == EXPECTED_COUNTS
+        assert holder_distribution.get_holder_snapshot() is snapshot
+
+    assert dune.downloads == 1
+
+    dune.execution_id = "02-second"
+    refresh(snapshot_path)
+    assert dune.downloads == 2
+
+
+def test_failed_check_keeps_the_snapshot(monkeypatch, tmp_path):
+    dune = stub_dune(monkeypatch)
+    snapshot_path = tmp_path / "snapshot.npz"
+    refresh(snapshot_path)
+
+    dune.fail_check = True
+    snapshot = refresh(snapshot_path)
+    assert holder_distribution.holder_range_counts(snapshot) == EXPECTED_COUNTS
+
+    # After a restart the persisted snapshot is used
+    monkeypatch.setattr(holder_distribution, "_holder_snapshot", None)
+    snapshot = refresh(snapshot_path)
+    assert snapshot["execution_id"] == "01-first"
+    assert holder_distribution.holder_statistics(snapshot)["holder_count"] == 3
+    assert dune.downloads == 1
@@ -0,0 +1,92 @@
+import json
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.config import MOR_ARBITRUM_START_BLOCK as START  # noqa: E402
+from helpers.supply_helpers.holder_ledger import (LIMB, MIN_BATCH_BLOCKS, RecordedTransferLogSource,  # noqa: E402
+                                                  load_holder_ledger, ledger_holder_rows, update_holder_ledger)
+
+ZERO = "0x" + "00" * 20
+ALICE = "0x" + "11" * 20
+BOB = "0x" + "22" * 20
+CAROL = "0x" + "33" * 19 + "00"  # Ends in a zero byte, which 'S20' arrays drop on the way back
+WHALE = 5 * LIMB + 123  # Needs both limbs
+
+TRANSFERS = [
+    {"blockNumber": START, "from": ZERO, "to": ALICE, "value": str(WHALE)},
+    {"blockNumber": START + 10, "from": ZERO, "to": BOB, "value": "1000"},
+    {"blockNumber": START + 1_500, "from": ALICE, "to": CAROL, "value": str(LIMB + 23)},
+    {"blockNumber": START + 2_600, "from": BOB, "to": ZERO, "value": "400"},
+    {"blockNumber": START + 3_999, "from": ALICE, "to": BOB, "value": "100"}
+]
+EXPECTED = {ALICE: WHALE - (LIMB + 23) - 100, BOB: 1000 - 400 + 100, CAROL: LIMB + 23, ZERO: 400}
+
+
+def write_recording(path, transfers):
+    with open(path, 'w') as f:
+        f.writelines(json.dumps(transfer) + "\n" for transfer in transfers)
+    return str(path)
+
+
+def balances(ledger):
+    return {"0x" + address.ljust(20, b'\0').hex(): int(hi) * LIMB + int(lo)
+            for address, hi, lo in zip(ledger["addresses"].tolist(), ledger["balance_hi"], ledger["balance_lo"])}
+
+
+class QueryLog:
+    """Wraps a source, recording the queried block ranges and failing ranges wider than `max_blocks`."""
+
+    def __init__(self, source, max_blocks=None):
+        self.source = source
+        self.max_blocks = max_blocks
+        self.ranges = []
+
+    def latest_block(self):
+        return self.source.latest_block()
+
+    def get_transfers(self, from_block, to_block):
+        self.ranges.append((from_block, to_block))
+        if self.max_blocks and to_block - from_block + 1 > self.max_blocks:
+            raise ValueError("query returned more than 10000 results")
+        return self.source.get_transfers(from_block, to_block)
+
+
+def test_ingests_balances_exactly(tmp_path):
+    source = RecordedTransferLogSource(write_recording(tmp_path / "transfers.jsonl", TRANSFERS))
+    ledger_path = str(tmp_path / "ledger.npz")
+
+    ledger = update_holder_ledger(source, ledger_path=ledger_path, batch_blocks=1_000)
+
+    assert ledger["last_block"] == START + 3_999
+    assert balances(ledger) == EXPECTED
+    # The checkpoint reads back with the same limbs and addresses
+    assert balances(load_holder_ledger(ledger_path)) == EXPECTED
+    rows = {row["address"]: row["amount"] for row in ledger_holder_rows(load_holder_ledger(ledger_path))}
+    assert rows[CAROL] == pytest.approx((LIMB + 23) / 1e18)
+
+
+def test_resumes_from_checkpoint(tmp_path):
+    ledger_path = str(tmp_path / "ledger.npz")
+    partial = RecordedTransferLogSource(write_recording(tmp_path / "partial.jsonl", TRANSFERS[:3]))
+    assert update_holder_ledger(partial, ledger_path=ledger_path)["last_block"] == START + 1_500
+
+    full = QueryLog(RecordedTransferLogSource(write_recording(tmp_path / "full.jsonl", TRANSFERS)))
+    ledger = update_holder_ledger(full, ledger_path=ledger_path)
+
+    assert full.ranges[0][0] == START + 1_501
+    assert balances(ledger) == EXPECTED
+
+
+def test_halves_failing_batches(tmp_path):
+    source = QueryLog(RecordedTransferLogSource(write_recording(tmp_path / "transfers.jsonl", TRANSFERS)),
+                      max_blocks=MIN_BATCH_BLOCKS)
+    ledger_path = str(tmp_path / "ledger.npz")
+
+    ledger = update_holder_ledger(source, ledger_path=ledger_path, batch_blocks=4 * MIN_BATCH_BLOCKS)
+
+    widths = [to_block - from_block + 1 for from_block, to_block in source.ranges]
+    assert widths[:3] == [4 * MIN_BATCH_BLOCKS, 2 * MIN_BATCH_BLOCKS, MIN_BATCH_BLOCKS]
+    assert balances(ledger) == EXPECTED
@@ -0,0 +1,307 @@
+"""
+Record/replay stand-in for the services the app talks to: the Ethereum and Arbitrum JSON-RPC nodes, CoinGecko,
+DexScreener and Dune.
+
+One local HTTP server answers all of them. The app is pointed at it with `stand_in_env` (RPC_URL, ARB_RPC_URL and the
+*_API_URL overrides in app/core/config.py):
+
+- `/rpc/<chain>` takes JSON-RPC (single or batch) requests
+- every other path is an HTTP API request, routed by its prefix (`HTTP_UPSTREAMS`)
+
+In record mode requests are forwarded to the real upstreams and every exchange is appended to a JSON lines fixture
+file. In replay mode they are answered from the fixtures. Identical requests replay their recorded answers in order
+and then keep repeating the last one, e.g. eth_blockNumber moving forward. Unrecorded requests get a JSON-RPC error
+or a 404 and are counted as misses. A fixed latency (plus jitter) and a token bucket rate limit, answered with 429
+and Retry-After, can be put in front of both modes.
+
+    python tests/replay_harness.py --fixtures tests/fixtures/replay.jsonl --latency-ms 80 --rate-limit 25
+"""
+import argparse
+import json
+import os
+import random
+import threading
+import time
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit
+import requests
+
+# Path prefix -> upstream host of the HTTP APIs, see the *_API_URL settings in app/core/config.py
+HTTP_UPSTREAMS = {
+    "/api/v1/": "https://api.dune.com",
+    "/api/v3/": "https://api.coingecko.com",
+    "/latest/": "https://api.dexscreener.com"
+}
+FORWARDED_HEADERS = ["Accept", "Content-Type", "X-Dune-API-Key", "User-Agent"]
+DEFAULT_FIXTURES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "replay.jsonl")
+
+
+def _key(*parts) -> str:
+    return json.dumps(parts, sort_keys=True, separators=(",", ":"), default=str)
+
+
+class FixtureStore:
+    """Recorded exchanges, appended to and replayed from a JSON lines file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.entries = defaultdict(list)
+        self.positions = defaultdict(int)
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self.entries[self._entry_key(entry)].append(entry)
+
+    @staticmethod
+    def _entry_key(entry: Dict) -> str:
+        if entry["kind"] == "rpc":
+            return _key("rpc", entry["chain"], entry["method"], entry["params"])
+        return _key("http", entry["method"], entry["path"], entry["query"])
+
+    def record(self, entry: Dict) -> None:
+        with self._lock:
+            self.entries[self._entry_key(entry)].append(entry)
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with open(self.path, 'a') as f:
+                f.write(json.dumps(entry) + "\n")
+
+    def replay(self, key: str) -> Optional[Dict]:
+        with self._lock:
+            entries = self.entries.get(key)
+            if not entries:
+                return None
+            position = self.positions[key]
+            self.positions[key] = position + 1
+            return entries[min(position, len(entries) - 1)]
+
+    def __len__(self) -> int:
+        return sum(len(entries) for entries in self.entries.values())
+
+
+class RateLimiter:
+    """Token bucket of `rate` requests per second with room for `burst` at once."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.capacity = max(burst, 1)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> Tuple[bool, float]:
+        """Takes a token, or returns False and the seconds until one is available."""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True, 0.0
+            return False, (1 - self.tokens) / self.rate
+
+
+class StandInServer:
+    """
+    Local stand-in server, in `record` or `replay` mode. `rpc_upstreams` maps a chain name to the node URL that
+    record mode forwards to.
+    """
+
+    def __init__(self, fixtures: FixtureStore, record: bool = False, rpc_upstreams: Optional[Dict[str, str]] = None,
+                 http_upstreams: Optional[Dict[str, str]] = None, latency_ms: float = 0, jitter_ms: float = 0,
+                 rate_limit: Optional[float] = None, burst: int = 10, host: str = "127.0.0.1", port: int = 0):
+        self.fixtures = fixtures
+        self.record = record
+        self.rpc_upstreams = rpc_upstreams or {}
+        self.http_upstreams = http_upstreams or HTTP_UPSTREAMS
+        self.latency = latency_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.rate_limiter = RateLimiter(rate_limit, burst) if rate_limit else None
+        self.session = requests.Session()
+        self.stats = defaultdict(int)
+        self._stats_lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "StandInServer":
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def count(self, name: str, amount: int = 1) -> None:
+        with self._stats_lock:
+            self.stats[name] += amount
+
+    def _rpc_response(self, chain: str, request: Dict, upstream_responses: Optional[Dict] = None) -> Dict:
+        method, params = request.get("method"), request.get("params", [])
+        self.count("rpc_requests")
+        if upstream_responses is not None:
+            response = upstream_responses.get(request.get("id"), {})
+            outcome = {k: response[k] for k in ("result", "error") if k in response}
+            self.fixtures.record({"kind": "rpc", "chain": chain, "method": method, "params": params, **outcome})
+        else:
+            entry = self.fixtures.replay(_key("rpc", chain, method, params))
+            if entry is None:
+                self.count("misses")
+                outcome = {"error": {"code": -32000, "message": f"Not recorded: {method}"}}
+            else:
+                outcome = {k: entry[k] for k in ("result", "error") if k in entry}
+        return {"jsonrpc": "2.0", "id": request.get("id"), **outcome}
+
+    def handle_rpc(self, chain: str, body: bytes) -> Tuple[int, Dict, bytes]:
+        payload = json.loads(body)
+        batch = payload if isinstance(payload, list) else [payload]
+
+        upstream_responses = None
+        if self.record:
+            upstream = self.session.post(self.rpc_upstreams[chain], data=body,
+                                         headers={"Content-Type": "application/json"}, timeout=60)
+            if upstream.status_code != 200:
+                return upstream.status_code, {"Content-Type": "application/json"}, upstream.content
+            answers = upstream.json()
+            upstream_responses = {answer.get("id"): answer for answer in
+                                  (answers if isinstance(answers, list) else [answers])}
+
+        responses = [self._rpc_response(chain, request, upstream_responses) for request in batch]
+        content = json.dumps(responses if isinstance(payload, list) else responses[0]).encode()
+        return 200, {"Content-Type": "application/json"}, content
+
+    def handle_http(self, method: str, raw_path: str, headers, body: bytes) -> Tuple[int, Dict, bytes]:
+        parts = urlsplit(raw_path)
+        query = urlencode(sorted(parse_qsl(parts.query)))
+        self.count("http_requests")
+
+        if self.record:
+            prefix = next((p for p in self.http_upstreams if parts.path.startswith(p)), None)
+            if prefix is None:
+                return 404, {"Content-Type": "application/json"}, b'{"error": "No upstream for this path"}'
+            forwarded = {name: headers[name] for name in FORWARDED_HEADERS if headers.get(name)}
+            upstream = self.session.request(method, self.http_upstreams[prefix] + raw_path, data=body or None,
+                                            headers=forwarded, timeout=300)
+            content_type = upstream.headers.get("Content-Type", "application/json")
+            self.fixtures.record({"kind": "http", "method": method, "path": parts.path, "query": query,
+                                  "status": upstream.status_code, "content_type": content_type,
+                                  "body": upstream.text})
+            return upstream.status_code, {"Content-Type": content_type}, upstream.content
+
+        entry = self.fixtures.replay(_key("http", method, parts.path, query))
+        if entry is None:
+            self.count("misses")
+            return 404, {"Content-Type": "application/json"}, b'{"error": "Not recorded"}'
+        return entry["status"], {"Content-Type": entry["content_type"]}, entry["body"].encode()
+
+    def _handler(self):
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # Keep-alive, as the app's pooled clients expect
+
+            def log_message(self, format, *args):
+                pass
+
+            def _respond(self, status: int, headers: Dict, content: bytes) -> None:
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            def _handle(self, method: str) -> None:
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                if stand_in.rate_limiter is not None:
+                    allowed, retry_after = stand_in.rate_limiter.acquire()
+                    if not allowed:
+                        stand_in.count("rate_limited")
+                        self._respond(429, {"Retry-After": f"{retry_after:.3f}"}, b"")
+                        return
+                if stand_in.latency or stand_in.jitter:
+                    time.sleep(stand_in.latency + random.uniform(0, stand_in.jitter))
+
+                try:
+                    if method == "POST" and self.path.startswith("/rpc/"):
+                        status, headers, content = stand_in.handle_rpc(self.path[len("/rpc/"):].strip("/"), body)
+                    else:
+                        status, headers, content = stand_in.handle_http(method, self.path, self.headers, body)
+                except Exception as e:
+                    stand_in.count("errors")
+                    status, headers, content = 502, {"Content-Type": "text/plain"}, str(e).encode()
+                self._respond(status, headers, content)
+
+            def do_GET(self):
+                self._handle("GET")
+
+            def do_POST(self):
+                self._handle("POST")
+
+        return Handler
+
+
+def stand_in_env(url: str) -> Dict[str, str]:
+    """Environment variables that point the app (app/core/config.py) at a stand-in server."""
+    return {
+        "RPC_URL": f"{url}/rpc/ethereum",
+        "ARB_RPC_URL": f"{url}/rpc/arbitrum",
+        "COINGECKO_API_URL": url,
+        "DEXSCREENER_API_URL": url,
+        "DUNE_API_URL": url
+    }
+
+
+def upstreams_from_env() -> Dict[str, str]:
+    """The real node URLs (first of each comma separated list) that record mode forwards JSON-RPC to."""
+    upstreams = {}
+    for chain, variable in (("ethereum", "RPC_URL"), ("arbitrum", "ARB_RPC_URL")):
+        urls: List[str] = [url.strip() for url in os.getenv(variable, "").split(",") if url.strip()]
+        if urls:
+            upstreams[chain] = urls[0]
+    return upstreams
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record/replay stand-in for the app's RPC nodes and HTTP APIs")
+    parser.add_argument("--fixtures", default=DEFAULT_FIXTURES_PATH)
+    parser.add_argument("--record", action="store_true", help="Forward to the real services and record")
+    parser.add_argument("--port", type=int, default=8545)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--rate-limit", type=float, default=None, help="Requests per second, 429 above it")
+    parser.add_argument("--burst", type=int, default=10)
+    args = parser.parse_args()
+
+    if args.record:
+        from dotenv import load_dotenv
+        load_dotenv(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".env"))
+
+    fixtures = FixtureStore(args.fixtures)
+    server = StandInServer(fixtures, record=args.record, rpc_upstreams=upstreams_from_env(),
+                           latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, rate_limit=args.rate_limit,
+                           burst=args.burst, port=args.port).start()
+    print(f"{'Recording' if args.record else 'Replaying'} {len(fixtures)} fixtures at {server.url}, "
+          f"point the app at it with:")
+    for name, value in stand_in_env(server.url).items():
+        print(f"  {name}={value}")
+    try:
+        while True:
+            time.sleep(60)
+    except KeyboardInterrupt:
+        server.stop()
+        print(dict(server.stats))
+
+
+if __name__ == "__main__":
+    main()